@@ -4,6 +4,7 @@
 import os
 import logging
 import sys
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -48,13 +49,89 @@ class Settings(BaseSettings):
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     openai_vision_model: str = os.getenv("OPENAI_VISION_MODEL", "gpt-4o-mini")
     
+    # Маршрутизация моделей: уровни через запятую, от быстрой к сильной
+    # (пусто — используется только openai_model / openai_vision_model)
+    openai_model_tiers: str = os.getenv("OPENAI_MODEL_TIERS", "")
+    openai_vision_model_tiers: str = os.getenv("OPENAI_VISION_MODEL_TIERS", "")
+    routing_long_input_chars: int = 4000  # Вход длиннее — на сильную модель
+    routing_latency_budget: float = 20.0  # Сек; при превышении — fallback на быструю
+    routing_probe_interval: float = 120.0  # Сек до повторной пробы медленной модели
+    
     # API
     api_host: str = "0.0.0.0"
     api_port: int = 8000
     
     # История
-    history_file: str = "history.json"
-    max_history_items: int = 10
+    history_backend: str = os.getenv("HISTORY_BACKEND", "sqlite")  # sqlite, json
+    history_db: str = "history.db"
+    history_file: str = "history.json"  # Для backend=json и как источник импорта в SQLite
+    max_history_items: int = 0  # 0 — без ограничения
+    history_retention_days: int = 0  # 0 — без ограничения
+    history_cache_items: int = 100  # Последние записи в памяти
+    history_batch_size: int = 100  # Записей в одном пакете write-behind
+    history_flush_interval: float = 0.5  # Сек ожидания добора пакета
+    history_fsync: str = "normal"  # full, normal, off
+    
+    # Учёт токенов и стоимости
+    usage_db: str = "usage.db"
+    usage_file: str = "usage.json"  # Прежний формат: импортируется в usage_db при старте
+    usage_flush_interval: float = 2.0  # Сек между записями в usage_db (write-behind)
+    # Цены моделей в USD за 1M токенов: [prompt, completion]
+    model_pricing: Dict[str, List[float]] = {
+        "gpt-4o-mini": [0.15, 0.60],
+        "gpt-4o": [2.50, 10.00],
+        "gpt-4.1-mini": [0.40, 1.60],
+        "gpt-4.1": [2.00, 8.00],
+    }
+    
+    # Генерация PDF отчётов
+    pdf_workers: int = 2  # Процессов в пуле WeasyPrint
+    pdf_queue_size: int = 8  # Рендеров в работе и ожидании; сверх — отказ
+    pdf_timeout: float = 60.0  # Сек на один рендер
+    
+    # Фоновые задания отчётов (POST /reports)
+    report_jobs_dir: str = "report_jobs"
+    report_job_workers: int = 2  # Заданий в рендере одновременно
+    report_job_queue_size: int = 32  # В очереди и в работе; сверх — отказ
+    report_job_ttl: int = 3600  # Сек хранения готового файла
+    
+    # Графики
+    chart_workers: int = 2  # Процессов в пуле matplotlib
+    chart_queue_size: int = 16  # Графиков /visualize в работе и ожидании; сверх — отказ
+    chart_timeout: float = 30.0  # Сек на один график
+    chart_cache_mb: int = 32  # Готовые изображения в памяти (0 — без кэша)
+    chart_prerender: bool = True  # Отрисовать Score Chart 0-10 при старте
+    chart_figure_templates: bool = True  # Переиспользовать фигуры, обновляя только данные
+    chart_http_max_age: int = 86400  # Cache-Control для GET /charts/{type}, сек
+    comparison_max_items: int = 20  # Конкурентов в одном сводном отчёте
+    chart_max_competitors: int = 200  # Конкурентов на одном графике сравнения (compare_*)
+    
+    # Кэш готовых отчётов
+    report_cache_mb: int = 64  # HTML/Markdown в памяти
+    report_cache_dir: str = "report_cache"  # PDF на диске
+    report_cache_disk_mb: int = 512  # 0 — PDF не кэшируются
+    
+    # Тренды оценок конкурентов
+    trends_db: str = "trends.db"
+    
+    # Журнал запросов (JSONL)
+    journal_enabled: bool = True
+    journal_file: str = "logs/requests_journal.jsonl"
+    journal_max_mb: int = 20  # Размер сегмента до ротации
+    journal_retention_days: int = 30  # Сжатые сегменты старше удаляются при compact (0 — хранить всё)
+    journal_bodies: bool = False  # Сохранять JSON тела запросов (для replay)
+    journal_queue_size: int = 10000  # При переполнении записи журнала отбрасываются
+    
+    # Пакетный (офлайн) анализ
+    batch_jobs_dir: str = "batch_jobs"
+    batch_max_items: int = 10  # Элементов в одном запросе к модели
+    batch_max_chars: int = 12000  # Суммарная длина пакета
+    batch_max_item_chars: int = 3000  # Длиннее — отдельным запросом
+    
+    # Изображения для Vision API
+    vision_detail: str = os.getenv("VISION_DETAIL", "high")  # low, high
+    image_jpeg_quality: int = 85
+    image_max_upload_mb: int = 20
     
     # Парсер
     parser_timeout: int = 30
@@ -2,21 +2,29 @@
 Главный модуль FastAPI приложения
 Мониторинг конкурентов - MVP ассистент
 """
+import asyncio
 import base64
+import hashlib
 import time
 import logging
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from datetime import datetime
+from functools import partial
+from typing import Awaitable, Callable, List, Optional
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 import uvicorn
 
 from backend.services.pdf_service import pdf_service
-from backend.services.report_service import report_service
-from backend.services.visualization_service import viz_service
+from backend.services.report_service import report_service, PDFQueueFull
+from backend.services.visualization_service import (
+    viz_service, ChartQueueFull, CHART_FORMATS, chart_etag, chart_renderable, competitor_matrix
+)
 
 from backend.config import settings
 from backend.models.schemas import (
+    CompetitorAnalysis, ImageAnalysis,
     TextAnalysisRequest,
     TextAnalysisResponse,
     ImageAnalysisResponse,
@@ -24,24 +32,31 @@ from backend.models.schemas import (
     ParseDemoResponse,
     ParsedContent,
     HistoryResponse,
+    TrendResponse, CompetitorListResponse,
+    UsageStatsResponse,
+    BatchJobRequest, BatchJobStatus,
     PDFAnalysisRequest, PDFAnalysisResponse,
-    ReportRequest, ReportResponse,
-    VisualizationRequest, VisualizationResponse
+    ReportRequest, ReportResponse, ComparisonReportItem, ComparisonReportRequest,
+    ReportJobRequest, ReportJobStatus,
+    VisualizationRequest, VisualizationResponse,
+    QualityHint
 )
 from backend.services.openai_service import openai_service
 from backend.services.parser_service import parser_service
 from backend.services.history_service import history_service
+from backend.services.usage_service import usage_service
+from backend.services.batch_service import batch_service, BatchJobRunning, InvalidJobId
+from backend.services.image_service import image_service
+from backend.services.journal_service import journal_service
+from backend.services.trends_service import trends_service, normalize_competitor
+from backend.services.report_job_service import report_job_service, ReportJobQueueFull
 
 from backend.services.http_parser_service import http_parser_service
 
 # Логгер для API
 logger = logging.getLogger("competitor_monitor.api")
 
-# Инициализация приложения
-logger.info("=" * 60)
-logger.info("🚀 ЗАПУСК ПРИЛОЖЕНИЯ: Мониторинг конкурентов")
-logger.info("=" * 60)
-
+# Инициализация приложения (баннер запуска — в startup_event, не при импорте)
 app = FastAPI(
     title="Мониторинг конкурентов",
     description="MVP ассистент для анализа конкурентов с поддержкой текста и изображений",
@@ -68,19 +83,36 @@ logger.info("CORS middleware добавлен ✓")
 async def log_requests(request: Request, call_next):
     """Логирование всех HTTP запросов"""
     start_time = time.time()
+    usage_service.begin_request(request.url.path)
     
     # Логируем входящий запрос
     logger.info(f"➡️  {request.method} {request.url.path}")
     if request.query_params:
         logger.debug(f"    Query params: {dict(request.query_params)}")
+    # Выключенный журнал не создаёт запись и не читает и не хэширует тело
+    if journal_service.enabled:
+        journal_service.begin_request(request.method, request.url.path)
+        if request.headers.get("content-type", "").startswith("application/json"):
+            # Тело кэшируется в Request (Starlette >= 0.29) — обработчик прочитает его повторно без копии
+            journal_service.note_input("body", await request.body(), json_body=True)
     
     # Выполняем запрос
-    response = await call_next(request)
+    try:
+        response = await call_next(request)
+    except Exception:
+        journal_service.finish_request(500, time.time() - start_time, dict(request.query_params))
+        raise
     
     # Логируем ответ
     elapsed = time.time() - start_time
     status_emoji = "✅" if response.status_code < 400 else "❌"
     logger.info(f"{status_emoji} {request.method} {request.url.path} -> {response.status_code} ({elapsed:.3f}s)")
+    journal_service.finish_request(
+        response.status_code,
+        elapsed,
+        dict(request.query_params),
+        usage_service.request_usage()
+    )
     
     return response
 
@@ -91,11 +123,19 @@ async def log_requests(request: Request, call_next):
 async def startup_event():
     """Событие при запуске сервера"""
     logger.info("=" * 60)
+    logger.info("🚀 ЗАПУСК ПРИЛОЖЕНИЯ: Мониторинг конкурентов")
+    logger.info("=" * 60)
     logger.info("🟢 СЕРВЕР ЗАПУЩЕН")
     logger.info(f"  Адрес: http://{settings.api_host}:{settings.api_port}")
     logger.info(f"  Документация: http://localhost:{settings.api_port}/docs")
     logger.info(f"  Модель текста: {settings.openai_model}")
     logger.info(f"  Модель vision: {settings.openai_vision_model}")
+    report_service.load_templates()
+    report_service.start_pdf_pool()
+    viz_service.start_pool()
+    if settings.chart_prerender:
+        viz_service.start_prerender()
+    report_job_service.start()
     logger.info("=" * 60)
 
 
@@ -106,12 +146,34 @@ async def shutdown_event():
     logger.info("🔴 ОСТАНОВКА СЕРВЕРА")
     logger.info("  Закрытие Parser сервиса...")
     await parser_service.close()
+    logger.info("  Сброс истории на диск...")
+    history_service.close()
+    logger.info("  Сброс статистики использования...")
+    usage_service.close()
+    logger.info("  Отмена заданий отчётов...")
+    await report_job_service.close()
+    logger.info("  Остановка пула PDF...")
+    report_service.close()
+    logger.info("  Остановка пула графиков...")
+    viz_service.close()
+    logger.info("  Сброс журнала запросов...")
+    journal_service.close()
     logger.info("  ✓ Все ресурсы освобождены")
     logger.info("=" * 60)
 
 
 # === Эндпоинты ===
 
+async def _record_trend(competitor: Optional[str], analysis, request_type: str, history_id: str):
+    """Добавить точку тренда оценок; ошибка записи не ломает ответ анализа"""
+    if not competitor or analysis is None:
+        return
+    try:
+        await asyncio.to_thread(trends_service.record, competitor, analysis, request_type, history_id)
+    except Exception as e:
+        logger.warning(f"  ⚠️ Точка тренда не записана: {e}")
+
+
 @app.get("/")
 async def root():
     """Главная страница - отдаём фронтенд"""
@@ -132,25 +194,30 @@ async def analyze_text(request: TextAnalysisRequest):
     try:
         start_time = time.time()
         
-        analysis = await openai_service.analyze_text(request.text)
+        analysis = await openai_service.analyze_text(request.text, quality=request.quality)
         
         elapsed = time.time() - start_time
         logger.info(f"  ✓ Анализ завершён за {elapsed:.2f} сек")
         
         # Сохраняем в историю
         logger.info("  💾 Сохранение в историю...")
-        history_service.add_entry(
+        usage = usage_service.request_usage()
+        entry = history_service.add_entry(
             request_type="text",
             request_summary=request.text[:100] + "..." if len(request.text) > 100 else request.text,
-            response_summary=analysis.summary
+            response_summary=analysis.summary,
+            usage=usage,
+            payload=analysis.model_dump()
         )
+        await _record_trend(request.competitor, analysis, "text", entry.id)
         
         logger.info("  ✅ УСПЕХ: Анализ текста завершён")
         logger.info("=" * 50)
         
         return TextAnalysisResponse(
             success=True,
-            analysis=analysis
+            analysis=analysis,
+            model=usage.model if usage else None
         )
     except Exception as e:
         logger.error(f"  ❌ ОШИБКА: {e}")
@@ -162,7 +229,11 @@ async def analyze_text(request: TextAnalysisRequest):
 
 
 @app.post("/analyze_image", response_model=ImageAnalysisResponse)
-async def analyze_image(file: UploadFile = File(...)):
+async def analyze_image(
+    file: UploadFile = File(...),
+    quality: QualityHint = Form("auto"),
+    competitor: Optional[str] = Form(None)
+):
     """
     Анализ изображения конкурента
     """
@@ -187,9 +258,14 @@ async def analyze_image(file: UploadFile = File(...)):
         # Читаем и кодируем изображение
         logger.info("  📥 Чтение файла...")
         content = await file.read()
+        journal_service.note_input(file.filename or "file", content)
         file_size_kb = len(content) / 1024
         logger.info(f"  Размер файла: {file_size_kb:.1f} KB")
         
+        # Проверка, очистка метаданных и уменьшение — в отдельном потоке
+        with journal_service.stage("image_normalize"):
+            content, mime_type = await asyncio.to_thread(image_service.normalize, content)
+        
         image_base64 = base64.b64encode(content).decode('utf-8')
         logger.info(f"  Base64 размер: {len(image_base64)} символов")
         
@@ -197,7 +273,8 @@ async def analyze_image(file: UploadFile = File(...)):
         logger.info("  🔍 Отправка на анализ...")
         analysis = await openai_service.analyze_image(
             image_base64=image_base64,
-            mime_type=file.content_type
+            mime_type=mime_type,
+            quality=quality
         )
         
         elapsed = time.time() - start_time
@@ -205,18 +282,23 @@ async def analyze_image(file: UploadFile = File(...)):
         
         # Сохраняем в историю
         logger.info("  💾 Сохранение в историю...")
-        history_service.add_entry(
+        usage = usage_service.request_usage()
+        entry = history_service.add_entry(
             request_type="image",
             request_summary=f"Изображение: {file.filename}",
-            response_summary=analysis.description[:200] if analysis.description else "Анализ изображения"
+            response_summary=analysis.description[:200] if analysis.description else "Анализ изображения",
+            usage=usage,
+            payload=analysis.model_dump()
         )
+        await _record_trend(competitor, analysis, "image", entry.id)
         
         logger.info("  ✅ УСПЕХ: Анализ изображения завершён")
         logger.info("=" * 50)
         
         return ImageAnalysisResponse(
             success=True,
-            analysis=analysis
+            analysis=analysis,
+            model=usage.model if usage else None
         )
     except Exception as e:
         logger.error(f"  ❌ ОШИБКА: {e}")
@@ -242,7 +324,8 @@ async def parse_demo(request: ParseDemoRequest):
         # Открываем страницу в Chrome и делаем скриншот
         logger.info("  🔍 Запуск парсинга...")
         parse_start = time.time()
-        title, h1, first_paragraph, screenshot_bytes, error = await parser_service.parse_url(request.url)
+        with journal_service.stage("parse"):
+            title, h1, first_paragraph, screenshot_bytes, error = await parser_service.parse_url(request.url)
         parse_elapsed = time.time() - parse_start
         logger.info(f"  ✓ Парсинг завершён за {parse_elapsed:.2f} сек")
         
@@ -271,14 +354,16 @@ async def parse_demo(request: ParseDemoRequest):
                 url=request.url,
                 title=title,
                 h1=h1,
-                first_paragraph=first_paragraph
+                first_paragraph=first_paragraph,
+                quality=request.quality
             )
         else:
             logger.warning("  ⚠ Скриншот недоступен, fallback на текстовый анализ")
             analysis = await openai_service.analyze_parsed_content(
                 title=title,
                 h1=h1,
-                paragraph=first_paragraph
+                paragraph=first_paragraph,
+                quality=request.quality
             )
         
         ai_elapsed = time.time() - ai_start
@@ -294,11 +379,15 @@ async def parse_demo(request: ParseDemoRequest):
         
         # Сохраняем в историю
         logger.info("  💾 Сохранение в историю...")
-        history_service.add_entry(
+        usage = usage_service.request_usage()
+        entry = history_service.add_entry(
             request_type="parse",
             request_summary=f"URL: {request.url}",
-            response_summary=analysis.summary[:100] if analysis.summary else f"Title: {title or 'N/A'}"
+            response_summary=analysis.summary[:100] if analysis.summary else f"Title: {title or 'N/A'}",
+            usage=usage,
+            payload=analysis.model_dump()
         )
+        await _record_trend(request.url, analysis, "parse", entry.id)
         
         total_elapsed = time.time() - total_start
         logger.info(f"  ✅ УСПЕХ: Парсинг и анализ завершён за {total_elapsed:.2f} сек")
@@ -308,7 +397,8 @@ async def parse_demo(request: ParseDemoRequest):
         
         return ParseDemoResponse(
             success=True,
-            data=parsed_content
+            data=parsed_content,
+            model=usage.model if usage else None
         )
     except Exception as e:
         logger.error(f"  ❌ ОШИБКА: {e}")
@@ -329,7 +419,8 @@ async def parse_fast(request: ParseDemoRequest):
     
     try:
         # Парсим
-        title, h1, first_paragraph, error = await http_parser_service.parse_url(request.url)
+        with journal_service.stage("parse"):
+            title, h1, first_paragraph, error = await http_parser_service.parse_url(request.url)
         
         if error:
             logger.error(f"  ❌ Ошибка: {error}")
@@ -339,16 +430,20 @@ async def parse_fast(request: ParseDemoRequest):
         # Анализируем через AI
         logger.info("  🤖 Запуск AI анализа...")
         if title or h1 or first_paragraph:
-            analysis = await openai_service.analyze_parsed_content(title, h1, first_paragraph)
+            analysis = await openai_service.analyze_parsed_content(title, h1, first_paragraph, quality=request.quality)
         else:
             analysis = None
         
         # Сохраняем в историю
-        history_service.add_entry(
+        usage = usage_service.request_usage()
+        entry = history_service.add_entry(
             request_type="parse",
             request_summary=f"URL: {request.url}",
-            response_summary=analysis.summary[:100] if analysis and analysis.summary else f"Title: {title or 'N/A'}"
+            response_summary=analysis.summary[:100] if analysis and analysis.summary else f"Title: {title or 'N/A'}",
+            usage=usage,
+            payload=analysis.model_dump() if analysis else None
         )
+        await _record_trend(request.url, analysis, "parse", entry.id)
         
         logger.info("  ✅ УСПЕХ")
         logger.info("=" * 50)
@@ -361,7 +456,8 @@ async def parse_fast(request: ParseDemoRequest):
                 h1=h1,
                 first_paragraph=first_paragraph,
                 analysis=analysis
-            )
+            ),
+            model=usage.model if usage else None
         )
         
     except Exception as e:
@@ -369,17 +465,139 @@ async def parse_fast(request: ParseDemoRequest):
         logger.error("=" * 50)
         return ParseDemoResponse(success=False, error=str(e))
 
+# === Batch Endpoints ===
+@app.post("/batch_jobs", response_model=BatchJobStatus)
+async def create_batch_job(request: BatchJobRequest):
+    """
+    Создать пакетное задание и запустить его в фоне
+    (с существующим job_id — дополнить и возобновить)
+    """
+    logger.info("=" * 50)
+    logger.info("📦 API: ПАКЕТНОЕ ЗАДАНИЕ")
+    logger.info(f"  Элементов: {len(request.items)}")
+    
+    try:
+        status = batch_service.create_job(request.items, job_id=request.job_id, quality=request.quality)
+    except BatchJobRunning as e:
+        logger.info("=" * 50)
+        raise HTTPException(status_code=409, detail=str(e))
+    except InvalidJobId as e:
+        logger.info("=" * 50)
+        raise HTTPException(status_code=400, detail=str(e))
+    batch_service.start_job(status.job_id)
+    
+    logger.info(f"  ✅ Задание {status.job_id} запущено")
+    logger.info("=" * 50)
+    return status
+
+
+@app.get("/batch_jobs/{job_id}", response_model=BatchJobStatus)
+async def get_batch_job(job_id: str, include_results: bool = True):
+    """
+    Статус и результаты пакетного задания
+    """
+    try:
+        status = batch_service.get_job(job_id, include_results=include_results)
+    except InvalidJobId as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if status is None:
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+    return status
+
+
+@app.post("/batch_jobs/{job_id}/resume", response_model=BatchJobStatus)
+async def resume_batch_job(job_id: str):
+    """
+    Возобновить прерванное задание с последнего чекпоинта
+    """
+    try:
+        status = batch_service.get_job(job_id, include_results=False)
+    except InvalidJobId as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if status is None:
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+    if not batch_service.start_job(job_id):
+        logger.info(f"  Задание {job_id[:8]} уже выполняется")
+    return status
+
+
 @app.get("/history", response_model=HistoryResponse)
-async def get_history():
+async def get_history(
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    q: Optional[str] = None
+):
     """
-    Получить историю последних 10 запросов
+    Получить историю запросов постранично (новые первыми)
+
+    Следующая страница — тот же запрос с cursor=next_cursor.
+    Фильтры: type (text, image, parse, pdf...), since/until (ISO дата), q — поиск по тексту.
     """
-    logger.info("📋 API: Получение истории")
-    items = history_service.get_history()
-    logger.info(f"  Записей: {len(items)}")
+    logger.info(f"📋 API: Получение истории (limit={limit}, type={type}, q={q})")
+    try:
+        items, total, next_cursor = await asyncio.to_thread(
+            history_service.get_history,
+            limit=limit,
+            cursor=cursor,
+            request_type=type,
+            since=since,
+            until=until,
+            q=q
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"  Записей: {len(items)} из {total}")
     return HistoryResponse(
         items=items,
-        total=len(items)
+        total=total,
+        next_cursor=next_cursor
+    )
+
+
+@app.get("/trends", response_model=CompetitorListResponse)
+async def list_trends():
+    """
+    Конкуренты с трендами: число анализов, последний анализ и последние оценки
+    """
+    logger.info("📈 API: Список конкурентов с трендами")
+    items = await asyncio.to_thread(trends_service.list_competitors)
+    return CompetitorListResponse(items=items)
+
+
+@app.get("/trends/{competitor:path}", response_model=TrendResponse)
+async def get_trend(competitor: str, period: str = "day", days: Optional[int] = Query(None, ge=1)):
+    """
+    Тренд оценок конкурента по дням или неделям (competitor — домен, URL или название)
+    """
+    logger.info(f"📈 API: Тренд {competitor} (period={period}, days={days})")
+    try:
+        points = await asyncio.to_thread(trends_service.get_trend, competitor, period, days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return TrendResponse(
+        competitor=normalize_competitor(competitor),
+        period=period,
+        points=points
+    )
+
+
+@app.get("/usage", response_model=UsageStatsResponse)
+async def get_usage(group_by: str = "endpoint", days: Optional[int] = None):
+    """
+    Агрегаты токенов, задержек и стоимости (group_by: endpoint, model, day)
+    """
+    logger.info(f"💰 API: Статистика использования (group_by={group_by}, days={days})")
+    try:
+        items = usage_service.get_stats(group_by=group_by, days=days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return UsageStatsResponse(
+        group_by=group_by,
+        items=items,
+        total=usage_service.total(items)
     )
 
 
@@ -404,9 +622,25 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Внутренние метрики сервисов"""
+    return {
+        "images": image_service.get_stats(),
+        "history": history_service.get_stats(),
+        "pdf": report_service.get_stats(),
+        "report_jobs": report_job_service.get_stats(),
+        "charts": viz_service.get_stats(),
+        "journal": journal_service.get_stats()
+    }
+
 # === PDF Endpoints ===
 @app.post("/analyze_pdf", response_model=PDFAnalysisResponse)
-async def analyze_pdf(file: UploadFile = File(...)):
+async def analyze_pdf(
+    file: UploadFile = File(...),
+    quality: QualityHint = Form("auto"),
+    competitor: Optional[str] = Form(None)
+):
     """
     Анализ PDF файла конкурента
     """
@@ -427,12 +661,14 @@ async def analyze_pdf(file: UploadFile = File(...)):
         # Читаем файл
         logger.info("  📥 Чтение PDF...")
         content = await file.read()
+        journal_service.note_input(file.filename or "file", content)
         file_size_kb = len(content) / 1024
         logger.info(f"  Размер файла: {file_size_kb:.1f} KB")
         
         # Извлекаем текст
         logger.info("  📝 Извлечение текста...")
-        text = pdf_service.extract_text_preview(content)
+        with journal_service.stage("pdf_extract"):
+            text = pdf_service.extract_text_preview(content)
         logger.info(f"  Извлечено символов: {len(text)}")
         
         if not text.strip():
@@ -445,17 +681,21 @@ async def analyze_pdf(file: UploadFile = File(...)):
         
         # Анализируем через GPT
         logger.info("  🤖 Анализ через AI...")
-        analysis = await openai_service.analyze_text(text)
+        analysis = await openai_service.analyze_text(text, quality=quality)
         
         elapsed = time.time() - start_time
         logger.info(f"  ✓ Анализ завершён за {elapsed:.2f} сек")
         
         # Сохраняем в историю
-        history_service.add_entry(
+        usage = usage_service.request_usage()
+        entry = history_service.add_entry(
             request_type="pdf",
             request_summary=f"PDF: {file.filename}",
-            response_summary=analysis.summary[:200] if analysis.summary else f"Текст: {text[:100]}..."
+            response_summary=analysis.summary[:200] if analysis.summary else f"Текст: {text[:100]}...",
+            usage=usage,
+            payload=analysis.model_dump()
         )
+        await _record_trend(competitor, analysis, "pdf", entry.id)
         
         logger.info("  ✅ УСПЕХ: Анализ PDF завершён")
         logger.info("=" * 50)
@@ -463,7 +703,8 @@ async def analyze_pdf(file: UploadFile = File(...)):
         return PDFAnalysisResponse(
             success=True,
             extracted_text=text[:500] + ("..." if len(text) > 500 else ""),
-            analysis=analysis
+            analysis=analysis,
+            model=usage.model if usage else None
         )
         
     except Exception as e:
@@ -472,149 +713,377 @@ async def analyze_pdf(file: UploadFile = File(...)):
         return PDFAnalysisResponse(success=False, error=str(e))
 
 # === Report Endpoints ===
+def _restore_analysis(analysis_data: dict):
+    """Восстановить объект анализа из словаря"""
+    if analysis_data.get('visual_style_score') is not None:
+        return ImageAnalysis(**analysis_data)
+    return CompetitorAnalysis(**analysis_data)
+
+
+# Формат отчёта -> Content-Type и имя файла
+REPORT_FILES = {
+    "html": ("text/html; charset=utf-8", "report.html"),
+    "markdown": ("text/markdown; charset=utf-8", "report.md"),
+    "pdf": ("application/pdf", "report.pdf"),
+}
+
+
+async def _build_report(analysis, report_format: str) -> bytes:
+    """Байты отчёта в поддерживаемом формате (через кэш отчётов)"""
+    return await report_service.render(analysis, report_format)
+
+
+async def _render_report(
+    analysis,
+    report_format: str,
+    build: Optional[Callable[[], Awaitable[bytes]]] = None,
+    filename: Optional[str] = None
+) -> ReportResponse:
+    """
+    Отчёт по объекту анализа в указанном формате (JSON, PDF — в base64)
+
+    build и filename — для отчётов не по одному анализу (сводный отчёт)
+    """
+    if report_format not in REPORT_FILES:
+        logger.warning(f"  ⚠️ Неподдерживаемый формат: {report_format}")
+        logger.info("=" * 50)
+        return ReportResponse(
+            success=False,
+            format=report_format,
+            error=f"Неподдерживаемый формат: {report_format}"
+        )
+    
+    try:
+        content = await (build() if build else _build_report(analysis, report_format))
+    except ImportError as e:
+        logger.error(f"  ❌ Ошибка импорта: {e}")
+        logger.error("=" * 50)
+        return ReportResponse(success=False, format=report_format, error=str(e))
+    except Exception as e:
+        logger.error(f"  ❌ ОШИБКА: {e}")
+        logger.error("=" * 50)
+        return ReportResponse(success=False, format=report_format, error=str(e))
+    
+    return ReportResponse(
+        success=True,
+        format=report_format,
+        content=base64.b64encode(content).decode('utf-8') if report_format == "pdf" else content.decode("utf-8"),
+        filename=filename or REPORT_FILES[report_format][1]
+    )
+
+
+async def _download_report(
+    http_request: Request,
+    analysis,
+    report_format: str,
+    build: Optional[Callable[[], Awaitable[bytes]]] = None,
+    filename: Optional[str] = None
+) -> Response:
+    """
+    Отчёт файлом: байты в теле без base64/JSON, Content-Length и ETag
+
+    Повторный запрос с If-None-Match и тем же содержимым получает 304.
+    """
+    if report_format not in REPORT_FILES:
+        raise HTTPException(status_code=400, detail=f"Неподдерживаемый формат: {report_format}")
+    
+    try:
+        content = await (build() if build else _build_report(analysis, report_format))
+    except PDFQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"  ❌ ОШИБКА: {e}")
+        logger.error("=" * 50)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    media_type, default_filename = REPORT_FILES[report_format]
+    filename = filename or default_filename
+    etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+    headers = {
+        "ETag": etag,
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "private, no-cache",
+    }
+    if http_request.headers.get("if-none-match") == etag:
+        logger.info("  ✓ Отчёт не изменился (304)")
+        return Response(status_code=304, headers=headers)
+    
+    logger.info(f"  ✅ Отчёт файлом: {filename}, {len(content) / 1024:.1f} KB")
+    logger.info("=" * 50)
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+def _history_analysis(item_id: str):
+    """Объект анализа из полного результата записи истории"""
+    payload = history_service.get_payload(item_id)
+    if payload is None:
+        logger.warning(f"  ⚠️ Нет сохранённого результата для записи {item_id}")
+        logger.info("=" * 50)
+        raise HTTPException(status_code=404, detail="Запись истории не найдена или сохранена без полного результата")
+    return _restore_analysis(payload)
+
+
 @app.post("/generate_report", response_model=ReportResponse)
-async def generate_report(request: ReportRequest):
+async def generate_report(request: ReportRequest, http_request: Request):
     """
     Генерация отчёта в указанном формате
+
+    download=true — ответ самим файлом (Content-Type, Content-Disposition, ETag) вместо JSON
     """
     logger.info("=" * 50)
     logger.info("📊 API: ГЕНЕРАЦИЯ ОТЧЁТА")
     logger.info(f"  Формат: {request.format}")
     
     try:
-        # Восстанавливаем объект анализа
-        from backend.models.schemas import CompetitorAnalysis, ImageAnalysis
-        
-        if request.analysis_data.get('visual_style_score') is not None:
-            analysis = ImageAnalysis(**request.analysis_data)
-        else:
-            analysis = CompetitorAnalysis(**request.analysis_data)
-        
-        if request.format == "html":
-            content = report_service.generate_html(analysis)
-            return ReportResponse(
-                success=True,
-                format="html",
-                content=content,
-                filename="report.html"
-            )
-        
-        elif request.format == "markdown":
-            content = report_service.generate_markdown(analysis)
-            return ReportResponse(
-                success=True,
-                format="markdown",
-                content=content,
-                filename="report.md"
-            )
-        
-        elif request.format == "pdf":
-            pdf_bytes = report_service.generate_pdf(analysis)
-            import base64
-            content_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-            return ReportResponse(
-                success=True,
-                format="pdf",
-                content=content_base64,
-                filename="report.pdf"
-            )
-        
-        else:
-            logger.warning(f"  ⚠️ Неподдерживаемый формат: {request.format}")
-            logger.info("=" * 50)
-            return ReportResponse(
-                success=False,
-                format=request.format,
-                error=f"Неподдерживаемый формат: {request.format}"
-            )
-            
-    except ImportError as e:
-        logger.error(f"  ❌ Ошибка импорта: {e}")
+        analysis = _restore_analysis(request.analysis_data)
+    except Exception as e:
+        logger.error(f"  ❌ ОШИБКА: {e}")
         logger.error("=" * 50)
         return ReportResponse(success=False, format=request.format, error=str(e))
+    with journal_service.stage("render_report"):
+        if request.download:
+            return await _download_report(http_request, analysis, request.format)
+        return await _render_report(analysis, request.format)
+
+
+@app.get("/history/{item_id}/report", response_model=ReportResponse)
+async def history_report(http_request: Request, item_id: str, format: str = "html", download: bool = False):
+    """
+    Отчёт по сохранённому результату записи истории (без повторной отправки analysis_data)
+    """
+    logger.info("=" * 50)
+    logger.info("📊 API: ОТЧЁТ ПО ИСТОРИИ")
+    logger.info(f"  Запись: {item_id}, формат: {format}")
+    
+    analysis = await asyncio.to_thread(_history_analysis, item_id)
+    with journal_service.stage("render_report"):
+        if download:
+            return await _download_report(http_request, analysis, format)
+        return await _render_report(analysis, format)
+
+def _check_comparison(request: ComparisonReportRequest):
+    """Число конкурентов и формат сводного отчёта (400 при ошибке)"""
+    if not 2 <= len(request.items) <= settings.comparison_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Для сравнения нужно от 2 до {settings.comparison_max_items} конкурентов"
+        )
+    if request.format not in ("html", "pdf"):
+        raise HTTPException(status_code=400, detail=f"Неподдерживаемый формат сводного отчёта: {request.format}")
+
+
+def _comparison_competitors(items: List[ComparisonReportItem]) -> list:
+    """Пары (название, анализ) для сравнения; записи истории читаются из хранилища"""
+    competitors = []
+    for number, item in enumerate(items, 1):
+        if item.history_id:
+            analysis = _history_analysis(item.history_id)
+        elif item.analysis_data is not None:
+            analysis = _restore_analysis(item.analysis_data)
+        else:
+            raise HTTPException(status_code=400, detail=f"Конкурент {number}: нужен analysis_data или history_id")
+        competitors.append((item.name or f"Конкурент {number}", analysis))
+    return competitors
+
+
+@app.post("/generate_comparison_report", response_model=ReportResponse)
+async def generate_comparison_report(request: ComparisonReportRequest, http_request: Request):
+    """
+    Сводный отчёт по нескольким конкурентам: таблица сравнения и графики каждого
+
+    Графики всех конкурентов рендерятся параллельно в пуле процессов.
+    download=true — ответ файлом (comparison.html / comparison.pdf)
+    """
+    logger.info("=" * 50)
+    logger.info("📊 API: СВОДНЫЙ ОТЧЁТ")
+    logger.info(f"  Конкурентов: {len(request.items)}, формат: {request.format}")
+    
+    _check_comparison(request)
+    
+    try:
+        competitors = await asyncio.to_thread(_comparison_competitors, request.items)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"  ❌ ОШИБКА: {e}")
         logger.error("=" * 50)
         return ReportResponse(success=False, format=request.format, error=str(e))
+    
+    filename = f"comparison.{'pdf' if request.format == 'pdf' else 'html'}"
+    build = partial(report_service.render_comparison, competitors, request.format)
+    with journal_service.stage("render_report"):
+        if request.download:
+            return await _download_report(http_request, None, request.format, build, filename)
+        return await _render_report(None, request.format, build, filename)
 
-# === Visualization Endpoints ===
-@app.post("/visualize", response_model=VisualizationResponse)
-async def visualize(request: VisualizationRequest):
+@app.post("/reports", response_model=ReportJobStatus, status_code=202)
+async def create_report_job(request: ReportJobRequest):
     """
-    Генерация визуализации (графиков)
+    Поставить генерацию отчёта в фоновую очередь
+
+    Ответ сразу: id задания. Статус — GET /reports/{id}, файл — GET /reports/{id}/download.
+    items — сводный отчёт по нескольким конкурентам, иначе analysis_data или history_id.
     """
     logger.info("=" * 50)
-    logger.info("📈 API: ВИЗУАЛИЗАЦИЯ")
-    logger.info(f"  Тип графика: {request.chart_type}")
+    logger.info("📥 API: ЗАДАНИЕ ОТЧЁТА")
+    logger.info(f"  Формат: {request.format}")
     
-    try:
-        from backend.models.schemas import CompetitorAnalysis, ImageAnalysis
-        
-        # Восстанавливаем объект анализа
-        if request.analysis_data.get('visual_style_score') is not None:
-            analysis = ImageAnalysis(**request.analysis_data)
-        else:
-            analysis = CompetitorAnalysis(**request.analysis_data)
-        
-        if request.chart_type == "radar":
-            if not isinstance(analysis, CompetitorAnalysis):
-                logger.warning("  ⚠️ Radar только для текстового анализа")
-                return VisualizationResponse(
-                    success=False,
-                    chart_type="radar",
-                    error="Radar chart доступен только для текстового анализа"
-                )
-            
-            image_base64 = viz_service.generate_radar_chart(
-                strengths=analysis.strengths,
-                weaknesses=analysis.weaknesses,
-                unique_offers=analysis.unique_offers,
-                recommendations=analysis.recommendations,
-                title="Анализ конкурента"
-            )
-        
-        elif request.chart_type == "bar":
-            if not isinstance(analysis, CompetitorAnalysis):
-                logger.warning("  ⚠️ Bar только для текстового анализа")
-                return VisualizationResponse(
-                    success=False,
-                    chart_type="bar",
-                    error="Bar chart доступен только для текстового анализа"
-                )
-            
-            image_base64 = viz_service.generate_comparison_bar_chart(
-                analysis=analysis,
-                title="Сравнение характеристик"
-            )
-        
-        elif request.chart_type == "score":
-            if not isinstance(analysis, ImageAnalysis):
-                logger.warning("  ⚠️ Score только для анализа изображений")
-                return VisualizationResponse(
-                    success=False,
-                    chart_type="score",
-                    error="Score chart доступен только для анализа изображений"
-                )
-            
-            image_base64 = viz_service.generate_visual_score_chart(
-                score=analysis.visual_style_score
-            )
-        
+    if request.items:
+        comparison = ComparisonReportRequest(items=request.items, format=request.format)
+        _check_comparison(comparison)
+        competitors = await asyncio.to_thread(_comparison_competitors, request.items)
+        build = partial(report_service.render_comparison, competitors, request.format)
+        filename = f"comparison.{'pdf' if request.format == 'pdf' else 'html'}"
+    else:
+        if request.format not in REPORT_FILES:
+            raise HTTPException(status_code=400, detail=f"Неподдерживаемый формат: {request.format}")
+        if request.history_id:
+            analysis = await asyncio.to_thread(_history_analysis, request.history_id)
+        elif request.analysis_data is not None:
+            try:
+                analysis = _restore_analysis(request.analysis_data)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=str(e))
         else:
-            logger.warning(f"  ⚠️ Неподдерживаемый тип: {request.chart_type}")
-            logger.info("=" * 50)
-            return VisualizationResponse(
-                success=False,
-                chart_type=request.chart_type,
-                error=f"Неподдерживаемый тип графика: {request.chart_type}"
-            )
+            raise HTTPException(status_code=400, detail="Нужен analysis_data, history_id или items")
+        build = partial(report_service.render, analysis, request.format)
+        filename = REPORT_FILES[request.format][1]
+    
+    try:
+        status = await report_job_service.submit(build, request.format, filename, REPORT_FILES[request.format][0])
+    except ReportJobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+    
+    logger.info(f"  ✅ Задание {status.job_id} в очереди")
+    logger.info("=" * 50)
+    return status
+
+
+@app.get("/reports/{job_id}", response_model=ReportJobStatus)
+async def get_report_job(job_id: str):
+    """
+    Статус задания отчёта: queued (с местом в очереди), running, done, failed
+    """
+    status = await asyncio.to_thread(report_job_service.get_job, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Задание не найдено или срок хранения истёк")
+    return status
+
+
+@app.get("/reports/{job_id}/download")
+async def download_report_job(job_id: str):
+    """
+    Готовый отчёт файлом
+    """
+    status = await asyncio.to_thread(report_job_service.get_job, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Задание не найдено или срок хранения истёк")
+    artifact = await asyncio.to_thread(report_job_service.get_file, job_id)
+    if artifact is None:
+        raise HTTPException(status_code=409, detail=f"Отчёт не готов: {status.status}")
+    path, filename, media_type = artifact
+    return FileResponse(path, media_type=media_type, filename=filename)
+
+# === Visualization Endpoints ===
+# Графики сравнения: вместо анализа — список пар (название, анализ)
+COMPARISON = object()
+
+# Тип графика -> метод VisualizationService, класс анализа (или COMPARISON) и заголовок по умолчанию
+CHART_TYPES = {
+    "radar": ("generate_radar_chart", CompetitorAnalysis, "Анализ конкурента"),
+    "bar": ("generate_comparison_bar_chart", CompetitorAnalysis, "Сравнение характеристик"),
+    "score": ("generate_visual_score_chart", ImageAnalysis, None),
+    "compare_radar": ("generate_overlay_radar_chart", COMPARISON, "Сравнение конкурентов"),
+    "compare_bar": ("generate_grouped_bar_chart", COMPARISON, "Сравнение характеристик"),
+    "compare_heatmap": ("generate_scores_heatmap", COMPARISON, "Оценки конкурентов"),
+}
+
+
+def _chart_job(analysis, chart_type: str, output: dict, title: Optional[str] = None) -> tuple:
+    """
+    Метод и аргументы рендера графика
+
+    Raises:
+        ValueError: Неизвестный тип графика или он не подходит к типу анализа
+    """
+    if chart_type not in CHART_TYPES:
+        raise ValueError(f"Неподдерживаемый тип графика: {chart_type}")
+    method, analysis_type, default_title = CHART_TYPES[chart_type]
+    if analysis_type is COMPARISON:
+        if not isinstance(analysis, list):
+            raise ValueError(f"{chart_type} строится по нескольким конкурентам (items)")
+        names = [name for name, _ in analysis]
+        kwargs = dict(names=names, matrix=competitor_matrix([item for _, item in analysis]))
+        return method, dict(kwargs, title=title or default_title, **output)
+    if isinstance(analysis, list):
+        raise ValueError(f"{chart_type.capitalize()} chart строится по одному анализу (analysis_data)")
+    if not isinstance(analysis, analysis_type):
+        kind = "текстового анализа" if analysis_type is CompetitorAnalysis else "анализа изображений"
+        raise ValueError(f"{chart_type.capitalize()} chart доступен только для {kind}")
+
+    if chart_type == "radar":
+        kwargs = dict(
+            strengths=analysis.strengths,
+            weaknesses=analysis.weaknesses,
+            unique_offers=analysis.unique_offers,
+            recommendations=analysis.recommendations
+        )
+    elif chart_type == "bar":
+        kwargs = dict(analysis=analysis)
+    else:
+        kwargs = dict(score=analysis.visual_style_score)
+    if default_title:
+        kwargs["title"] = title or default_title
+    return method, dict(kwargs, **output)
+
+
+def _chart_output(image_format: str, dpi: int, width: Optional[int], height: Optional[int]) -> dict:
+    """Параметры изображения для метода рендера"""
+    return dict(fmt=image_format, dpi=dpi, size=(width, height) if width or height else None)
+
+
+async def _render_chart(
+    analysis,
+    chart_type: str,
+    image_format: str = "png",
+    dpi: int = 150,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    title: Optional[str] = None
+) -> VisualizationResponse:
+    """
+    График по объекту анализа (рендер в пуле процессов) в формате png, svg или webp
+
+    Для compare_* analysis — список пар (название, анализ)
+    """
+    if image_format not in CHART_FORMATS:
+        logger.warning(f"  ⚠️ Неподдерживаемый формат изображения: {image_format}")
+        logger.info("=" * 50)
+        return VisualizationResponse(
+            success=False,
+            chart_type=chart_type,
+            format=image_format,
+            error=f"Неподдерживаемый формат изображения: {image_format} (png, svg, webp)"
+        )
+    
+    try:
+        method, kwargs = _chart_job(analysis, chart_type, _chart_output(image_format, dpi, width, height), title)
+    except ValueError as e:
+        logger.warning(f"  ⚠️ {e}")
+        logger.info("=" * 50)
+        return VisualizationResponse(success=False, chart_type=chart_type, error=str(e))
+    
+    try:
+        image_base64 = await viz_service.render(method, kwargs)
         
         if not image_base64:
             logger.warning("  ⚠️ График не сгенерирован")
             logger.info("=" * 50)
             return VisualizationResponse(
                 success=False,
-                chart_type=request.chart_type,
+                chart_type=chart_type,
                 error="Не удалось сгенерировать график"
             )
         
@@ -623,14 +1092,160 @@ async def visualize(request: VisualizationRequest):
         
         return VisualizationResponse(
             success=True,
-            chart_type=request.chart_type,
-            image_base64=image_base64
+            chart_type=chart_type,
+            image_base64=image_base64,
+            format=image_format,
+            mime_type=CHART_FORMATS[image_format]
         )
         
+    except ChartQueueFull as e:
+        logger.info("=" * 50)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "2"})
+    except Exception as e:
+        logger.error(f"  ❌ ОШИБКА: {e}")
+        logger.error("=" * 50)
+        return VisualizationResponse(success=False, chart_type=chart_type, error=str(e))
+
+
+@app.post("/visualize", response_model=VisualizationResponse)
+async def visualize(request: VisualizationRequest):
+    """
+    Генерация визуализации (графиков)
+
+    radar, bar, score — по analysis_data; compare_radar, compare_bar,
+    compare_heatmap — по items (от 2 до chart_max_competitors конкурентов)
+    """
+    logger.info("=" * 50)
+    logger.info("📈 API: ВИЗУАЛИЗАЦИЯ")
+    logger.info(f"  Тип графика: {request.chart_type}, формат: {request.format}, dpi: {request.dpi}")
+    
+    try:
+        if request.items is not None:
+            logger.info(f"  Конкурентов: {len(request.items)}")
+            if not 2 <= len(request.items) <= settings.chart_max_competitors:
+                raise ValueError(f"Для сравнения нужно от 2 до {settings.chart_max_competitors} конкурентов")
+            analysis = await asyncio.to_thread(_comparison_competitors, request.items)
+        elif request.analysis_data is not None:
+            analysis = _restore_analysis(request.analysis_data)
+        else:
+            raise ValueError("Нужен analysis_data или items")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"  ❌ ОШИБКА: {e}")
         logger.error("=" * 50)
         return VisualizationResponse(success=False, chart_type=request.chart_type, error=str(e))
+    with journal_service.stage("render_chart"):
+        return await _render_chart(
+            analysis, request.chart_type, request.format, request.dpi, request.width, request.height, request.title
+        )
+
+
+@app.get("/history/{item_id}/chart", response_model=VisualizationResponse)
+async def history_chart(
+    item_id: str,
+    type: str = "radar",
+    format: str = "png",
+    dpi: int = Query(150, ge=50, le=300),
+    width: Optional[int] = Query(None, ge=100, le=4000),
+    height: Optional[int] = Query(None, ge=100, le=4000)
+):
+    """
+    График по сохранённому результату записи истории
+    """
+    logger.info("=" * 50)
+    logger.info("📈 API: ГРАФИК ПО ИСТОРИИ")
+    logger.info(f"  Запись: {item_id}, тип: {type}")
+    
+    analysis = await asyncio.to_thread(_history_analysis, item_id)
+    with journal_service.stage("render_chart"):
+        return await _render_chart(analysis, type, format, dpi, width, height)
+
+@app.get("/charts/{chart_type}")
+async def get_chart(
+    http_request: Request,
+    chart_type: str,
+    history_id: Optional[str] = None,
+    strengths: int = Query(0, ge=0, le=100),
+    weaknesses: int = Query(0, ge=0, le=100),
+    unique_offers: int = Query(0, ge=0, le=100),
+    recommendations: int = Query(0, ge=0, le=100),
+    score: Optional[int] = Query(None, ge=0, le=10),
+    title: Optional[str] = Query(None, max_length=200),
+    format: str = "png",
+    dpi: int = Query(150, ge=50, le=300),
+    width: Optional[int] = Query(None, ge=100, le=4000),
+    height: Optional[int] = Query(None, ge=100, le=4000)
+):
+    """
+    График самим изображением (не base64 в JSON) — браузер кэширует его по URL
+
+    Данные — запись истории (history_id) или счётчики в query: radar/bar зависят только
+    от числа пунктов, score — от оценки. Сильный ETag считается по входам графика,
+    поэтому If-None-Match получает 304 без рендера. Графики записей истории —
+    private, no-cache; по query-параметрам — public с chart_http_max_age.
+    """
+    logger.info("=" * 50)
+    logger.info("📈 API: ГРАФИК ИЗОБРАЖЕНИЕМ")
+    logger.info(f"  Тип: {chart_type}, формат: {format}" + (f", запись: {history_id}" if history_id else ""))
+    
+    if format not in CHART_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Неподдерживаемый формат изображения: {format} (png, svg, webp)")
+    
+    if history_id:
+        analysis = await asyncio.to_thread(_history_analysis, history_id)
+    elif chart_type == "score":
+        if score is None:
+            raise HTTPException(status_code=400, detail="Для score нужен параметр score (0-10)")
+        analysis = ImageAnalysis(visual_style_score=score)
+    else:
+        # Картинка зависит только от длины списков — содержимое пунктов не нужно
+        analysis = CompetitorAnalysis(
+            strengths=[""] * strengths,
+            weaknesses=[""] * weaknesses,
+            unique_offers=[""] * unique_offers,
+            recommendations=[""] * recommendations
+        )
+    
+    try:
+        method, kwargs = _chart_job(analysis, chart_type, _chart_output(format, dpi, width, height), title)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # If-None-Match: * совпадает с любым ETag — 304 только если график вообще строится
+    if not chart_renderable(method, kwargs):
+        raise HTTPException(status_code=422, detail="Недостаточно данных для графика")
+    
+    etag = chart_etag(method, kwargs)
+    if history_id:
+        # Данные записи истории: не для общих кэшей, а после удаления записи не отдаются
+        # из кэша браузера без проверки — ETag делает повторную проверку дешёвой (304)
+        headers = {"Cache-Control": "private, no-cache"}
+    else:
+        # Только параметры запроса — картинка одинакова для всех
+        headers = {"Cache-Control": f"public, max-age={settings.chart_http_max_age}"}
+    if etag:
+        headers["ETag"] = etag
+        if_none_match = http_request.headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            logger.info("  ✓ График не изменился (304)")
+            logger.info("=" * 50)
+            return Response(status_code=304, headers=headers)
+    
+    try:
+        with journal_service.stage("render_chart"):
+            image_base64 = await viz_service.render(method, kwargs)
+    except ChartQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "2"})
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    if not image_base64:
+        raise HTTPException(status_code=422, detail="Недостаточно данных для графика")
+    
+    content = base64.b64decode(image_base64)
+    logger.info(f"  ✅ График: {len(content) / 1024:.1f} KB")
+    logger.info("=" * 50)
+    return Response(content=content, media_type=CHART_FORMATS[format], headers=headers)
 
 # Статические файлы для фронтенда
 app.mount("/static", StaticFiles(directory="frontend"), name="static")
@@ -2,20 +2,29 @@
 Pydantic схемы для API
 """
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Literal, Optional, List
 from pydantic import BaseModel, Field
 
+# Подсказка выбора модели (model_router.QUALITY_HINTS); неизвестное значение — 422
+QualityHint = Literal["auto", "fast", "high"]
+
+# ID пакетного задания — имя файла чекпоинта, без разделителей пути
+JOB_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
 
 # === Запросы ===
 
 class TextAnalysisRequest(BaseModel):
     """Запрос на анализ текста"""
     text: str = Field(..., min_length=10, description="Текст для анализа")
+    quality: QualityHint = Field("auto", description="Подсказка выбора модели: auto, fast, high")
+    competitor: Optional[str] = Field(None, description="Сайт или название конкурента — для трендов оценок")
 
 
 class ParseDemoRequest(BaseModel):
     """Запрос на парсинг URL"""
     url: str = Field(..., description="URL для парсинга")
+    quality: QualityHint = Field("auto", description="Подсказка выбора модели: auto, fast, high")
 
 
 # === Ответы ===
@@ -55,6 +64,7 @@ class TextAnalysisResponse(BaseModel):
     """Ответ на анализ текста"""
     success: bool
     analysis: Optional[CompetitorAnalysis] = None
+    model: Optional[str] = None  # Модель, выбранная маршрутизатором
     error: Optional[str] = None
 
 
@@ -62,6 +72,7 @@ class ImageAnalysisResponse(BaseModel):
     """Ответ на анализ изображения"""
     success: bool
     analysis: Optional[ImageAnalysis] = None
+    model: Optional[str] = None  # Модель, выбранная маршрутизатором
     error: Optional[str] = None
 
 
@@ -69,9 +80,76 @@ class ParseDemoResponse(BaseModel):
     """Ответ на парсинг"""
     success: bool
     data: Optional[ParsedContent] = None
+    model: Optional[str] = None  # Модель, выбранная маршрутизатором
     error: Optional[str] = None
 
 
+# === Пакетный анализ ===
+
+class BatchItem(BaseModel):
+    """Элемент пакетного анализа: готовый текст или распарсенная страница"""
+    id: str
+    text: Optional[str] = None
+    url: Optional[str] = None
+    title: Optional[str] = None
+    h1: Optional[str] = None
+    first_paragraph: Optional[str] = None
+
+
+class BatchJobRequest(BaseModel):
+    """Запрос на создание/дополнение пакетного задания"""
+    items: List[BatchItem]
+    job_id: Optional[str] = Field(None, pattern=JOB_ID_PATTERN)  # Существующее задание дополняется и возобновляется
+    quality: QualityHint = "auto"
+
+
+class BatchJobStatus(BaseModel):
+    """Статус пакетного задания"""
+    job_id: str
+    status: str  # pending, running, done, failed
+    total: int
+    completed: int
+    failed: int
+    created_at: datetime
+    updated_at: datetime
+    results: Dict[str, CompetitorAnalysis] = Field(default_factory=dict)
+    errors: Dict[str, str] = Field(default_factory=dict)
+
+
+# === Использование токенов ===
+
+class TokenUsage(BaseModel):
+    """Использование токенов и задержка вызовов модели"""
+    model: str = ""
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    image_tokens: int = 0  # Оценка, входит в prompt_tokens
+    total_tokens: int = 0
+    latency_ms: float = 0.0
+    cost_usd: float = 0.0
+
+
+class UsageStatsItem(BaseModel):
+    """Агрегат использования по ключу группировки"""
+    key: str
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    image_tokens: int = 0
+    total_tokens: int = 0
+    cost_usd: float = 0.0
+    avg_latency_ms: float = 0.0
+    max_latency_ms: float = 0.0
+
+
+class UsageStatsResponse(BaseModel):
+    """Ответ со статистикой использования"""
+    group_by: str  # endpoint, model, day
+    items: List[UsageStatsItem]
+    total: UsageStatsItem
+
+
 # === История ===
 
 class HistoryItem(BaseModel):
@@ -81,12 +159,16 @@ class HistoryItem(BaseModel):
     request_type: str  # "text", "image", "parse"
     request_summary: str
     response_summary: str
+    usage: Optional[TokenUsage] = None
+    has_payload: bool = False  # Есть полный результат: /history/{id}/report и /history/{id}/chart
 
 
 class HistoryResponse(BaseModel):
     """Ответ со списком истории"""
     items: List[HistoryItem]
-    total: int
+    total: Optional[int] = None  # Считается только для первой страницы (без cursor)
+    next_cursor: Optional[str] = None  # Курсор следующей страницы, None — страниц больше нет
+
 
 # === PDF ===
 class PDFAnalysisRequest(BaseModel):
@@ -98,13 +180,50 @@ class PDFAnalysisResponse(BaseModel):
     success: bool
     extracted_text: Optional[str] = None
     analysis: Optional[CompetitorAnalysis] = None
+    model: Optional[str] = None  # Модель, выбранная маршрутизатором
     error: Optional[str] = None
 
+
 # === Report ===
 class ReportRequest(BaseModel):
     """Запрос на генерацию отчёта"""
     analysis_data: dict  # Данные анализа для отчёта
     format: str = "html"  # html, markdown, pdf
+    download: bool = False  # True — ответ файлом, а не JSON с содержимым
+
+class ComparisonReportItem(BaseModel):
+    """Конкурент в сводном отчёте: данные анализа или запись истории"""
+    name: Optional[str] = None  # По умолчанию "Конкурент N"
+    analysis_data: Optional[dict] = None
+    history_id: Optional[str] = None
+
+class ComparisonReportRequest(BaseModel):
+    """Запрос сводного отчёта по нескольким конкурентам"""
+    items: List[ComparisonReportItem]
+    format: str = "html"  # html, pdf
+    download: bool = False
+
+class ReportJobRequest(BaseModel):
+    """Задание на генерацию отчёта: один анализ (данные или запись истории) или сравнение"""
+    analysis_data: Optional[dict] = None
+    history_id: Optional[str] = None
+    items: Optional[List[ComparisonReportItem]] = None  # Сводный отчёт (html, pdf)
+    format: str = "pdf"  # html, markdown, pdf
+
+class ReportJobStatus(BaseModel):
+    """Статус задания на генерацию отчёта"""
+    job_id: str
+    status: str  # queued, running, done, failed
+    format: str
+    filename: str
+    queue_position: Optional[int] = None  # Для queued: 1 — следующее
+    size: Optional[int] = None  # Байт, для done
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None  # После этого файл удаляется
+    error: Optional[str] = None
+    download_url: Optional[str] = None
 
 class ReportResponse(BaseModel):
     """Ответ сгенерированным отчётом"""
@@ -114,15 +233,64 @@ class ReportResponse(BaseModel):
     filename: Optional[str] = None
     error: Optional[str] = None
 
+
 # === Visualization ===
 class VisualizationRequest(BaseModel):
     """Запрос на генерацию визуализации"""
-    analysis_data: dict
-    chart_type: str = "radar"  # radar, bar, score
+    analysis_data: Optional[dict] = None
+    items: Optional[List[ComparisonReportItem]] = None  # Для compare_radar, compare_bar, compare_heatmap
+    chart_type: str = "radar"  # radar, bar, score, compare_radar, compare_bar, compare_heatmap
+    title: Optional[str] = None
+    format: str = "png"  # png, svg, webp
+    dpi: int = Field(150, ge=50, le=300)
+    width: Optional[int] = Field(None, ge=100, le=4000)  # Пиксели; без height — с исходными пропорциями
+    height: Optional[int] = Field(None, ge=100, le=4000)
 
 class VisualizationResponse(BaseModel):
     """Ответ с изображением визуализации"""
     success: bool
     chart_type: str
     image_base64: Optional[str] = None
-    error: Optional[str] = None
\ No newline at end of file
+    format: str = "png"
+    mime_type: Optional[str] = None  # Для data:<mime_type>;base64,...
+    error: Optional[str] = None
+
+
+# === Trends ===
+class TrendPoint(BaseModel):
+    """Агрегат оценок конкурента за день или неделю"""
+    bucket: str  # Дата начала периода
+    analyses: int
+    design_score_avg: Optional[float] = None
+    design_score_min: Optional[int] = None
+    design_score_max: Optional[int] = None
+    technology_potential_avg: Optional[float] = None
+    technology_potential_min: Optional[int] = None
+    technology_potential_max: Optional[int] = None
+    visual_style_score_avg: Optional[float] = None
+    visual_style_score_min: Optional[int] = None
+    visual_style_score_max: Optional[int] = None
+    strengths_avg: float = 0.0
+    weaknesses_avg: float = 0.0
+    unique_offers_avg: float = 0.0
+    recommendations_avg: float = 0.0
+    marketing_insights_avg: float = 0.0
+
+class TrendResponse(BaseModel):
+    """Тренд оценок конкурента"""
+    competitor: str
+    period: str  # day, week
+    points: List[TrendPoint]
+
+class CompetitorTrendSummary(BaseModel):
+    """Конкурент в трендах: число анализов и последние оценки"""
+    competitor: str
+    analyses: int
+    last_seen: datetime
+    design_score: Optional[int] = None
+    technology_potential: Optional[int] = None
+    visual_style_score: Optional[int] = None
+
+class CompetitorListResponse(BaseModel):
+    """Список конкурентов с трендами"""
+    items: List[CompetitorTrendSummary]
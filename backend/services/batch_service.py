@@ -0,0 +1,293 @@
+"""
+Офлайн-очередь пакетного анализа с возобновляемыми чекпоинтами
+
+Короткие элементы упаковываются по несколько штук в один запрос к модели
+(OpenAIService.analyze_batch), длинные анализируются по одному. После каждого
+пакета состояние задания атомарно сохраняется в JSON, поэтому прерванное
+задание продолжается с места остановки.
+
+Запуск из cron:
+    python -m backend.services.batch_service items.json [job_id]
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from backend.config import settings
+from backend.models.schemas import BatchItem, BatchJobStatus
+from backend.services.openai_service import openai_service
+from backend.services.trends_service import trends_service
+
+logger = logging.getLogger("competitor_monitor.batch")
+
+
+class BatchJobRunning(Exception):
+    """Задание выполняется — дополнить его можно после завершения"""
+
+
+class InvalidJobId(ValueError):
+    """ID задания указывает за пределы каталога заданий"""
+
+
+class BatchService:
+    """Пакетный анализ конкурентов в фоне"""
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Batch сервиса")
+
+        self.jobs_dir = Path(settings.batch_jobs_dir)
+        self.max_items = settings.batch_max_items
+        self.max_chars = settings.batch_max_chars
+        self.max_item_chars = settings.batch_max_item_chars
+        self._running: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+        logger.info(f"  Каталог заданий: {self.jobs_dir}")
+        logger.info(f"  Пакет: до {self.max_items} элементов / {self.max_chars} символов")
+        logger.info("Batch сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    # === Чекпоинты ===
+
+    def _job_path(self, job_id: str) -> Path:
+        """
+        Путь чекпоинта задания
+
+        Raises:
+            InvalidJobId: Путь выходит за пределы jobs_dir ("../history" и т.п.)
+        """
+        path = (self.jobs_dir / f"{job_id}.json").resolve()
+        if path.parent != self.jobs_dir.resolve():
+            raise InvalidJobId(f"Недопустимый ID задания: {job_id!r}")
+        return path
+
+    def _load_job(self, job_id: str) -> Optional[dict]:
+        """Загрузить чекпоинт задания"""
+        path = self._job_path(job_id)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def _save_job(self, job: dict):
+        """Атомарно сохранить чекпоинт (запись во временный файл + rename)"""
+        job["updated_at"] = datetime.now().isoformat()
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        path = self._job_path(job["job_id"])
+        # Свой временный файл у каждого писателя: запись из API и из потока задания не пересекаются
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _item_text(self, item: BatchItem) -> str:
+        """Текст элемента: готовый текст или собранная распарсенная страница"""
+        if item.text:
+            return item.text
+        text = openai_service.compose_parsed_text(item.title, item.h1, item.first_paragraph)
+        if item.url and text:
+            text = f"URL сайта: {item.url}\n\n{text}"
+        return text
+
+    # === Задания ===
+
+    def create_job(self, items: List[BatchItem], job_id: Optional[str] = None, quality: str = "auto") -> BatchJobStatus:
+        """
+        Создать задание (или дополнить существующее новыми элементами)
+
+        Args:
+            items: Элементы для анализа
+            job_id: ID задания; существующее задание продолжается
+            quality: Подсказка выбора модели
+
+        Returns:
+            Статус задания
+
+        Raises:
+            BatchJobRunning: Задание с этим job_id сейчас выполняется — поток задания
+                перезаписал бы новые элементы своим чекпоинтом
+            InvalidJobId: job_id указывает за пределы каталога заданий
+        """
+        job_id = job_id or uuid.uuid4().hex
+        if self.is_running(job_id):
+            raise BatchJobRunning(f"Задание {job_id} выполняется, дополните его после завершения")
+        job = self._load_job(job_id) or {
+            "job_id": job_id,
+            "status": "pending",
+            "quality": quality,
+            "created_at": datetime.now().isoformat(),
+            "items": {},
+            "results": {},
+            "errors": {},
+            "competitors": {},
+        }
+
+        for item in items:
+            text = self._item_text(item)
+            if text.strip():
+                job["items"][item.id] = text
+                if item.url:
+                    job.setdefault("competitors", {})[item.id] = item.url
+            else:
+                job["errors"][item.id] = "Пустой элемент"
+
+        self._save_job(job)
+        logger.info(f"📦 Задание {job_id[:8]}: {len(job['items'])} элементов")
+        return self._to_status(job)
+
+    def get_job(self, job_id: str, include_results: bool = True) -> Optional[BatchJobStatus]:
+        """
+        Статус задания из чекпоинта
+
+        Raises:
+            InvalidJobId: job_id указывает за пределы каталога заданий
+        """
+        job = self._load_job(job_id)
+        if job is None:
+            return None
+        return self._to_status(job, include_results=include_results)
+
+    def is_running(self, job_id: str) -> bool:
+        """Выполняется ли задание в фоновом потоке"""
+        with self._lock:
+            thread = self._running.get(job_id)
+            return bool(thread and thread.is_alive())
+
+    def start_job(self, job_id: str) -> bool:
+        """
+        Запустить (или возобновить) задание в фоновом потоке
+
+        Returns:
+            False, если задание уже выполняется
+        """
+        with self._lock:
+            thread = self._running.get(job_id)
+            if thread and thread.is_alive():
+                return False
+            thread = threading.Thread(
+                target=asyncio.run,
+                args=(self.run_job(job_id),),
+                name=f"batch-{job_id[:8]}",
+                daemon=True
+            )
+            self._running[job_id] = thread
+        thread.start()
+        return True
+
+    def _pending_chunks(self, job: dict) -> List[Dict[str, str]]:
+        """Разбить необработанные элементы на пакеты по лимитам"""
+        chunks: List[Dict[str, str]] = []
+        current: Dict[str, str] = {}
+        current_chars = 0
+
+        for item_id, text in job["items"].items():
+            if item_id in job["results"]:
+                continue
+            if len(text) > self.max_item_chars:
+                # Длинный элемент — отдельным запросом
+                chunks.append({item_id: text})
+                continue
+            if current and (len(current) >= self.max_items or current_chars + len(text) > self.max_chars):
+                chunks.append(current)
+                current, current_chars = {}, 0
+            current[item_id] = text
+            current_chars += len(text)
+
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def run_job(self, job_id: str) -> BatchJobStatus:
+        """Обработать все необработанные элементы задания с чекпоинтом после каждого пакета"""
+        job = self._load_job(job_id)
+        if job is None:
+            raise ValueError(f"Задание не найдено: {job_id}")
+
+        chunks = self._pending_chunks(job)
+        logger.info("=" * 50)
+        logger.info(f"📦 ЗАПУСК ЗАДАНИЯ {job_id[:8]}")
+        logger.info(f"  Осталось элементов: {sum(len(c) for c in chunks)}, пакетов: {len(chunks)}")
+
+        job["status"] = "running"
+        self._save_job(job)
+
+        for index, chunk in enumerate(chunks, start=1):
+            logger.info(f"  Пакет {index}/{len(chunks)}: {len(chunk)} элементов")
+            try:
+                if len(chunk) == 1:
+                    item_id, text = next(iter(chunk.items()))
+                    results = {item_id: await openai_service.analyze_text(text, quality=job["quality"])}
+                else:
+                    results = await openai_service.analyze_batch(chunk, quality=job["quality"])
+                    # Пропущенные моделью элементы — по одному
+                    for item_id in chunk.keys() - results.keys():
+                        results[item_id] = await openai_service.analyze_text(chunk[item_id], quality=job["quality"])
+            except Exception as e:
+                logger.error(f"  ✗ Ошибка пакета {index}: {e}")
+                for item_id in chunk:
+                    job["errors"][item_id] = str(e)
+                self._save_job(job)
+                continue
+
+            for item_id, analysis in results.items():
+                job["results"][item_id] = analysis.model_dump()
+                job["errors"].pop(item_id, None)
+                competitor = job.get("competitors", {}).get(item_id)
+                if competitor:
+                    try:
+                        trends_service.record(competitor, analysis, "batch")
+                    except Exception as e:
+                        logger.warning(f"  ⚠ Точка тренда для {item_id} не записана: {e}")
+            self._save_job(job)
+
+        # failed — остались необработанные элементы, их можно возобновить
+        pending = job["items"].keys() - job["results"].keys()
+        job["status"] = "failed" if pending else "done"
+        self._save_job(job)
+
+        logger.info(f"  ✅ Задание {job_id[:8]}: {len(job['results'])} готово, {len(job['errors'])} ошибок")
+        logger.info("=" * 50)
+        return self._to_status(job)
+
+    def _to_status(self, job: dict, include_results: bool = True) -> BatchJobStatus:
+        return BatchJobStatus(
+            job_id=job["job_id"],
+            status=job["status"],
+            total=len(job["items"]),
+            completed=len(job["results"]),
+            failed=len(job["errors"]),
+            created_at=job["created_at"],
+            updated_at=job.get("updated_at", job["created_at"]),
+            results=job["results"] if include_results else {},
+            errors=job["errors"]
+        )
+
+
+# Глобальный экземпляр
+batch_service = BatchService()
+
+
+if __name__ == "__main__":
+    # items.json: список объектов BatchItem
+    if len(sys.argv) < 2:
+        print("Использование: python -m backend.services.batch_service items.json [job_id]")
+        sys.exit(1)
+
+    raw_items = json.loads(Path(sys.argv[1]).read_text(encoding="utf-8"))
+    status = batch_service.create_job(
+        [BatchItem(**item) for item in raw_items],
+        job_id=sys.argv[2] if len(sys.argv) > 2 else None
+    )
+    print(f"Задание: {status.job_id}")
+    status = asyncio.run(batch_service.run_job(status.job_id))
+    print(f"Готово: {status.completed}/{status.total}, ошибок: {status.failed}")
+    sys.exit(0 if status.status == "done" else 2)
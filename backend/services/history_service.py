@@ -1,54 +1,154 @@
 """
 Сервис для работы с историей запросов
 """
+import atexit
+import base64
 import json
+import os
+import queue
+import sqlite3
+import threading
+import time
 import uuid
+import zlib
 import logging
-from datetime import datetime
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Tuple
 
 from backend.config import settings
-from backend.models.schemas import HistoryItem
+from backend.models.schemas import HistoryItem, TokenUsage
 
 # Логгер для сервиса
 logger = logging.getLogger("competitor_monitor.history")
 
+# Политики fsync: full — после каждого пакета (и каталог для JSON),
+# normal — SQLite синхронизирует на checkpoint, JSON — только файл, off — на усмотрение ОС
+FSYNC_POLICIES = {"full": "FULL", "normal": "NORMAL", "off": "OFF"}
+
+# Повтор записи пакета при ошибке хранилища: пауза растёт от базовой до максимальной
+WRITE_RETRY_BASE_DELAY = 0.1
+WRITE_RETRY_MAX_DELAY = 5.0
+# При остановке сервиса ждать хранилище бесконечно нельзя
+WRITE_RETRIES_ON_CLOSE = 3
+
+
+def encode_cursor(item: dict) -> str:
+    """Курсор страницы: позиция последней записи в порядке (timestamp, id)"""
+    raw = f"{item['timestamp']}|{item['id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Разобрать курсор в (timestamp, id)"""
+    try:
+        timestamp, item_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+    except (ValueError, UnicodeError):
+        raise ValueError("Некорректный курсор")
+    return timestamp, item_id
+
+
+def pack_payload(data: dict) -> bytes:
+    """Полный результат анализа -> сжатый JSON"""
+    return zlib.compress(json.dumps(data, ensure_ascii=False, default=str).encode("utf-8"), 6)
+
+
+def unpack_payload(blob: bytes) -> dict:
+    """Сжатый JSON -> полный результат анализа"""
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def _fts_query(text: str) -> str:
+    """Поисковая строка -> запрос FTS5: все слова, с поиском по префиксу"""
+    words = [word.replace('"', '') for word in text.split()]
+    return " ".join(f'"{word}"*' for word in words if word)
+
+
+def _matches(
+    item: dict,
+    before: Optional[Tuple[str, str]] = None,
+    request_type: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    q: Optional[str] = None
+) -> bool:
+    """Подходит ли запись под фильтры query (поиск — все слова как подстроки, без учёта регистра)"""
+    if before and (item["timestamp"], item["id"]) >= before:
+        return False
+    if request_type and item["request_type"] != request_type:
+        return False
+    if since and item["timestamp"] < since:
+        return False
+    if until and item["timestamp"] > until:
+        return False
+    if q:
+        text = f"{item['request_summary']} {item['response_summary']}".lower()
+        return all(word.lower() in text for word in q.split())
+    return True
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Межпроцессная эксклюзивная блокировка через lock-файл"""
+    with open(path, "a+b") as lock_file:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK сдаётся после ~10 сек ожидания — пробуем снова
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class JSONHistoryStore:
+    """
+    История в JSON файле (файл перезаписывается целиком при каждом изменении)
+
+    Чтение-изменение-запись выполняется под межпроцессной блокировкой
+    (history.json.lock), поэтому несколько воркеров uvicorn не теряют записи.
+    """
+
+    def __init__(self, path: Path, max_items: int, retention_days: int, fsync: str = "normal"):
+        self.path = path
+        self.lock_path = path.with_name(path.name + ".lock")
+        self.max_items = max_items
+        self.retention_days = retention_days
+        self.fsync = fsync
+        # Версия файла после нашей последней записи/чтения и флаг чужих изменений до неё
+        self._own_version = None
+        self._external_change = False
+        with _file_lock(self.lock_path):
+            self._ensure_file_exists()
 
-class HistoryService:
-    """Управление историей запросов"""
-    
-    def __init__(self):
-        logger.info("=" * 50)
-        logger.info("Инициализация History сервиса")
-        
-        self.history_file = Path(settings.history_file)
-        self.max_items = settings.max_history_items
-        
-        logger.info(f"  Файл истории: {self.history_file}")
-        logger.info(f"  Макс. записей: {self.max_items}")
-        
-        self._ensure_file_exists()
-        
-        # Загружаем и показываем текущее состояние
-        history = self._load_history()
-        logger.info(f"  Текущих записей: {len(history)}")
-        logger.info("History сервис инициализирован ✓")
-        logger.info("=" * 50)
-    
     def _ensure_file_exists(self):
         """Создать файл истории если его нет"""
-        if not self.history_file.exists():
-            logger.info(f"  📁 Создание файла истории: {self.history_file}")
-            self.history_file.write_text("[]", encoding="utf-8")
+        if not self.path.exists():
+            logger.info(f"  📁 Создание файла истории: {self.path}")
+            self.path.write_text("[]", encoding="utf-8")
             logger.info("  ✓ Файл создан")
         else:
-            logger.debug(f"  Файл истории существует: {self.history_file}")
-    
-    def _load_history(self) -> List[dict]:
+            logger.debug(f"  Файл истории существует: {self.path}")
+
+    def _load(self) -> List[dict]:
         """Загрузить историю из файла"""
         try:
-            content = self.history_file.read_text(encoding="utf-8")
+            content = self.path.read_text(encoding="utf-8")
             history = json.loads(content)
             logger.debug(f"История загружена: {len(history)} записей")
             return history
@@ -56,72 +156,706 @@ class HistoryService:
             logger.warning(f"Ошибка парсинга JSON истории: {e}")
             return []
         except FileNotFoundError:
-            logger.warning(f"Файл истории не найден: {self.history_file}")
+            logger.warning(f"Файл истории не найден: {self.path}")
             return []
-    
-    def _save_history(self, history: List[dict]):
-        """Сохранить историю в файл"""
+
+    def _save(self, history: List[dict]):
+        """Атомарно сохранить историю: временный файл + fsync + rename"""
         logger.debug(f"Сохранение истории: {len(history)} записей")
-        self.history_file.write_text(
-            json.dumps(history, ensure_ascii=False, indent=2, default=str),
-            encoding="utf-8"
-        )
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(history, f, ensure_ascii=False, default=str)
+            if self.fsync != "off":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._own_version = self.version()
+
+        if self.fsync == "full" and hasattr(os, "O_DIRECTORY"):
+            # Фиксируем сам rename в каталоге
+            dir_fd = os.open(self.path.parent, os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
         logger.debug("История сохранена ✓")
-    
+
+    def version(self):
+        """Отпечаток файла: меняется при каждой перезаписи"""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def changed_externally(self) -> bool:
+        """Файл перезаписан другим процессом после прошлой проверки"""
+        changed = self._external_change or self.version() != self._own_version
+        self._external_change = False
+        return changed
+
+    def add_many(self, items: List[dict]):
+        """Добавить пакет записей (в порядке создания) одной перезаписью файла"""
+        with _file_lock(self.lock_path):
+            self._add_many_locked(items)
+
+    def _add_many_locked(self, items: List[dict]):
+        # Наша запись перекроет отпечаток — запоминаем, что до неё писал другой процесс
+        if self.version() != self._own_version:
+            self._external_change = True
+        history = self._load()
+        history[:0] = (
+            dict(item, payload=base64.b64encode(item["payload"]).decode("ascii")) if item.get("payload") else item
+            for item in reversed(items)
+        )
+        old_count = len(history)
+
+        # Оставляем только последние N записей и не старше срока хранения
+        if self.retention_days:
+            cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+            history = [entry for entry in history if entry["timestamp"] >= cutoff]
+        if self.max_items:
+            history = history[:self.max_items]
+
+        if old_count > len(history):
+            logger.info(f"  🗑️ Удалено старых записей: {old_count - len(history)}")
+
+        self._save(history)
+
+    @staticmethod
+    def _public(item: dict) -> dict:
+        """Запись без сжатого результата (он нужен только get_payload)"""
+        item = dict(item)
+        item["has_payload"] = bool(item.pop("payload", None))
+        return item
+
+    def list(self, limit: Optional[int] = None) -> List[dict]:
+        self._own_version = self.version()
+        history = self._load()
+        return [self._public(item) for item in (history[:limit] if limit else history)]
+
+    def get_payload(self, item_id: str) -> Optional[bytes]:
+        """Сжатый полный результат анализа записи (в файле — base64)"""
+        for item in self._load():
+            if item["id"] == item_id:
+                return base64.b64decode(item["payload"]) if item.get("payload") else None
+        return None
+
+    def count(self) -> int:
+        return len(self._load())
+
+    def query(
+        self,
+        limit: int,
+        before: Optional[Tuple[str, str]] = None,
+        request_type: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        q: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[int]]:
+        """Фильтрация полным проходом по файлу (для больших объёмов — backend=sqlite)"""
+        history = sorted(
+            (
+                item for item in self._load()
+                if _matches(item, request_type=request_type, since=since, until=until, q=q)
+            ),
+            key=lambda item: (item["timestamp"], item["id"]),
+            reverse=True
+        )
+        # Как у SQLite: общее число — только для первой страницы
+        total = None if before else len(history)
+        if before:
+            history = [item for item in history if (item["timestamp"], item["id"]) < before]
+        return [self._public(item) for item in history[:limit]], total
+
+    def clear(self) -> int:
+        with _file_lock(self.lock_path):
+            removed = self.count()
+            self._save([])
+        return removed
+
+
+class SQLiteHistoryStore:
+    """
+    История в SQLite (WAL): атомарные вставки без перезаписи всего файла
+
+    Безопасна для нескольких процессов: записи идут в транзакциях
+    BEGIN IMMEDIATE, конкурирующие писатели ждут busy_timeout.
+    """
+
+    COLUMNS = ("id", "timestamp", "request_type", "request_summary", "response_summary", "usage")
+    # Сжатый payload читается только через get_payload
+    SELECT_COLUMNS = ", ".join(f"h.{column}" for column in COLUMNS) + ", h.payload IS NOT NULL AS has_payload"
+
+    def __init__(self, path: Path, max_items: int, retention_days: int, fsync: str = "normal"):
+        self.path = path
+        self.max_items = max_items
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+
+        # isolation_level=None — транзакции открываем явно в _write()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={FSYNC_POLICIES[fsync]}")
+        self._create_schema()
+        self.fts = self._create_fts()
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    @contextmanager
+    def _write(self):
+        """Транзакция записи: сразу берём блокировку писателя, чтобы не получить SQLITE_BUSY посреди транзакции"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _create_schema(self):
+        # executescript сам коммитит, поэтому без _write()
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS history (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT NOT NULL UNIQUE,
+                    timestamp TEXT NOT NULL,
+                    request_type TEXT NOT NULL,
+                    request_summary TEXT NOT NULL,
+                    response_summary TEXT NOT NULL,
+                    usage TEXT,
+                    payload BLOB
+                );
+                CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp, id);
+                CREATE INDEX IF NOT EXISTS idx_history_type_timestamp ON history(request_type, timestamp, id);
+                DROP INDEX IF EXISTS idx_history_request_type;
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(history)")}
+            if "payload" not in columns:
+                # База создана до хранения полных результатов
+                self._conn.execute("ALTER TABLE history ADD COLUMN payload BLOB")
+
+    def _create_fts(self) -> bool:
+        """
+        Полнотекстовый индекс FTS5 по резюме запроса и ответа
+
+        Индекс внешнего содержимого (content='history') синхронизируется триггерами.
+        Returns:
+            False, если SQLite собран без FTS5 (поиск тогда через LIKE)
+        """
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'"
+            ).fetchone()
+            try:
+                self._conn.executescript("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                        request_summary, response_summary,
+                        content='history', content_rowid='seq',
+                        tokenize='unicode61 remove_diacritics 2'
+                    );
+                    CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+                        INSERT INTO history_fts(rowid, request_summary, response_summary)
+                        VALUES (new.seq, new.request_summary, new.response_summary);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+                        INSERT INTO history_fts(history_fts, rowid, request_summary, response_summary)
+                        VALUES ('delete', old.seq, old.request_summary, old.response_summary);
+                    END;
+                """)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"  ⚠ FTS5 недоступен, поиск через LIKE: {e}")
+                return False
+            if not exists:
+                # Индекс создан на существующей таблице — заполняем
+                self._conn.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+        return True
+
+    def _insert(self, item: dict):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO history "
+            "(id, timestamp, request_type, request_summary, response_summary, usage, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                item["id"], item["timestamp"], item["request_type"],
+                item["request_summary"], item["response_summary"],
+                json.dumps(item["usage"]) if item.get("usage") else None,
+                item.get("payload")
+            )
+        )
+
+    def _apply_retention(self) -> int:
+        """Удалить записи сверх лимита и старше срока хранения"""
+        removed = 0
+        if self.retention_days:
+            cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+            removed += self._conn.execute("DELETE FROM history WHERE timestamp < ?", (cutoff,)).rowcount
+        if self.max_items:
+            removed += self._conn.execute(
+                "DELETE FROM history WHERE seq <= "
+                "(SELECT seq FROM history ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                (self.max_items,)
+            ).rowcount
+        return removed
+
+    def add_many(self, items: List[dict]):
+        """Добавить пакет записей одной транзакцией"""
+        with self._write():
+            for item in items:
+                self._insert(item)
+            removed = self._apply_retention()
+        if removed:
+            logger.info(f"  🗑️ Удалено старых записей: {removed}")
+
+    def import_json(self, path: Path) -> int:
+        """Однократно импортировать записи из history.json"""
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone()
+        if done or not path.exists():
+            return 0
+        try:
+            history = json.loads(path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError as e:
+            logger.warning(f"  ⚠ Файл {path} не импортирован: {e}")
+            return 0
+
+        with self._write():
+            # Файл хранит новые записи первыми — вставляем от старых к новым
+            for item in reversed(history):
+                if item.get("payload"):
+                    item = dict(item, payload=base64.b64decode(item["payload"]))
+                self._insert(item)
+            self._apply_retention()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)",
+                (datetime.now().isoformat(),)
+            )
+        return len(history)
+
+    def changed_externally(self) -> bool:
+        """
+        Другой процесс изменил базу после прошлой проверки
+
+        PRAGMA data_version меняется только при коммитах других соединений.
+        """
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+
+    def _row_to_dict(self, row: sqlite3.Row) -> dict:
+        item = {column: row[column] for column in self.COLUMNS}
+        item["usage"] = json.loads(item["usage"]) if item["usage"] else None
+        item["has_payload"] = bool(row["has_payload"])
+        return item
+
+    def list(self, limit: Optional[int] = None) -> List[dict]:
+        query = f"SELECT {self.SELECT_COLUMNS} FROM history h ORDER BY h.seq DESC"
+        params: tuple = ()
+        if limit:
+            query += " LIMIT ?"
+            params = (limit,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def get_payload(self, item_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM history WHERE id = ?", (item_id,)).fetchone()
+        return row["payload"] if row else None
+
+    def query(
+        self,
+        limit: int,
+        before: Optional[Tuple[str, str]] = None,
+        request_type: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        q: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[int]]:
+        """
+        Страница истории по фильтрам (keyset-пагинация по (timestamp, id))
+
+        Returns:
+            Записи страницы и общее число записей, подходящих под фильтры.
+            COUNT(*) проходит весь отфильтрованный набор, поэтому считается только
+            для первой страницы; для следующих — None
+        """
+        source = "history h"
+        where: List[str] = []
+        params: list = []
+
+        if q and self.fts and _fts_query(q):
+            source += " JOIN history_fts ON history_fts.rowid = h.seq"
+            where.append("history_fts MATCH ?")
+            params.append(_fts_query(q))
+        elif q:
+            where.append("(h.request_summary LIKE ? OR h.response_summary LIKE ?)")
+            params += [f"%{q}%", f"%{q}%"]
+        if request_type:
+            where.append("h.request_type = ?")
+            params.append(request_type)
+        if since:
+            where.append("h.timestamp >= ?")
+            params.append(since)
+        if until:
+            where.append("h.timestamp <= ?")
+            params.append(until)
+
+        where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+        page_where = where + ["(h.timestamp, h.id) < (?, ?)"] if before else where
+        page_params = params + list(before) if before else params
+        page_sql = f" WHERE {' AND '.join(page_where)}" if page_where else ""
+
+        with self._lock:
+            total = None
+            if not before:
+                total = self._conn.execute(f"SELECT COUNT(*) FROM {source}{where_sql}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {self.SELECT_COLUMNS} FROM {source}{page_sql} ORDER BY h.timestamp DESC, h.id DESC LIMIT ?",
+                page_params + [limit]
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows], total
+
+    def clear(self) -> int:
+        with self._write():
+            return self._conn.execute("DELETE FROM history").rowcount
+
+
+class HistoryService:
+    """
+    Управление историей запросов
+
+    Последние записи держатся в памяти (кольцевой буфер) и отдаются оттуда;
+    запись в хранилище выполняет фоновый поток пакетами (write-behind), поэтому
+    add_entry не делает дискового I/O в обработчике запроса. Если хранилище
+    изменил другой процесс (несколько воркеров uvicorn), буфер перечитывается.
+    """
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация History сервиса")
+
+        self.backend = settings.history_backend
+        self.max_items = settings.max_history_items
+        retention_days = settings.history_retention_days
+        fsync = settings.history_fsync
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Неизвестная политика fsync: {fsync}")
+
+        if self.backend == "sqlite":
+            self.store = SQLiteHistoryStore(Path(settings.history_db), self.max_items, retention_days, fsync)
+            logger.info(f"  База истории: {settings.history_db} (SQLite, WAL)")
+            imported = self.store.import_json(Path(settings.history_file))
+            if imported:
+                logger.info(f"  📥 Импортировано из {settings.history_file}: {imported} записей")
+        elif self.backend == "json":
+            self.store = JSONHistoryStore(Path(settings.history_file), self.max_items, retention_days, fsync)
+            logger.info(f"  Файл истории: {settings.history_file}")
+        else:
+            raise ValueError(f"Неизвестный backend истории: {self.backend}")
+
+        logger.info(f"  Макс. записей: {self.max_items or 'без ограничения'}")
+        logger.info(f"  Срок хранения: {f'{retention_days} дн.' if retention_days else 'без ограничения'}")
+
+        # Кольцевой буфер последних записей (новые — слева)
+        self.cache_size = max(self.max_items, settings.history_cache_items)
+        self._lock = threading.Lock()
+        self._recent = deque(self.store.list(limit=self.cache_size), maxlen=self.cache_size)
+        self._total = self.store.count()
+        # Ещё не записанные в хранилище записи (id -> запись)
+        self._pending: "OrderedDict[str, dict]" = OrderedDict()
+
+        # Очередь write-behind: ("add", item) / ("clear", None) / None — остановка
+        self.batch_size = settings.history_batch_size
+        self.flush_interval = settings.history_flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stats = {"written": 0, "batches": 0, "errors": 0, "last_batch_ms": 0.0}
+        self._closing = threading.Event()
+        self._writer = threading.Thread(target=self._writer_loop, name="history-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+        logger.info(f"  Кэш в памяти: {self.cache_size} записей, fsync: {fsync}")
+        logger.info(f"  Write-behind: пакет до {self.batch_size}, интервал {self.flush_interval} сек")
+        logger.info(f"  Текущих записей: {self._total}")
+        logger.info("History сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    # === Write-behind ===
+
+    def _writer_loop(self):
+        """Фоновая запись: собирает операции в пакеты и пишет их в хранилище"""
+        while True:
+            operation = self._queue.get()
+            stop = operation is None
+            batch = [] if stop else [operation]
+
+            # Добираем пакет, пока не истёк интервал или не набран размер
+            deadline = time.monotonic() + self.flush_interval
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    timeout = deadline - time.monotonic()
+                    operation = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if operation is None:
+                    stop = True
+                else:
+                    batch.append(operation)
+
+            if batch:
+                self._write_batch(batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch: list):
+        """
+        Применить пакет операций по порядку; подряд идущие add — одной записью
+
+        Ошибка хранилища (занятая база, диск) не теряет пакет: шаг повторяется
+        с растущей паузой, записи тем временем отдаются из _pending. При остановке
+        сервиса попыток не больше WRITE_RETRIES_ON_CLOSE.
+        """
+        start_time = time.time()
+        # Шаги: ("add", [записи]) или ("clear", None); выполненные шаги не повторяются
+        steps: List[Tuple[str, Optional[List[dict]]]] = []
+        for kind, item in batch:
+            if kind == "add":
+                if steps and steps[-1][0] == "add":
+                    steps[-1][1].append(item)
+                else:
+                    steps.append(("add", [item]))
+            else:
+                steps.append(("clear", None))
+
+        written = 0
+        for kind, items in steps:
+            attempt = 0
+            while True:
+                try:
+                    if kind == "add":
+                        self.store.add_many(items)
+                        written += len(items)
+                    else:
+                        self.store.clear()
+                    break
+                except Exception as e:
+                    attempt += 1
+                    self._stats["errors"] += 1
+                    if self._closing.is_set() and attempt >= WRITE_RETRIES_ON_CLOSE:
+                        lost = len(items) if items else 0
+                        logger.critical(f"  ✗ История: операция {kind} не записана при остановке "
+                                        f"({lost} записей потеряно): {e}")
+                        break
+                    delay = min(WRITE_RETRY_BASE_DELAY * 2 ** (attempt - 1), WRITE_RETRY_MAX_DELAY)
+                    logger.error(f"  ✗ Ошибка записи истории ({kind}, попытка {attempt}), "
+                                 f"повтор через {delay:.1f} сек: {e}")
+                    self._closing.wait(delay)
+
+        with self._lock:
+            for kind, item in batch:
+                if kind == "add":
+                    self._pending.pop(item["id"], None)
+
+        elapsed_ms = (time.time() - start_time) * 1000
+        self._stats["written"] += written
+        self._stats["batches"] += 1
+        self._stats["last_batch_ms"] = round(elapsed_ms, 1)
+        logger.debug(f"История: записан пакет {written} записей за {elapsed_ms:.1f} мс")
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Дождаться записи всех операций из очереди
+
+        Returns:
+            False — за timeout сек очередь не записана или поток записи не работает
+        """
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if not self._writer.is_alive():
+                    logger.error(f"  ✗ Поток записи истории остановлен, в очереди {self._queue.unfinished_tasks} операций")
+                    return False
+                if remaining <= 0:
+                    logger.warning(f"  ⚠ История не записана за {timeout} сек")
+                    return False
+                self._queue.all_tasks_done.wait(min(remaining, 0.5))
+        return True
+
+    def close(self):
+        """Записать очередь и остановить фоновый поток"""
+        if not self._writer.is_alive():
+            return
+        logger.info("  💾 Сброс истории на диск...")
+        self._closing.set()
+        self._queue.put(None)
+        self._writer.join(timeout=30)
+
+    def get_stats(self) -> dict:
+        """Метрики write-behind"""
+        return dict(self._stats, queued=self._queue.qsize(), cached=len(self._recent))
+
+    def _refresh_if_stale(self):
+        """Перечитать буфер, если хранилище изменил другой процесс"""
+        if not self.store.changed_externally():
+            return
+        stored = self.store.list(limit=self.cache_size)
+        total = self.store.count()
+        with self._lock:
+            self._total = total + len(self._pending)
+            merged = {item["id"]: item for item in stored}
+            for item_id, record in self._pending.items():
+                merged[item_id] = {key: value for key, value in record.items() if key != "payload"}
+            items = sorted(merged.values(), key=lambda item: item["timestamp"], reverse=True)
+            self._recent = deque(items[:self.cache_size], maxlen=self.cache_size)
+        logger.debug("История изменена другим процессом — буфер перечитан")
+
+    # === API ===
+
     def add_entry(
         self,
         request_type: str,
         request_summary: str,
-        response_summary: str
+        response_summary: str,
+        usage: Optional[TokenUsage] = None,
+        payload: Optional[dict] = None
     ) -> HistoryItem:
-        """Добавить запись в историю"""
+        """
+        Добавить запись в историю
+
+        Args:
+            payload: Полный результат анализа — хранится сжатым, для отчётов и графиков по id
+        """
         logger.info(f"📝 Добавление записи в историю")
         logger.info(f"  Тип: {request_type}")
         logger.info(f"  Запрос: {request_summary[:50]}...")
         logger.info(f"  Ответ: {response_summary[:50]}...")
-        
-        history = self._load_history()
-        
+
         item = {
             "id": str(uuid.uuid4()),
             "timestamp": datetime.now().isoformat(),
             "request_type": request_type,
             "request_summary": request_summary[:200],
-            "response_summary": response_summary[:500]
+            "response_summary": response_summary[:500],
+            "usage": usage.model_dump() if usage else None,
+            "has_payload": payload is not None
         }
-        
-        # Добавляем в начало
-        history.insert(0, item)
-        old_count = len(history)
-        
-        # Оставляем только последние N записей
-        history = history[:self.max_items]
-        
-        if old_count > len(history):
-            logger.info(f"  🗑️ Удалено старых записей: {old_count - len(history)}")
-        
-        self._save_history(history)
-        
+        # В буфер — без payload, в очередь записи — вместе с ним
+        record = dict(item, payload=pack_payload(payload) if payload is not None else None)
+
+        with self._lock:
+            self._recent.appendleft(item)
+            self._pending[item["id"]] = record
+            self._total += 1
+            if self.max_items:
+                self._total = min(self._total, self.max_items)
+            self._queue.put(("add", record))
+
         logger.info(f"  ✓ Запись добавлена (ID: {item['id'][:8]}...)")
-        logger.info(f"  Всего записей: {len(history)}")
-        
+
         return HistoryItem(**item)
-    
-    def get_history(self) -> List[HistoryItem]:
-        """Получить всю историю"""
+
+    def get_history(
+        self,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        request_type: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        q: Optional[str] = None
+    ) -> Tuple[List[HistoryItem], Optional[int], Optional[str]]:
+        """
+        Страница истории (новые первыми)
+
+        Первая страница без фильтров отдаётся из памяти, остальные — из хранилища
+        вместе с ещё не записанными (_pending) записями, подходящими под фильтры.
+
+        Args:
+            limit: Размер страницы
+            cursor: Курсор из next_cursor предыдущей страницы
+            request_type: Фильтр по типу запроса
+            since: Не раньше
+            until: Не позже
+            q: Полнотекстовый поиск по резюме запроса и ответа
+
+        Returns:
+            Записи, общее число подходящих записей (None после первой страницы),
+            курсор следующей страницы
+        """
         logger.info("📋 Получение истории")
-        history = self._load_history()
-        logger.info(f"  Записей: {len(history)}")
-        return [HistoryItem(**item) for item in history]
-    
+        self._refresh_if_stale()
+
+        # Буфер отдаёт limit + 1 записей (признак следующей страницы) только при limit < cache_size
+        if not (cursor or request_type or since or until or q) and limit < self.cache_size:
+            with self._lock:
+                history = list(self._recent)[:limit + 1]
+                total = self._total
+        else:
+            before = decode_cursor(cursor) if cursor else None
+            filters = dict(
+                request_type=request_type,
+                since=since.isoformat() if since else None,
+                until=until.isoformat() if until else None,
+                q=q
+            )
+            # Снимок _pending до запроса: запись, ушедшая в хранилище между ними,
+            # найдётся в одном из двух (дубликаты по id отбрасываются)
+            with self._lock:
+                pending = [
+                    {key: value for key, value in record.items() if key != "payload"}
+                    for record in self._pending.values()
+                    if _matches(record, before=before, **filters)
+                ]
+            history, total = self.store.query(limit=limit + 1, before=before, **filters)
+            if pending:
+                stored_ids = {item["id"] for item in history}
+                unsaved = [item for item in pending if item["id"] not in stored_ids]
+                history = sorted(history + unsaved, key=lambda item: (item["timestamp"], item["id"]), reverse=True)
+                history = history[:limit + 1]
+                if total is not None:
+                    total += len(unsaved)
+
+        next_cursor = encode_cursor(history[limit - 1]) if len(history) > limit else None
+        history = history[:limit]
+        logger.info(f"  Записей: {len(history)} из {total}")
+        return [HistoryItem(**item) for item in history], total, next_cursor
+
+    def get_payload(self, item_id: str) -> Optional[dict]:
+        """
+        Полный результат анализа записи истории
+
+        Returns:
+            Данные анализа или None, если записи нет или она сохранена без них
+        """
+        with self._lock:
+            record = self._pending.get(item_id)
+        blob = record["payload"] if record else self.store.get_payload(item_id)
+        return unpack_payload(blob) if blob else None
+
     def clear_history(self):
         """Очистить историю"""
         logger.info("🗑️ Очистка истории")
-        old_history = self._load_history()
-        logger.info(f"  Удаляется записей: {len(old_history)}")
-        
-        self._save_history([])
-        
+        with self._lock:
+            logger.info(f"  Удаляется записей из кэша: {len(self._recent)}")
+            self._recent.clear()
+            self._pending.clear()
+            self._total = 0
+            self._queue.put(("clear", None))
         logger.info("  ✓ История очищена")
 
 
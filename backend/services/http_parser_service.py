@@ -3,7 +3,6 @@
 """
 import logging
 from typing import Optional, Tuple
-from bs4 import BeautifulSoup
 from backend.config import settings
 
 logger = logging.getLogger("competitor_monitor.http_parser")
@@ -30,6 +29,7 @@ class HTTPParserService:
         try:
             import httpx
             import asyncio
+            from bs4 import BeautifulSoup
             
             logger.info("  📥 Загрузка страницы...")
             
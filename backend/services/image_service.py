@@ -0,0 +1,131 @@
+"""
+Нормализация изображений перед отправкой в Vision API
+"""
+import io
+import logging
+import threading
+import time
+from typing import Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from backend.config import settings
+
+logger = logging.getLogger("competitor_monitor.image")
+
+# Форматы, которые принимает Vision API
+SUPPORTED_FORMATS = {"JPEG", "PNG", "GIF", "WEBP"}
+
+# Лимиты размера по уровню детализации Vision API:
+# low — модель видит 512x512; high — вписывание в 2048x2048 и короткая сторона до 768
+DETAIL_LIMITS = {
+    "low": (512, 512),
+    "high": (2048, 768),
+}
+
+
+class ImageService:
+    """Проверка, очистка метаданных, уменьшение и перекодирование изображений"""
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Image сервиса")
+
+        if settings.vision_detail not in DETAIL_LIMITS:
+            raise ValueError(f"vision_detail должен быть low или high, получено: {settings.vision_detail}")
+
+        self.detail = settings.vision_detail
+        self.jpeg_quality = settings.image_jpeg_quality
+        self.max_upload_bytes = settings.image_max_upload_mb * 1024 * 1024
+
+        self._lock = threading.Lock()
+        self._stats = {"images": 0, "bytes_in": 0, "bytes_out": 0, "total_ms": 0.0}
+
+        logger.info(f"  Детализация Vision: {self.detail}")
+        logger.info(f"  Качество JPEG: {self.jpeg_quality}")
+        logger.info("Image сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    def _target_size(self, width: int, height: int) -> Tuple[int, int]:
+        """Размер, дальше которого Vision API всё равно уменьшит изображение"""
+        long_limit, short_limit = DETAIL_LIMITS[self.detail]
+        scale = min(1.0, long_limit / max(width, height), short_limit / min(width, height))
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def normalize(self, content: bytes) -> Tuple[bytes, str]:
+        """
+        Подготовить изображение для Vision API (блокирующий вызов — запускать в потоке)
+
+        Args:
+            content: Исходные байты файла
+
+        Returns:
+            Байты нового изображения и его MIME тип
+
+        Raises:
+            ValueError: Файл не является поддерживаемым изображением
+        """
+        start_time = time.time()
+
+        if len(content) > self.max_upload_bytes:
+            raise ValueError(f"Файл больше {settings.image_max_upload_mb} MB")
+
+        try:
+            # verify() проверяет целостность, после него файл нужно открыть заново
+            Image.open(io.BytesIO(content)).verify()
+            image = Image.open(io.BytesIO(content))
+            source_format = image.format
+            # Анимация не поддерживается API — берём первый кадр
+            image.seek(0)
+            # Поворот по EXIF до удаления метаданных
+            image = ImageOps.exif_transpose(image)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+            logger.warning(f"  ⚠ Ошибка чтения изображения: {e}")
+            raise ValueError("Файл не является корректным изображением")
+
+        if source_format not in SUPPORTED_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат изображения: {source_format}")
+
+        original_size = image.size
+        target_size = self._target_size(*original_size)
+        if target_size != original_size:
+            image = image.resize(target_size, Image.LANCZOS)
+
+        # Новое изображение без EXIF/ICC/текстовых чанков
+        buffer = io.BytesIO()
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if has_alpha:
+            image.convert("RGBA").save(buffer, format="PNG", optimize=True)
+            mime_type = "image/png"
+        else:
+            image.convert("RGB").save(buffer, format="JPEG", quality=self.jpeg_quality, optimize=True)
+            mime_type = "image/jpeg"
+        result = buffer.getvalue()
+
+        elapsed_ms = (time.time() - start_time) * 1000
+        with self._lock:
+            self._stats["images"] += 1
+            self._stats["bytes_in"] += len(content)
+            self._stats["bytes_out"] += len(result)
+            self._stats["total_ms"] += elapsed_ms
+
+        logger.info(
+            f"  🪄 Изображение {source_format} {original_size[0]}x{original_size[1]} -> "
+            f"{target_size[0]}x{target_size[1]} {mime_type}: "
+            f"{len(content) / 1024:.1f} KB -> {len(result) / 1024:.1f} KB за {elapsed_ms:.0f} мс"
+        )
+        return result, mime_type
+
+    def get_stats(self) -> dict:
+        """Метрики нормализации"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+        stats["avg_ms"] = round(stats["total_ms"] / stats["images"], 1) if stats["images"] else 0.0
+        stats["total_ms"] = round(stats["total_ms"], 1)
+        stats["detail"] = self.detail
+        return stats
+
+
+# Глобальный экземпляр
+image_service = ImageService()
@@ -0,0 +1,385 @@
+"""
+Журнал запросов API: append-only JSONL с ротацией и сжатием
+
+Каждый HTTP запрос — одна строка: время, путь, статус, длительность по стадиям
+(openai, image_normalize, render_report...), хэши входных данных, модель и токены.
+Запись идёт через очередь фоновым потоком и не задерживает обработчик.
+
+Сжатие и агрегация закрытых сегментов:
+    python -m backend.services.journal_service compact
+"""
+import atexit
+import bisect
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from backend.config import settings
+
+logger = logging.getLogger("competitor_monitor.journal")
+
+# Запись журнала текущего HTTP запроса (заполняется стадиями и входами)
+_current_entry: ContextVar[Optional[dict]] = ContextVar("journal_entry", default=None)
+
+# Границы гистограммы задержек, мс: гистограммы складываются, из них считаются перцентили
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+# JSON тела больше этого размера не сохраняются даже при journal_bodies
+MAX_BODY_BYTES = 64 * 1024
+
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _open_segment(path: Path):
+    """Открыть сегмент журнала (.jsonl или сжатый .jsonl.gz)"""
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def read_journal(paths: List[Path]):
+    """Записи из сегментов журнала по порядку (битые строки пропускаются)"""
+    for path in paths:
+        with _open_segment(path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Оборванная строка при аварийной остановке
+                    continue
+
+
+def percentile_from_histogram(histogram: List[int], q: float) -> float:
+    """Перцентиль по гистограмме: верхняя граница корзины"""
+    total = sum(histogram)
+    if not total:
+        return 0.0
+    threshold = q / 100 * total
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= threshold:
+            return float(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else float("inf")
+    return float("inf")
+
+
+class JournalService:
+    """Неблокирующая запись журнала запросов и его агрегация"""
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Journal сервиса")
+
+        self.enabled = settings.journal_enabled
+        self.path = Path(settings.journal_file)
+        self.max_bytes = settings.journal_max_mb * 1024 * 1024
+        self.retention_days = settings.journal_retention_days
+        self.store_bodies = settings.journal_bodies
+        self.rollup_path = self.path.with_name(self.path.stem + ".rollup.json")
+
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=settings.journal_queue_size)
+        self._stats = {"written": 0, "dropped": 0, "errors": 0, "rotations": 0}
+
+        if self.enabled:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = threading.Thread(target=self._writer_loop, name="journal-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+        logger.info(f"  Журнал: {self.path if self.enabled else 'выключен'}")
+        logger.info(f"  Ротация: {settings.journal_max_mb} MB, хранение: {self.retention_days or '∞'} дн.")
+        logger.info("Journal сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    # === Сбор данных запроса ===
+
+    def begin_request(self, method: str, path: str):
+        """Начать запись для HTTP запроса (вызывается из middleware); без journal_enabled — ничего"""
+        if not self.enabled:
+            return
+        _current_entry.set({
+            "ts": datetime.now().isoformat(),
+            "method": method,
+            "path": path,
+            "stages": {},
+            "inputs": [],
+        })
+
+    @contextmanager
+    def stage(self, name: str):
+        """Засечь длительность стадии обработки; повторные вызовы суммируются"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = _current_entry.get()
+            if entry is not None:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                entry["stages"][name] = round(entry["stages"].get(name, 0.0) + elapsed_ms, 1)
+
+    def note_input(self, name: str, content: bytes, json_body: bool = False):
+        """
+        Отметить входные данные запроса
+
+        Args:
+            name: Имя входа (body, имя файла)
+            content: Байты для хэша
+            json_body: content — JSON тело; сохраняется для replay, если включено journal_bodies
+        """
+        entry = _current_entry.get()
+        if entry is None:
+            return
+        entry["inputs"].append({"name": name, "sha256": sha256_hex(content), "bytes": len(content)})
+        if json_body and self.store_bodies and len(content) <= MAX_BODY_BYTES:
+            try:
+                entry["body"] = json.loads(content)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                pass
+
+    def finish_request(self, status: int, duration: float, query: Optional[dict] = None, usage=None):
+        """Завершить запись и поставить её в очередь (без ожидания диска)"""
+        entry = _current_entry.get()
+        if entry is None or not self.enabled:
+            return
+        _current_entry.set(None)
+
+        entry["status"] = status
+        entry["outcome"] = "ok" if status < 400 else ("client_error" if status < 500 else "server_error")
+        entry["duration_ms"] = round(duration * 1000, 1)
+        if query:
+            entry["query"] = query
+        if usage:
+            entry["model"] = usage.model
+            entry["tokens"] = usage.total_tokens
+            entry["cost_usd"] = round(usage.cost_usd, 6)
+
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            # Диск не успевает — теряем запись журнала, но не задерживаем запрос
+            self._stats["dropped"] += 1
+
+    # === Запись ===
+
+    def _writer_loop(self):
+        """Фоновая запись: всё, что накопилось в очереди, — одним append"""
+        while True:
+            entry = self._queue.get()
+            batch = [] if entry is None else [entry]
+            stop = entry is None
+            while not stop:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                else:
+                    batch.append(entry)
+
+            if batch:
+                self._write_batch(batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[dict]):
+        lines = "".join(json.dumps(entry, ensure_ascii=False, default=str) + "\n" for entry in batch)
+        try:
+            self._rotate_if_needed()
+            # Файл открывается на каждый пакет: после ротации другим воркером пишем уже в новый
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            self._stats["written"] += len(batch)
+        except OSError as e:
+            self._stats["errors"] += 1
+            logger.error(f"  ✗ Ошибка записи журнала ({len(batch)} записей): {e}")
+
+    def _rotate_if_needed(self):
+        """Закрыть текущий сегмент, если он превысил journal_max_mb"""
+        try:
+            if self.path.stat().st_size < self.max_bytes:
+                return
+        except FileNotFoundError:
+            return
+        segment = self.path.with_name(f"{self.path.stem}-{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}.jsonl")
+        try:
+            os.replace(self.path, segment)
+        except FileNotFoundError:
+            # Сегмент уже закрыл другой воркер
+            return
+        self._stats["rotations"] += 1
+        logger.info(f"  🔄 Журнал: закрыт сегмент {segment.name}")
+
+    def flush(self):
+        """Дождаться записи очереди"""
+        if self.enabled:
+            self._queue.join()
+
+    def close(self):
+        """Записать очередь и остановить фоновый поток"""
+        if not self.enabled or not self._writer.is_alive():
+            return
+        self._queue.put(None)
+        self._writer.join(timeout=10)
+
+    def get_stats(self) -> dict:
+        """Метрики журнала"""
+        return dict(self._stats, queued=self._queue.qsize(), enabled=self.enabled)
+
+    # === Сегменты, сжатие, агрегация ===
+
+    def segments(self, include_current: bool = True) -> List[Path]:
+        """Сегменты журнала от старых к новым"""
+        pattern = f"{self.path.stem}-*.jsonl*"
+        closed = sorted(
+            (path for path in self.path.parent.glob(pattern) if path.suffix in (".jsonl", ".gz")),
+            key=lambda path: path.name
+        )
+        if include_current and self.path.exists():
+            closed.append(self.path)
+        return closed
+
+    def _load_rollup(self) -> dict:
+        if not self.rollup_path.exists():
+            return {"segments": [], "buckets": {}}
+        return json.loads(self.rollup_path.read_text(encoding="utf-8"))
+
+    def _save_rollup(self, rollup: dict):
+        tmp_path = self.rollup_path.with_name(self.rollup_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(rollup, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.rollup_path)
+
+    @staticmethod
+    def _aggregate(entries, buckets: Dict[str, dict]):
+        """Добавить записи в агрегаты "день|METHOD путь" """
+        for entry in entries:
+            key = f"{entry['ts'][:10]}|{entry['method']} {entry['path']}"
+            bucket = buckets.setdefault(key, {
+                "requests": 0, "errors": 0, "duration_ms": 0.0, "max_ms": 0.0,
+                "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                "stages": {}, "tokens": 0, "cost_usd": 0.0,
+            })
+            duration = entry.get("duration_ms", 0.0)
+            bucket["requests"] += 1
+            bucket["errors"] += entry.get("outcome") != "ok"
+            bucket["duration_ms"] += duration
+            bucket["max_ms"] = max(bucket["max_ms"], duration)
+            bucket["histogram"][bisect.bisect_left(LATENCY_BUCKETS_MS, duration)] += 1
+            bucket["tokens"] += entry.get("tokens", 0)
+            bucket["cost_usd"] += entry.get("cost_usd", 0.0)
+            for name, elapsed_ms in entry.get("stages", {}).items():
+                stage = bucket["stages"].setdefault(name, {"count": 0, "total_ms": 0.0})
+                stage["count"] += 1
+                stage["total_ms"] += elapsed_ms
+
+    def compact(self) -> dict:
+        """
+        Свернуть закрытые сегменты в агрегаты, сжать их в .gz и удалить старые
+
+        Повторный запуск безопасен: учтённые сегменты запоминаются в rollup.
+
+        Returns:
+            Сколько сегментов агрегировано, сжато и удалено
+        """
+        logger.info("🗜️ Сжатие журнала запросов")
+        rollup = self._load_rollup()
+        done = set(rollup["segments"])
+        result = {"aggregated": 0, "compressed": 0, "removed": 0}
+
+        for segment in self.segments(include_current=False):
+            name = segment.name.removesuffix(".gz")
+            if name not in done:
+                self._aggregate(read_journal([segment]), rollup["buckets"])
+                rollup["segments"].append(name)
+                done.add(name)
+                # Сначала фиксируем агрегаты, потом трогаем сегмент
+                self._save_rollup(rollup)
+                result["aggregated"] += 1
+
+            if segment.suffix != ".gz":
+                gz_path = segment.with_name(segment.name + ".gz")
+                tmp_path = gz_path.with_name(gz_path.name + ".tmp")
+                with open(segment, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(tmp_path, gz_path)
+                segment.unlink()
+                segment = gz_path
+                result["compressed"] += 1
+
+            if self.retention_days:
+                cutoff = time.time() - timedelta(days=self.retention_days).total_seconds()
+                if segment.stat().st_mtime < cutoff:
+                    segment.unlink()
+                    result["removed"] += 1
+
+        logger.info(
+            f"  ✓ Агрегировано: {result['aggregated']}, сжато: {result['compressed']}, "
+            f"удалено: {result['removed']}"
+        )
+        return result
+
+    def rollup_rows(self, include_current: bool = True) -> List[dict]:
+        """Агрегаты по дням и эндпоинтам: задержки p50/p90/p99 и средние стадий"""
+        buckets = self._load_rollup()["buckets"]
+        if include_current and self.path.exists():
+            # Незакрытый сегмент ещё не в rollup — досчитываем на лету
+            buckets = json.loads(json.dumps(buckets))
+            self._aggregate(read_journal([self.path]), buckets)
+
+        rows = []
+        for key, bucket in sorted(buckets.items()):
+            day, endpoint = key.split("|", 1)
+            rows.append({
+                "day": day,
+                "endpoint": endpoint,
+                "requests": bucket["requests"],
+                "errors": bucket["errors"],
+                "avg_ms": round(bucket["duration_ms"] / bucket["requests"], 1),
+                "p50_ms": percentile_from_histogram(bucket["histogram"], 50),
+                "p90_ms": percentile_from_histogram(bucket["histogram"], 90),
+                "p99_ms": percentile_from_histogram(bucket["histogram"], 99),
+                "max_ms": bucket["max_ms"],
+                "stages_avg_ms": {
+                    name: round(stage["total_ms"] / stage["count"], 1)
+                    for name, stage in bucket["stages"].items()
+                },
+                "tokens": bucket["tokens"],
+                "cost_usd": round(bucket["cost_usd"], 6),
+            })
+        return rows
+
+
+# Глобальный экземпляр
+journal_service = JournalService()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "compact"
+    if command == "compact":
+        print(journal_service.compact())
+    elif command == "rollup":
+        print(f"{'day':<12}{'endpoint':<34}{'req':>7}{'err':>6}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>9}")
+        for row in journal_service.rollup_rows():
+            print(
+                f"{row['day']:<12}{row['endpoint']:<34}{row['requests']:>7}{row['errors']:>6}"
+                f"{row['p50_ms']:>8.0f}{row['p90_ms']:>8.0f}{row['p99_ms']:>8.0f}{row['max_ms']:>9.0f}"
+            )
+    else:
+        print("Использование: python -m backend.services.journal_service [compact|rollup]")
+        sys.exit(1)
@@ -0,0 +1,121 @@
+"""
+Маршрутизация запросов между моделями с учётом размера входа, качества и задержки
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from backend.config import settings
+
+logger = logging.getLogger("competitor_monitor.router")
+
+QUALITY_HINTS = ("auto", "fast", "high")
+
+# Вес нового наблюдения в скользящем среднем задержки
+LATENCY_EWMA_ALPHA = 0.3
+
+# Ошибка или таймаут вызова учитываются как задержка не меньше бюджета x множитель:
+# две неудачи подряд уводят модель на fallback, как и медленные ответы
+FAILURE_LATENCY_FACTOR = 2.0
+
+
+def _parse_tiers(value: str, default: str) -> List[str]:
+    """Разобрать список уровней "быстрая,...,сильная" из строки настроек"""
+    tiers = [name.strip() for name in value.split(",") if name.strip()]
+    return tiers or [default]
+
+
+class ModelRouter:
+    """Выбор модели из списка уровней (от быстрой к сильной)"""
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Model Router")
+
+        self.text_tiers = _parse_tiers(settings.openai_model_tiers, settings.openai_model)
+        self.vision_tiers = _parse_tiers(settings.openai_vision_model_tiers, settings.openai_vision_model)
+        self.long_input_chars = settings.routing_long_input_chars
+        self.latency_budget = settings.routing_latency_budget
+        self.probe_interval = settings.routing_probe_interval
+
+        # Модель -> (EWMA задержки в сек, время последнего наблюдения)
+        self._latency: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+        logger.info(f"  Уровни текста: {', '.join(self.text_tiers)}")
+        logger.info(f"  Уровни vision: {', '.join(self.vision_tiers)}")
+        logger.info(f"  Длинный вход: от {self.long_input_chars} символов")
+        logger.info(f"  Бюджет задержки: {self.latency_budget} сек")
+        logger.info("Model Router инициализирован ✓")
+        logger.info("=" * 50)
+
+    def observe(self, model: str, latency: float):
+        """Учесть наблюдаемую задержку вызова модели"""
+        with self._lock:
+            previous = self._latency.get(model)
+            if previous is None:
+                ewma = latency
+            else:
+                ewma = LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * previous[0]
+            self._latency[model] = (ewma, time.time())
+
+    def observe_failure(self, model: str, latency: float):
+        """Учесть ошибку или таймаут вызова модели как очень медленный ответ"""
+        self.observe(model, max(latency, self.latency_budget * FAILURE_LATENCY_FACTOR))
+        logger.warning(f"  ⏱️ {model}: ошибка вызова через {latency:.1f} сек учтена в задержке")
+
+    def observed_latency(self, model: str) -> float:
+        """
+        Текущая оценка задержки модели (0 если данных нет или они устарели)
+
+        Устаревшие наблюдения игнорируются, чтобы медленная модель, от которой
+        ушли на fallback, периодически получала пробный запрос снова.
+        """
+        with self._lock:
+            entry = self._latency.get(model)
+        if entry is None or time.time() - entry[1] > self.probe_interval:
+            return 0.0
+        return entry[0]
+
+    def route(self, input_chars: int, has_images: bool = False, quality: str = "auto") -> str:
+        """
+        Выбрать модель для запроса
+
+        Args:
+            input_chars: Длина входного текста в символах
+            has_images: Есть ли в запросе изображения (только vision-модели)
+            quality: Подсказка качества: auto, fast, high
+
+        Returns:
+            Имя модели
+        """
+        if quality not in QUALITY_HINTS:
+            raise ValueError(f"Неподдерживаемое качество: {quality}. Допустимо: {', '.join(QUALITY_HINTS)}")
+
+        tiers = self.vision_tiers if has_images else self.text_tiers
+
+        if quality == "fast":
+            index = 0
+        elif quality == "high":
+            index = len(tiers) - 1
+        else:
+            # Длинные входы и изображения — на сильную модель, короткий текст — на быструю
+            index = len(tiers) - 1 if has_images or input_chars >= self.long_input_chars else 0
+
+        primary = tiers[index]
+        while index > 0 and self.observed_latency(tiers[index]) > self.latency_budget:
+            index -= 1
+        model = tiers[index]
+
+        if model != primary:
+            logger.warning(
+                f"  ⏱️ {primary}: задержка {self.observed_latency(primary):.1f} сек > "
+                f"{self.latency_budget} сек, fallback на {model}"
+            )
+        logger.info(f"  🧭 Маршрут: {model} (качество={quality}, вход={input_chars}, изображения={has_images})")
+        return model
+
+
+# Глобальный экземпляр
+model_router = ModelRouter()
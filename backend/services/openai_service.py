@@ -3,16 +3,24 @@
 https://proxyapi.ru/docs/openai-text-generation
 """
 import base64
+import io
 import json
+import math
 import re
+import threading
 import time
 import logging
-from typing import Optional
-
-from openai import OpenAI
+from typing import TYPE_CHECKING, Dict, Optional
 
 from backend.config import settings
 from backend.models.schemas import CompetitorAnalysis, ImageAnalysis
+from backend.services.model_router import model_router
+from backend.services.usage_service import usage_service
+from backend.services.journal_service import journal_service
+
+# SDK openai тяжёлый при импорте — загружается при первом запросе к модели
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 # Логгер для сервиса
 logger = logging.getLogger("competitor_monitor.openai")
@@ -29,17 +37,92 @@ class OpenAIService:
         logger.info(f"  Модель vision: {settings.openai_vision_model}")
         logger.info(f"  API ключ: {'*' * 10}...{settings.proxy_api_key[-4:] if settings.proxy_api_key else 'НЕ ЗАДАН'}")
         
-        # ProxyAPI - OpenAI-совместимый API для России
-        self.client = OpenAI(
-            api_key=settings.proxy_api_key,
-            base_url=settings.proxy_api_base_url
-        )
+        # Клиент ProxyAPI создаётся при первом запросе (см. client)
+        self._client: Optional["OpenAI"] = None
+        self._client_lock = threading.Lock()
         self.model = settings.openai_model
         self.vision_model = settings.openai_vision_model
         
         logger.info("OpenAI сервис инициализирован успешно ✓")
         logger.info("=" * 50)
     
+    @property
+    def client(self) -> "OpenAI":
+        """Клиент ProxyAPI - OpenAI-совместимого API для России (создаётся при первом обращении)"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(
+                        api_key=settings.proxy_api_key,
+                        base_url=settings.proxy_api_base_url
+                    )
+        return self._client
+    
+    def _estimate_image_tokens(self, image_base64: str, detail: str = "auto") -> int:
+        """
+        Оценить токены изображения по правилам Vision API
+        
+        API не возвращает токены изображений отдельно (они входят в prompt_tokens),
+        поэтому считаем по размеру: 85 базовых + 170 за каждый тайл 512x512
+        после вписывания в 2048x2048 и уменьшения короткой стороны до 768.
+        """
+        if detail == "low":
+            return 85
+        try:
+            from PIL import Image
+            width, height = Image.open(io.BytesIO(base64.b64decode(image_base64))).size
+        except Exception as e:
+            logger.debug(f"Не удалось определить размер изображения: {e}")
+            return 85
+        
+        scale = min(1.0, 2048 / max(width, height))
+        width, height = width * scale, height * scale
+        scale = min(1.0, 768 / min(width, height))
+        width, height = width * scale, height * scale
+        
+        tiles = math.ceil(width / 512) * math.ceil(height / 512)
+        return 85 + 170 * tiles
+    
+    def _chat_completion(
+        self,
+        operation: str,
+        model: str,
+        messages: list,
+        max_tokens: int,
+        image_tokens: int = 0
+    ) -> str:
+        """Вызов chat.completions с учётом токенов, задержки и стоимости"""
+        start_time = time.time()
+        
+        with journal_service.stage("openai"):
+            try:
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=max_tokens
+                )
+            except Exception:
+                # Таймауты и ошибки API тоже должны уводить маршрут на fallback
+                model_router.observe_failure(model, time.time() - start_time)
+                raise
+        
+        latency = time.time() - start_time
+        model_router.observe(model, latency)
+        
+        usage = response.usage
+        usage_service.record(
+            operation=operation,
+            model=model,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            latency=latency,
+            image_tokens=image_tokens
+        )
+        
+        return response.choices[0].message.content
+    
     def _parse_json_response(self, content: str) -> dict:
         """Извлечь JSON из ответа модели"""
         logger.debug(f"Парсинг JSON ответа, длина: {len(content)} символов")
@@ -65,13 +148,14 @@ class OpenAIService:
             logger.debug(f"Проблемный контент: {content[:200]}...")
             return {}
     
-    async def analyze_text(self, text: str) -> CompetitorAnalysis:
+    async def analyze_text(self, text: str, quality: str = "auto") -> CompetitorAnalysis:
         """Анализ текста конкурента"""
         logger.info("=" * 50)
         logger.info("📝 АНАЛИЗ ТЕКСТА КОНКУРЕНТА")
         logger.info(f"  Длина текста: {len(text)} символов")
         logger.info(f"  Превью: {text[:100]}...")
-        logger.info(f"  Модель: {self.model}")
+        model = model_router.route(len(text), has_images=False, quality=quality)
+        logger.info(f"  Модель: {model}")
         
         system_prompt = """Ты — эксперт по конкурентному анализу. Проанализируй предоставленный текст конкурента и верни структурированный JSON-ответ.
 Формат ответа (строго JSON):
@@ -95,34 +179,23 @@ class OpenAIService:
         logger.info("  Отправка запроса к API...")
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            content = self._chat_completion(
+                operation="analyze_text",
+                model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": f"Проанализируй текст конкурента:\n\n{text}"}
                 ],
-                temperature=0.7,
                 max_tokens=2000
             )
             
             elapsed = time.time() - start_time
             logger.info(f"  ✓ Ответ получен за {elapsed:.2f} сек")
-            
-            content = response.choices[0].message.content
             logger.info(f"  Длина ответа: {len(content)} символов")
-            logger.debug(f"  Использовано токенов: {response.usage.total_tokens if response.usage else 'N/A'}")
             
             data = self._parse_json_response(content)
             
-            result = CompetitorAnalysis(
-                strengths=data.get("strengths", []),
-                weaknesses=data.get("weaknesses", []),
-                unique_offers=data.get("unique_offers", []),
-                recommendations=data.get("recommendations", []),
-                summary=data.get("summary", ""),
-                design_score=data.get("design_score", 5),
-                technology_potential=data.get("technology_potential", 5)
-            )
+            result = self._to_competitor_analysis(data)
             
             logger.info(f"  Результат: {len(result.strengths)} сильных, {len(result.weaknesses)} слабых сторон")
             logger.info("=" * 50)
@@ -135,13 +208,19 @@ class OpenAIService:
             logger.error("=" * 50)
             raise
     
-    async def analyze_image(self, image_base64: str, mime_type: str = "image/jpeg") -> ImageAnalysis:
+    async def analyze_image(
+        self,
+        image_base64: str,
+        mime_type: str = "image/jpeg",
+        quality: str = "auto"
+    ) -> ImageAnalysis:
         """Анализ изображения (баннер, сайт, упаковка)"""
         logger.info("=" * 50)
         logger.info("🖼️ АНАЛИЗ ИЗОБРАЖЕНИЯ")
         logger.info(f"  Размер base64: {len(image_base64)} символов")
         logger.info(f"  MIME тип: {mime_type}")
-        logger.info(f"  Модель: {self.vision_model}")
+        model = model_router.route(0, has_images=True, quality=quality)
+        logger.info(f"  Модель: {model}")
         
         system_prompt = """Ты — эксперт по визуальному маркетингу и дизайну. Проанализируй изображение конкурента (баннер, сайт, упаковка товара и т.д.) и верни структурированный JSON-ответ.
 Формат ответа (строго JSON):
@@ -166,8 +245,9 @@ class OpenAIService:
         logger.info("  Отправка запроса к Vision API...")
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.vision_model,
+            content = self._chat_completion(
+                operation="analyze_image",
+                model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {
@@ -180,20 +260,19 @@ class OpenAIService:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:{mime_type};base64,{image_base64}"
+                                    "url": f"data:{mime_type};base64,{image_base64}",
+                                    "detail": settings.vision_detail
                                 }
                             }
                         ]
                     }
                 ],
-                temperature=0.7,
-                max_tokens=2000
+                max_tokens=2000,
+                image_tokens=self._estimate_image_tokens(image_base64, settings.vision_detail)
             )
             
             elapsed = time.time() - start_time
             logger.info(f"  ✓ Ответ получен за {elapsed:.2f} сек")
-            
-            content = response.choices[0].message.content
             logger.info(f"  Длина ответа: {len(content)} символов")
             
             data = self._parse_json_response(content)
@@ -220,11 +299,130 @@ class OpenAIService:
             logger.error("=" * 50)
             raise
     
+    def _to_competitor_analysis(self, data: dict) -> CompetitorAnalysis:
+        """Собрать CompetitorAnalysis из распарсенного JSON"""
+        return CompetitorAnalysis(
+            strengths=data.get("strengths", []),
+            weaknesses=data.get("weaknesses", []),
+            unique_offers=data.get("unique_offers", []),
+            recommendations=data.get("recommendations", []),
+            summary=data.get("summary", ""),
+            design_score=data.get("design_score", 5),
+            technology_potential=data.get("technology_potential", 5)
+        )
+    
+    async def analyze_batch(self, texts: Dict[str, str], quality: str = "auto") -> Dict[str, CompetitorAnalysis]:
+        """
+        Пакетный анализ нескольких коротких текстов одним запросом к модели
+        
+        Args:
+            texts: ID элемента -> текст конкурента
+            quality: Подсказка выбора модели
+            
+        Returns:
+            ID элемента -> анализ (элементы, которых нет в ответе модели, пропускаются)
+        """
+        logger.info("=" * 50)
+        logger.info("📦 ПАКЕТНЫЙ АНАЛИЗ")
+        logger.info(f"  Элементов: {len(texts)}")
+        
+        # Модели отдаём короткие метки вместо исходных ID
+        labels = {f"item_{i + 1}": item_id for i, item_id in enumerate(texts)}
+        total_chars = sum(len(text) for text in texts.values())
+        model = model_router.route(total_chars, has_images=False, quality=quality)
+        logger.info(f"  Суммарная длина: {total_chars} символов")
+        logger.info(f"  Модель: {model}")
+        
+        system_prompt = """Ты — эксперт по конкурентному анализу. Тебе передано несколько независимых текстов конкурентов, каждый между строками "=== BEGIN <id> ===" и "=== END <id> ===". Проанализируй КАЖДЫЙ текст отдельно и верни структурированный JSON-ответ.
+Формат ответа (строго JSON):
+{
+"items": [
+{
+"id": "<id из разделителя>",
+"strengths": ["сильная сторона 1", ...],
+"weaknesses": ["слабая сторона 1", ...],
+"unique_offers": ["уникальное предложение 1", ...],
+"recommendations": ["рекомендация 1", ...],
+"summary": "Краткое резюме анализа",
+"design_score": 7,
+"technology_potential": 6
+}
+]
+}
+Важно:
+- Ровно один объект в "items" на каждый текст, с тем же id
+- Не смешивай информацию между текстами
+- Каждый массив должен содержать 3-5 пунктов
+- design_score и technology_potential от 0 до 10
+- Пиши на русском языке"""
+
+        user_content = "\n\n".join(
+            f"=== BEGIN {label} ===\n{texts[item_id]}\n=== END {label} ==="
+            for label, item_id in labels.items()
+        )
+        
+        start_time = time.time()
+        
+        try:
+            content = self._chat_completion(
+                operation="analyze_batch",
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": f"Проанализируй тексты конкурентов:\n\n{user_content}"}
+                ],
+                max_tokens=min(700 * len(texts), 16000)
+            )
+            
+            elapsed = time.time() - start_time
+            logger.info(f"  ✓ Ответ получен за {elapsed:.2f} сек")
+            
+            data = self._parse_json_response(content)
+            
+            results = {}
+            for entry in data.get("items", []):
+                item_id = labels.get(str(entry.get("id", "")))
+                if item_id is None or item_id in results:
+                    continue
+                results[item_id] = self._to_competitor_analysis(entry)
+            
+            missing = len(texts) - len(results)
+            logger.info(f"  Результат: {len(results)} из {len(texts)} элементов")
+            if missing:
+                logger.warning(f"  ⚠ Модель пропустила элементов: {missing}")
+            logger.info("=" * 50)
+            
+            return results
+            
+        except Exception as e:
+            elapsed = time.time() - start_time
+            logger.error(f"  ✗ Ошибка API за {elapsed:.2f} сек: {e}")
+            logger.error("=" * 50)
+            raise
+    
+    @staticmethod
+    def compose_parsed_text(
+        title: Optional[str],
+        h1: Optional[str],
+        paragraph: Optional[str]
+    ) -> str:
+        """Собрать текст для анализа из распарсенной страницы"""
+        content_parts = []
+        if title:
+            content_parts.append(f"Заголовок страницы (title): {title}")
+        if h1:
+            content_parts.append(f"Главный заголовок (H1): {h1}")
+        if paragraph:
+            content_parts.append(f"Первый абзац: {paragraph}")
+        
+        return "\n\n".join(content_parts)
+    
     async def analyze_parsed_content(
         self, 
         title: Optional[str], 
         h1: Optional[str], 
-        paragraph: Optional[str]
+        paragraph: Optional[str],
+        quality: str = "auto"
     ) -> CompetitorAnalysis:
         """Анализ распарсенного контента сайта"""
         logger.info("📄 Анализ распарсенного контента")
@@ -232,15 +430,7 @@ class OpenAIService:
         logger.info(f"  H1: {h1[:50] if h1 else 'N/A'}...")
         logger.info(f"  Абзац: {paragraph[:50] if paragraph else 'N/A'}...")
         
-        content_parts = []
-        if title:
-            content_parts.append(f"Заголовок страницы (title): {title}")
-        if h1:
-            content_parts.append(f"Главный заголовок (H1): {h1}")
-        if paragraph:
-            content_parts.append(f"Первый абзац: {paragraph}")
-        
-        combined_text = "\n\n".join(content_parts)
+        combined_text = self.compose_parsed_text(title, h1, paragraph)
         
         if not combined_text.strip():
             logger.warning("  ⚠ Контент пустой, возвращаем пустой анализ")
@@ -248,7 +438,7 @@ class OpenAIService:
                 summary="Не удалось извлечь контент для анализа"
             )
         
-        return await self.analyze_text(combined_text)
+        return await self.analyze_text(combined_text, quality=quality)
     
     async def analyze_website_screenshot(
         self,
@@ -256,7 +446,8 @@ class OpenAIService:
         url: str,
         title: Optional[str] = None,
         h1: Optional[str] = None,
-        first_paragraph: Optional[str] = None
+        first_paragraph: Optional[str] = None,
+        quality: str = "auto"
     ) -> CompetitorAnalysis:
         """Комплексный анализ сайта конкурента по скриншоту"""
         logger.info("=" * 50)
@@ -265,7 +456,8 @@ class OpenAIService:
         logger.info(f"  Title: {title[:50] if title else 'N/A'}...")
         logger.info(f"  H1: {h1[:50] if h1 else 'N/A'}...")
         logger.info(f"  Размер скриншота: {len(screenshot_base64)} символов base64")
-        logger.info(f"  Модель: {self.vision_model}")
+        model = model_router.route(len(first_paragraph or ""), has_images=True, quality=quality)
+        logger.info(f"  Модель: {model}")
         
         # Формируем контекст из извлечённых данных
         context_parts = [f"URL сайта: {url}"]
@@ -309,8 +501,9 @@ class OpenAIService:
         logger.info("  Отправка скриншота в Vision API...")
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.vision_model,
+            content = self._chat_completion(
+                operation="analyze_website_screenshot",
+                model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {
@@ -323,33 +516,24 @@ class OpenAIService:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{screenshot_base64}"
+                                    "url": f"data:image/jpeg;base64,{screenshot_base64}",
+                                    "detail": settings.vision_detail
                                 }
                             }
                         ]
                     }
                 ],
-                temperature=0.7,
-                max_tokens=3000
+                max_tokens=3000,
+                image_tokens=self._estimate_image_tokens(screenshot_base64, settings.vision_detail)
             )
             
             elapsed = time.time() - start_time
             logger.info(f"  ✓ Ответ получен за {elapsed:.2f} сек")
-            
-            content = response.choices[0].message.content
             logger.info(f"  Длина ответа: {len(content)} символов")
             
             data = self._parse_json_response(content)
             
-            result = CompetitorAnalysis(
-                strengths=data.get("strengths", []),
-                weaknesses=data.get("weaknesses", []),
-                unique_offers=data.get("unique_offers", []),
-                recommendations=data.get("recommendations", []),
-                summary=data.get("summary", ""),
-                design_score=data.get("design_score", 5),
-                technology_potential=data.get("technology_potential", 5)
-            )
+            result = self._to_competitor_analysis(data)
             
             logger.info(f"  Результат:")
             logger.info(f"    - Сильных сторон: {len(result.strengths)}")
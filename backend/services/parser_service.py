@@ -5,17 +5,12 @@ import base64
 import asyncio
 import time
 import logging
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
+# selenium и webdriver_manager импортируются при первом парсинге, а не на старте сервера
+if TYPE_CHECKING:
+    from selenium import webdriver
 
 from backend.config import settings
 
@@ -38,8 +33,13 @@ class ParserService:
         logger.info("Parser сервис инициализирован ✓")
         logger.info("=" * 50)
     
-    def _create_driver(self) -> webdriver.Chrome:
+    def _create_driver(self) -> "webdriver.Chrome":
         """Создать новый экземпляр Chrome драйвера"""
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+        
         logger.info("  🌐 Создание Chrome драйвера...")
         start_time = time.time()
         
@@ -70,6 +70,11 @@ class ParserService:
         """
         Синхронный парсинг URL (выполняется в отдельном потоке)
         """
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+        
         logger.info("=" * 50)
         logger.info(f"🔍 ПАРСИНГ САЙТА: {url}")
         
@@ -3,7 +3,6 @@
 """
 import logging
 from typing import Optional
-from PyPDF2 import PdfReader
 from backend.config import settings
 from backend.models.schemas import CompetitorAnalysis
 
@@ -34,6 +33,7 @@ class PDFService:
         try:
             # Читаем PDF из байтов
             import io
+            from PyPDF2 import PdfReader
             pdf_stream = io.BytesIO(file_content)
             reader = PdfReader(pdf_stream)
             
@@ -0,0 +1,107 @@
+"""
+Пул процессов с безопасным перезапуском (PDF, графики)
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger("competitor_monitor.process_pool")
+
+
+def _ping() -> bool:
+    """Пустая задача: заставляет пул запустить воркер заранее"""
+    return True
+
+
+class RestartablePool:
+    """
+    ProcessPoolExecutor, который можно пересоздать из любого запроса
+
+    submit возвращает экземпляр пула вместе с future: после ошибки (сломанный
+    пул, таймаут) запрос перезапускает именно тот экземпляр, в котором работал.
+    Если его уже заменил другой запрос, перезапуск ничего не делает — пул не
+    пересоздаётся по разу на каждую упавшую задачу.
+    """
+
+    def __init__(self, name: str, workers: int, initializer: Callable[[], None]):
+        self.name = name
+        self.workers = workers
+        self.initializer = initializer
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.restarts = 0
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    def _create(self) -> ProcessPoolExecutor:
+        # spawn — форк процесса с потоками (история, журнал) небезопасен
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer
+        )
+        for _ in range(self.workers):
+            executor.submit(_ping)
+        return executor
+
+    def start(self):
+        """Запустить пул и прогреть воркеры (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create()
+
+    def submit(self, fn: Callable, *args) -> Tuple[ProcessPoolExecutor, Future]:
+        """
+        Отправить задачу в пул
+
+        Returns:
+            (экземпляр пула, future) — экземпляр передаётся в restart при ошибке
+
+        Raises:
+            RuntimeError: Пул не запущен или остановлен
+        """
+        executor = self._executor
+        if executor is None:
+            raise RuntimeError(f"Пул {self.name} не запущен")
+        return executor, executor.submit(fn, *args)
+
+    def restart(self, failed: ProcessPoolExecutor, reason: str) -> bool:
+        """
+        Завершить процессы пула и создать новый
+
+        Args:
+            failed: Экземпляр, в котором случилась ошибка (из submit)
+            reason: Причина для лога
+
+        Returns:
+            True — пул пересоздан; False — его уже пересоздал другой запрос или пул остановлен
+        """
+        with self._lock:
+            if self._executor is not failed:
+                return False
+            _terminate(failed)
+            self._executor = self._create()
+            self.restarts += 1
+        logger.warning(f"  🔄 Пул {self.name} перезапущен: {reason}")
+        return True
+
+    def close(self):
+        """Остановить пул, не дожидаясь текущих задач"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _terminate(executor: ProcessPoolExecutor):
+    """Остановить пул и убить его процессы (зависший рендер сам не завершится)"""
+    # У ProcessPoolExecutor нет публичного способа прервать выполняющуюся задачу
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
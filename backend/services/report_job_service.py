@@ -0,0 +1,338 @@
+"""
+Фоновая очередь генерации отчётов
+
+Долгие отчёты (PDF, сводные) не держат HTTP запрос: POST /reports ставит
+задание в очередь и сразу возвращает его id, клиент опрашивает статус и
+скачивает готовый файл. Одновременно рендерится не больше report_job_workers
+заданий; готовые файлы лежат в report_jobs_dir и удаляются через report_job_ttl.
+
+Статусы заданий хранятся в SQLite (report_jobs_dir/jobs.db, WAL), общей для
+воркеров uvicorn: статус и файл отдаёт любой воркер, лимит очереди — общий.
+Рендер идёт в воркере, принявшем задание; если этот процесс завершился,
+его незаконченные задания помечаются failed.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from backend.config import settings
+from backend.models.schemas import ReportJobStatus
+
+logger = logging.getLogger("competitor_monitor.report_jobs")
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _process_alive(pid: int) -> bool:
+    """Жив ли процесс сервера (воркер uvicorn на этой машине)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class ReportJobQueueFull(Exception):
+    """В очереди заданий нет места — клиенту стоит повторить позже"""
+
+
+class ReportJobService:
+    """Очередь заданий на генерацию отчётов с ограничением параллельности и сроком хранения"""
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Report Jobs сервиса")
+
+        self.jobs_dir = Path(settings.report_jobs_dir)
+        self.workers = settings.report_job_workers
+        self.queue_size = settings.report_job_queue_size
+        self.ttl = settings.report_job_ttl
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._cleanup_task: Optional[asyncio.Task] = None
+        # Счётчики этого процесса; очередь и хранимые файлы — из общей базы
+        self._stats = {"submitted": 0, "done": 0, "failed": 0, "rejected": 0, "expired": 0}
+
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.jobs_dir / "jobs.db"
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+        logger.info(f"  Каталог: {self.jobs_dir}, база: {self.db_path}")
+        logger.info(f"  Параллельно: {self.workers}, очередь: {self.queue_size}, хранение: {self.ttl} сек")
+        logger.info("Report Jobs сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    @contextmanager
+    def _write(self):
+        """Транзакция записи (BEGIN IMMEDIATE — безопасно для нескольких воркеров)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _create_schema(self):
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS report_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    media_type TEXT NOT NULL,
+                    owner_pid INTEGER NOT NULL,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    expires_at TEXT,
+                    size INTEGER,
+                    error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_report_jobs_status ON report_jobs(status);
+                CREATE INDEX IF NOT EXISTS idx_report_jobs_expires ON report_jobs(expires_at);
+            """)
+
+    def _update(self, job_id: str, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._write():
+            self._conn.execute(f"UPDATE report_jobs SET {columns} WHERE job_id = ?", [*fields.values(), job_id])
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None, size: Optional[int] = None):
+        finished_at = datetime.now()
+        self._update(
+            job_id,
+            status=status,
+            error=error,
+            size=size,
+            finished_at=finished_at.isoformat(),
+            expires_at=(finished_at + timedelta(seconds=self.ttl)).isoformat()
+        )
+
+    # === Жизненный цикл ===
+
+    def start(self):
+        """Запустить периодическую очистку просроченных заданий (в event loop сервера)"""
+        self.fail_orphaned()
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.get_running_loop().create_task(self._cleanup_loop())
+
+    async def close(self):
+        """Отменить задания в работе и очистку"""
+        tasks = list(self._tasks.values())
+        if self._cleanup_task is not None:
+            tasks.append(self._cleanup_task)
+            self._cleanup_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(min(60, self.ttl))
+            await asyncio.to_thread(self.fail_orphaned)
+            await asyncio.to_thread(self.expire)
+
+    def fail_orphaned(self) -> int:
+        """Пометить failed незаконченные задания завершившихся процессов сервера"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, owner_pid FROM report_jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchall()
+        orphaned = [
+            row["job_id"] for row in rows
+            if row["owner_pid"] != os.getpid() and not _process_alive(row["owner_pid"])
+        ]
+        for job_id in orphaned:
+            self._finish(job_id, "failed", error="Процесс сервера завершился до готовности отчёта")
+        if orphaned:
+            logger.warning(f"  ⚠ Заданий отчётов без процесса: {len(orphaned)} (помечены failed)")
+        return len(orphaned)
+
+    # === Задания ===
+
+    async def submit(
+        self,
+        build: Callable[[], Awaitable[bytes]],
+        report_format: str,
+        filename: str,
+        media_type: str
+    ) -> ReportJobStatus:
+        """
+        Поставить генерацию отчёта в очередь
+
+        Args:
+            build: Корутина-фабрика, возвращающая байты отчёта
+            report_format: Формат (для статуса)
+            filename: Имя файла для скачивания
+            media_type: Content-Type файла
+
+        Raises:
+            ReportJobQueueFull: Заданий в очереди и в работе уже report_job_queue_size
+        """
+        job_id = uuid.uuid4().hex
+        active = await asyncio.to_thread(self._insert, job_id, report_format, filename, media_type)
+        if active >= self.queue_size:
+            logger.warning(f"  ⚠ Очередь отчётов заполнена ({self.queue_size})")
+            raise ReportJobQueueFull(f"Очередь отчётов заполнена ({self.queue_size}), повторите позже")
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        self._tasks[job_id] = asyncio.get_running_loop().create_task(self._run(job_id, build))
+        logger.info(f"📥 Задание отчёта {job_id[:8]}: {report_format}, в очереди {active + 1}")
+        return await asyncio.to_thread(self.get_job, job_id)
+
+    def _insert(self, job_id: str, report_format: str, filename: str, media_type: str) -> int:
+        """Добавить задание, если есть место; возвращает число активных заданий до вставки"""
+        with self._write():
+            # Лимит общий для всех воркеров: проверка и вставка в одной транзакции
+            active = self._conn.execute(
+                "SELECT COUNT(*) FROM report_jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchone()[0]
+            if active < self.queue_size:
+                self._conn.execute(
+                    "INSERT INTO report_jobs (job_id, status, format, filename, media_type, owner_pid, created_at) "
+                    "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                    (job_id, report_format, filename, media_type, os.getpid(), datetime.now().isoformat())
+                )
+        with self._lock:
+            if active >= self.queue_size:
+                self._stats["rejected"] += 1
+            else:
+                self._stats["submitted"] += 1
+        return active
+
+    async def _run(self, job_id: str, build: Callable[[], Awaitable[bytes]]):
+        try:
+            async with self._semaphore:
+                await asyncio.to_thread(self._update, job_id, status="running", started_at=datetime.now().isoformat())
+                logger.info(f"📄 Задание отчёта {job_id[:8]}: рендер")
+                started = time.time()
+                content = await build()
+
+                path = self._path(job_id)
+                await asyncio.to_thread(self._write_file, path, content)
+                await asyncio.to_thread(self._finish, job_id, "done", size=len(content))
+                with self._lock:
+                    self._stats["done"] += 1
+                logger.info(f"  ✓ Задание отчёта {job_id[:8]} готово: {len(content) / 1024:.1f} KB "
+                            f"за {time.time() - started:.1f} сек")
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self._finish, job_id, "failed", error="Задание отменено")
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            await asyncio.to_thread(self._finish, job_id, "failed", error=error)
+            with self._lock:
+                self._stats["failed"] += 1
+            logger.error(f"  ✗ Задание отчёта {job_id[:8]}: {error}")
+        finally:
+            self._tasks.pop(job_id, None)
+
+    def _path(self, job_id: str) -> Path:
+        return self.jobs_dir / job_id
+
+    @staticmethod
+    def _write_file(path: Path, content: bytes):
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+
+    def expire(self) -> int:
+        """Удалить задания с истёкшим сроком хранения и их файлы"""
+        now = datetime.now().isoformat()
+        with self._write():
+            expired = [
+                row["job_id"] for row in self._conn.execute(
+                    "SELECT job_id FROM report_jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+                )
+            ]
+            self._conn.executemany("DELETE FROM report_jobs WHERE job_id = ?", [(job_id,) for job_id in expired])
+        for job_id in expired:
+            self._path(job_id).unlink(missing_ok=True)
+        if expired:
+            with self._lock:
+                self._stats["expired"] += len(expired)
+            logger.info(f"🧹 Удалено просроченных заданий отчётов: {len(expired)}")
+        return len(expired)
+
+    def _get_row(self, job_id: str) -> Optional[sqlite3.Row]:
+        """Задание, если срок хранения не истёк (просроченные удаляет _cleanup_loop)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT rowid, * FROM report_jobs WHERE job_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (job_id, datetime.now().isoformat())
+            ).fetchone()
+
+    def get_job(self, job_id: str) -> Optional[ReportJobStatus]:
+        """Статус задания (None — нет или срок хранения истёк); только чтение"""
+        job = self._get_row(job_id)
+        if job is None:
+            return None
+        position = None
+        if job["status"] == "queued":
+            # Номер в очереди: queued-задания идут в порядке создания
+            with self._lock:
+                position = 1 + self._conn.execute(
+                    "SELECT COUNT(*) FROM report_jobs WHERE status = 'queued' AND rowid < ?", (job["rowid"],)
+                ).fetchone()[0]
+        return ReportJobStatus(
+            job_id=job_id,
+            status=job["status"],
+            format=job["format"],
+            filename=job["filename"],
+            queue_position=position,
+            size=job["size"],
+            created_at=_timestamp(job["created_at"]),
+            started_at=_timestamp(job["started_at"]),
+            finished_at=_timestamp(job["finished_at"]),
+            expires_at=_timestamp(job["expires_at"]),
+            error=job["error"],
+            download_url=f"/reports/{job_id}/download" if job["status"] == "done" else None
+        )
+
+    def get_file(self, job_id: str) -> Optional[tuple]:
+        """(путь, имя файла, Content-Type) готового отчёта"""
+        job = self._get_row(job_id)
+        if job is None or job["status"] != "done":
+            return None
+        return self._path(job_id), job["filename"], job["media_type"]
+
+    def get_stats(self) -> dict:
+        """Метрики очереди (queued, running, stored — по всем воркерам)"""
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM report_jobs WHERE expires_at IS NULL OR expires_at > ? GROUP BY status",
+                (datetime.now().isoformat(),)
+            ).fetchall())
+            return dict(
+                self._stats,
+                queued=counts.get("queued", 0),
+                running=counts.get("running", 0),
+                stored=counts.get("done", 0)
+            )
+
+
+# Глобальный экземпляр
+report_job_service = ReportJobService()
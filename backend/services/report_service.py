@@ -1,200 +1,213 @@
 """
 Сервис для генерации отчётов
 """
+import asyncio
+import hashlib
+import json
 import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Optional, List
-from jinja2 import Template
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, List, Tuple
 from backend.config import settings
 from backend.models.schemas import CompetitorAnalysis, ImageAnalysis
+from backend.services.process_pool import RestartablePool
+from backend.services.visualization_service import viz_service, CHART_FORMATS
 
 logger = logging.getLogger("competitor_monitor.report")
 
-# HTML шаблон отчёта
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html lang="ru">
-<head>
-    <meta charset="UTF-8">
-    <title>Отчёт анализа конкурента</title>
-    <style>
-        body { font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }
-        h1 { color: #333; border-bottom: 2px solid #06b6d4; padding-bottom: 10px; }
-        h2 { color: #06b6d4; margin-top: 30px; }
-        .section { background: #f5f5f5; padding: 15px; border-radius: 8px; margin: 10px 0; }
-        .strengths { border-left: 4px solid #10b981; }
-        .weaknesses { border-left: 4px solid #ef4444; }
-        .recommendations { border-left: 4px solid #f59e0b; }
-        ul { padding-left: 20px; }
-        li { margin: 8px 0; }
-        .meta { color: #666; font-size: 14px; }
-        .score { font-size: 24px; font-weight: bold; color: #06b6d4; }
-        .summary { background: linear-gradient(135deg, #06b6d420, #8b5cf620); padding: 20px; border-radius: 8px; }
-        .footer { margin-top: 40px; padding-top: 20px; border-top: 1px solid #ddd; color: #666; }
-    </style>
-</head>
-<body>
-    <h1>📊 Отчёт анализа конкурента</h1>
-    <p class="meta">Дата: {{ date }} | Тип анализа: {{ analysis_type }}</p>
-    
-    {% if summary %}
-    <div class="summary">
-        <h2>📌 Резюме</h2>
-        <p>{{ summary }}</p>
-    </div>
-    {% endif %}
-    
-    {% if strengths %}
-    <div class="section strengths">
-        <h2>✅ Сильные стороны</h2>
-        <ul>
-        {% for item in strengths %}
-            <li>{{ item }}</li>
-        {% endfor %}
-        </ul>
-    </div>
-    {% endif %}
-    
-    {% if weaknesses %}
-    <div class="section weaknesses">
-        <h2>⚠️ Слабые стороны</h2>
-        <ul>
-        {% for item in weaknesses %}
-            <li>{{ item }}</li>
-        {% endfor %}
-        </ul>
-    </div>
-    {% endif %}
-    
-    {% if unique_offers %}
-    <div class="section">
-        <h2>🎯 Уникальные предложения</h2>
-        <ul>
-        {% for item in unique_offers %}
-            <li>{{ item }}</li>
-        {% endfor %}
-        </ul>
-    </div>
-    {% endif %}
-    
-    {% if recommendations %}
-    <div class="section recommendations">
-        <h2>💡 Рекомендации</h2>
-        <ul>
-        {% for item in recommendations %}
-            <li>{{ item }}</li>
-        {% endfor %}
-        </ul>
-    </div>
-    {% endif %}
-    
-    {% if marketing_insights %}
-    <div class="section">
-        <h2>👁️ Маркетинговые инсайты</h2>
-        <ul>
-        {% for item in marketing_insights %}
-            <li>{{ item }}</li>
-        {% endfor %}
-        </ul>
-    </div>
-    {% endif %}
-    
-    {% if visual_style_score %}
-    <div class="section">
-        <h2>🎨 Оценка визуального стиля</h2>
-        <p class="score">{{ visual_style_score }}/10</p>
-        <p>{{ visual_style_analysis }}</p>
-    </div>
-    {% endif %}
-    
-    <div class="footer">
-        <p>Сгенерировано CompetitorAI • {{ date }}</p>
-    </div>
-</body>
-</html>
-"""
-
-# Markdown шаблон
-MARKDOWN_TEMPLATE = """
-# 📊 Отчёт анализа конкурента
-
-**Дата:** {{ date }}  
-**Тип анализа:** {{ analysis_type }}
-
----
-
-{% if summary %}
-## 📌 Резюме
-
-{{ summary }}
-
----
-{% endif %}
-
-{% if strengths %}
-## ✅ Сильные стороны
-
-{% for item in strengths %}
-- {{ item }}
-{% endfor %}
-
----
-{% endif %}
-
-{% if weaknesses %}
-## ⚠️ Слабые стороны
-
-{% for item in weaknesses %}
-- {{ item }}
-{% endfor %}
-
----
-{% endif %}
-
-{% if unique_offers %}
-## 🎯 Уникальные предложения
-
-{% for item in unique_offers %}
-- {{ item }}
-{% endfor %}
-
----
-{% endif %}
-
-{% if recommendations %}
-## 💡 Рекомендации
-
-{% for item in recommendations %}
-- {{ item }}
-{% endfor %}
-
----
-{% endif %}
-
-{% if marketing_insights %}
-## 👁️ Маркетинговые инсайты
-
-{% for item in marketing_insights %}
-- {{ item }}
-{% endfor %}
-
----
-{% endif %}
-
-{% if visual_style_score %}
-## 🎨 Оценка визуального стиля
-
-**Оценка:** {{ visual_style_score }}/10
-
-{{ visual_style_analysis }}
-
----
-{% endif %}
-
----
-
-*Сгенерировано CompetitorAI • {{ date }}*
-"""
+# Шаблоны отчётов: backend/templates/report.html, report.md
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
+
+REPORT_TEMPLATES = {
+    "html": "report.html",
+    "markdown": "report.md",
+}
+COMPARISON_TEMPLATE = "comparison.html"
+
+# Колонки сводной таблицы сравнения: оценки (лучшая выделяется) и длины списков
+COMPARISON_SCORES = (
+    ("design_score", "Дизайн"),
+    ("technology_potential", "Технологии"),
+    ("visual_style_score", "Визуальный стиль"),
+)
+COMPARISON_COUNTS = (
+    ("strengths", "Сильные"),
+    ("weaknesses", "Слабые"),
+    ("unique_offers", "УТП"),
+    ("recommendations", "Рекомендации"),
+    ("marketing_insights", "Инсайты"),
+)
+
+PDF_INSTALL_HINT = "Для генерации PDF установите weasyprint: pip install weasyprint"
+
+
+class PDFQueueFull(Exception):
+    """В очереди PDF нет места — клиенту стоит повторить позже"""
+
+
+# === Процесс-воркер PDF ===
+
+_weasy_html = None
+_weasy_error: Optional[str] = None
+
+
+def _init_pdf_worker():
+    """Инициализация воркера: импорт WeasyPrint и пробный рендер (загрузка шрифтов)"""
+    global _weasy_html, _weasy_error
+    try:
+        from weasyprint import HTML
+        HTML(string="<p>warm-up</p>").write_pdf()
+        _weasy_html = HTML
+    except (ImportError, OSError) as e:
+        # OSError — нет системных библиотек (pango); ошибку вернёт каждый рендер
+        _weasy_error = f"{PDF_INSTALL_HINT} ({e})"
+
+
+def _render_pdf(html: str) -> bytes:
+    """HTML -> PDF в процессе-воркере"""
+    if _weasy_html is None:
+        raise RuntimeError(_weasy_error or PDF_INSTALL_HINT)
+    return _weasy_html(string=html).write_pdf()
+
+
+def template_version() -> str:
+    """Версия шаблонов: хэш их исходников (правка шаблона инвалидирует кэш)"""
+    digest = hashlib.sha256()
+    for name in sorted([*REPORT_TEMPLATES.values(), COMPARISON_TEMPLATE]):
+        digest.update(name.encode("utf-8"))
+        digest.update((TEMPLATES_DIR / name).read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def analysis_hash(analysis) -> str:
+    """Стабильный хэш содержимого анализа (ключи отсортированы, тип анализа учтён)"""
+    payload = {"type": type(analysis).__name__, "data": analysis.model_dump()}
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ReportCache:
+    """
+    LRU кэш готовых отчётов с ограничением по размеру
+
+    HTML и Markdown хранятся в памяти; PDF — файлами в каталоге кэша
+    (общий для воркеров uvicorn и переживает перезапуск). Индекса PDF в памяти
+    нет: наличие файла проверяется на диске, порядок LRU — время изменения
+    файла (обновляется при попадании), вытеснение — по содержимому каталога,
+    поэтому файлы, записанные другими воркерами, учитываются в лимите.
+    Файловые операции идут в потоках, не блокируя event loop.
+    """
+
+    def __init__(self, memory_bytes: int, disk_dir: Path, disk_bytes: int):
+        self.memory_limit = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_limit = disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        # Содержимое каталога на момент последнего обхода (для метрик)
+        self._disk_items = 0
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+        if self.disk_limit:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._evict_disk()
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.pdf"
+
+    async def get(self, key: str, on_disk: bool = False) -> Optional[bytes]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._memory[key]
+
+        content = None
+        if on_disk and self.disk_limit:
+            content = await asyncio.to_thread(self._read_disk, key)
+
+        with self._lock:
+            self.stats["hits" if content is not None else "misses"] += 1
+        return content
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            content = path.read_bytes()
+            # Попадание продлевает жизнь файла в LRU всех воркеров
+            os.utime(path)
+        except FileNotFoundError:
+            # Не рендерился или вытеснен (в том числе другим воркером)
+            return None
+        return content
+
+    async def put(self, key: str, content: bytes, spill_to_disk: bool = False):
+        if spill_to_disk and self.disk_limit:
+            await asyncio.to_thread(self._write_disk, key, content)
+            return
+
+        if len(content) > self.memory_limit:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_size -= len(old)
+            self._memory[key] = content
+            self._memory_size += len(content)
+            while self._memory_size > self.memory_limit:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+                self.stats["evictions"] += 1
+
+    def _write_disk(self, key: str, content: bytes):
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Удалить самые давние файлы каталога, пока он больше лимита"""
+        files = []
+        for path in self.disk_dir.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort(key=lambda item: item[0])
+
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        while total > self.disk_limit and files:
+            _, size, path = files.pop(0)
+            total -= size
+            try:
+                path.unlink()
+                evicted += 1
+            except FileNotFoundError:
+                # Уже удалил другой воркер
+                pass
+        with self._lock:
+            self.stats["evictions"] += evicted
+            self._disk_items = len(files)
+            self._disk_size = total
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self.stats,
+                memory_items=len(self._memory),
+                memory_bytes=self._memory_size,
+                disk_items=self._disk_items,
+                disk_bytes=self._disk_size
+            )
 
 
 class ReportService:
@@ -203,6 +216,31 @@ class ReportService:
     def __init__(self):
         logger.info("=" * 50)
         logger.info("Инициализация Report сервиса")
+        
+        # Шаблоны компилируются на старте сервера (load_templates), а не при импорте
+        self._templates: Optional[Dict[str, object]] = None
+        self._templates_lock = threading.Lock()
+        self.template_version = template_version()
+        logger.info(f"  Шаблоны: {', '.join([*REPORT_TEMPLATES.values(), COMPARISON_TEMPLATE])} ({TEMPLATES_DIR}), "
+                    f"версия {self.template_version}")
+        
+        self.cache = ReportCache(
+            memory_bytes=settings.report_cache_mb * 1024 * 1024,
+            disk_dir=Path(settings.report_cache_dir),
+            disk_bytes=settings.report_cache_disk_mb * 1024 * 1024
+        )
+        # Рендеры в работе: одинаковые параллельные запросы ждут один рендер
+        self._inflight: Dict[str, asyncio.Future] = {}
+        logger.info(f"  Кэш отчётов: {settings.report_cache_mb} MB в памяти, "
+                    f"PDF — {settings.report_cache_disk_mb} MB в {settings.report_cache_dir}/")
+        
+        # Пул PDF запускается на старте сервера (start_pdf_pool)
+        self.pdf_workers = settings.pdf_workers
+        self.pdf_queue_size = settings.pdf_queue_size
+        self.pdf_timeout = settings.pdf_timeout
+        self._pdf_pool = RestartablePool("PDF", self.pdf_workers, _init_pdf_worker)
+        self._pdf_lock = threading.Lock()
+        self._pdf_stats = {"pending": 0, "rendered": 0, "failed": 0, "timeouts": 0, "rejected": 0}
         logger.info("Report сервис инициализирован ✓")
         logger.info("=" * 50)
     
@@ -235,8 +273,7 @@ class ReportService:
         logger.info("📄 Генерация HTML отчёта")
         
         data = self._prepare_data(analysis)
-        template = Template(HTML_TEMPLATE)
-        html = template.render(**data)
+        html = self._template(REPORT_TEMPLATES["html"]).render(**data)
         
         logger.info(f"  ✓ HTML сгенерирован: {len(html)} символов")
         return html
@@ -254,8 +291,7 @@ class ReportService:
         logger.info("📝 Генерация Markdown отчёта")
         
         data = self._prepare_data(analysis)
-        template = Template(MARKDOWN_TEMPLATE)
-        md = template.render(**data)
+        md = self._template(REPORT_TEMPLATES["markdown"]).render(**data)
         
         logger.info(f"  ✓ Markdown сгенерирован: {len(md)} символов")
         return md
@@ -271,12 +307,13 @@ class ReportService:
             PDF файл в байтах
         """
         logger.info("📑 Генерация PDF отчёта")
-        
+        return self._html_to_pdf(self.generate_html(analysis))
+    
+    def _html_to_pdf(self, html: str) -> bytes:
+        """HTML -> PDF в текущем процессе"""
         try:
             from weasyprint import HTML
             
-            html = self.generate_html(analysis)
-            
             # Конвертируем HTML в PDF
             pdf_bytes = HTML(string=html).write_pdf()
             
@@ -285,10 +322,286 @@ class ReportService:
             
         except ImportError:
             logger.error("  ✗ WeasyPrint не установлен")
-            raise Exception("Для генерации PDF установите weasyprint: pip install weasyprint")
+            raise Exception(PDF_INSTALL_HINT)
         except Exception as e:
             logger.error(f"  ✗ Ошибка генерации PDF: {e}")
             raise
+    
+    # === Пул рендера PDF ===
+    
+    def load_templates(self) -> Dict[str, object]:
+        """
+        Скомпилировать шаблоны отчётов (хук старта сервера; в скриптах — первый рендер)
+
+        Шаблоны компилируются один раз; байткод кэшируется на диске между перезапусками.
+        auto_reload=False — без проверки mtime файла на каждый get_template
+        """
+        with self._templates_lock:
+            if self._templates is None:
+                from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+                environment = Environment(
+                    loader=FileSystemLoader(str(TEMPLATES_DIR)),
+                    bytecode_cache=FileSystemBytecodeCache(),
+                    autoescape=select_autoescape(["html"]),
+                    auto_reload=False
+                )
+                self._templates = {
+                    name: environment.get_template(name)
+                    for name in (*REPORT_TEMPLATES.values(), COMPARISON_TEMPLATE)
+                }
+        return self._templates
+    
+    def _template(self, name: str):
+        """Скомпилированный шаблон по имени файла"""
+        return (self._templates or self.load_templates())[name]
+    
+    def start_pdf_pool(self):
+        """Запустить пул процессов PDF и прогреть воркеры (импорт WeasyPrint, шрифты)"""
+        if self._pdf_pool.running:
+            return
+        self._pdf_pool.start()
+        logger.info(f"  📑 Пул PDF: {self.pdf_workers} процессов, очередь {self.pdf_queue_size}, "
+                    f"таймаут {self.pdf_timeout:.0f} сек")
+    
+    def close(self):
+        """Остановить пул PDF"""
+        self._pdf_pool.close()
+    
+    def _pdf_done(self, future):
+        with self._pdf_lock:
+            self._pdf_stats["pending"] -= 1
+    
+    async def generate_pdf_async(self, analysis) -> bytes:
+        """
+        Генерировать PDF в пуле процессов, не блокируя event loop
+        
+        Args:
+            analysis: Объект анализа
+            
+        Returns:
+            PDF файл в байтах
+            
+        Raises:
+            PDFQueueFull: Очередь рендера заполнена
+            TimeoutError: Рендер не уложился в pdf_timeout
+        """
+        return await self.html_to_pdf_async(self.generate_html(analysis))
+    
+    async def html_to_pdf_async(self, html: str) -> bytes:
+        """
+        Готовый HTML -> PDF в пуле процессов (ограничения очереди и таймаут как у generate_pdf_async)
+        """
+        if not self._pdf_pool.running:
+            # Пул не запущен (скрипты, тесты) — рендер в потоке
+            return await asyncio.to_thread(self._html_to_pdf, html)
+        
+        logger.info("📑 Генерация PDF отчёта (пул процессов)")
+        with self._pdf_lock:
+            if self._pdf_stats["pending"] >= self.pdf_queue_size:
+                self._pdf_stats["rejected"] += 1
+                logger.warning(f"  ⚠ Очередь PDF заполнена ({self.pdf_queue_size})")
+                raise PDFQueueFull(f"Очередь генерации PDF заполнена ({self.pdf_queue_size}), повторите позже")
+            self._pdf_stats["pending"] += 1
+        
+        try:
+            executor, future = self._pdf_pool.submit(_render_pdf, html)
+        except BaseException:
+            self._pdf_done(None)
+            raise
+        # Слот освобождается, когда воркер закончил или убит перезапуском пула
+        future.add_done_callback(self._pdf_done)
+        
+        try:
+            pdf_bytes = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.pdf_timeout)
+        except BrokenProcessPool as e:
+            # Воркер упал (нехватка памяти, segfault) или пул убит перезапуском — пересоздаёт первый
+            self._pdf_count("failed")
+            logger.error(f"  ✗ Пул PDF сломан: {e}")
+            self._pdf_pool.restart(executor, "воркер завершился аварийно")
+            raise
+        except asyncio.TimeoutError:
+            # Зависший WeasyPrint сам не завершится и держит процесс — пул пересоздаётся
+            self._pdf_count("timeouts")
+            logger.error(f"  ✗ PDF не сгенерирован за {self.pdf_timeout:.0f} сек")
+            self._pdf_pool.restart(executor, f"рендер дольше {self.pdf_timeout:.0f} сек")
+            raise TimeoutError(f"Генерация PDF превысила {self.pdf_timeout:.0f} сек")
+        except Exception as e:
+            self._pdf_count("failed")
+            logger.error(f"  ✗ Ошибка генерации PDF: {e}")
+            raise
+        
+        self._pdf_count("rendered")
+        logger.info(f"  ✓ PDF сгенерирован: {len(pdf_bytes)} байт")
+        return pdf_bytes
+    
+    def _pdf_count(self, name: str):
+        with self._pdf_lock:
+            self._pdf_stats[name] += 1
+    
+    # === Кэш ===
+    
+    def cache_key(self, analysis, report_format: str) -> str:
+        """Ключ кэша: содержимое анализа + формат + версия шаблонов"""
+        return f"{analysis_hash(analysis)[:40]}-{report_format}-{self.template_version}"
+    
+    async def _render_uncached(self, analysis, report_format: str) -> bytes:
+        if report_format == "html":
+            return self.generate_html(analysis).encode("utf-8")
+        if report_format == "markdown":
+            return self.generate_markdown(analysis).encode("utf-8")
+        if report_format == "pdf":
+            return await self.generate_pdf_async(analysis)
+        raise ValueError(f"Неподдерживаемый формат: {report_format}")
+    
+    async def render(self, analysis, report_format: str) -> bytes:
+        """
+        Отчёт в формате html, markdown или pdf — из кэша или новым рендером
+        
+        Дата в отчёте — время первого рендера этого содержимого.
+        
+        Raises:
+            ValueError: Неподдерживаемый формат
+        """
+        return await self._cached(
+            self.cache_key(analysis, report_format),
+            report_format,
+            lambda: self._render_uncached(analysis, report_format)
+        )
+    
+    async def _cached(self, key: str, report_format: str, produce: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Отчёт из кэша; при промахе — один общий рендер на все одинаковые запросы"""
+        content = await self.cache.get(key, on_disk=report_format == "pdf")
+        if content is not None:
+            logger.info(f"  ⚡ Отчёт {report_format} из кэша ({len(content) / 1024:.1f} KB)")
+            return content
+        
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
+        task = asyncio.ensure_future(produce())
+        self._inflight[key] = task
+        try:
+            content = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+        
+        await self.cache.put(key, content, spill_to_disk=report_format == "pdf")
+        return content
+    
+    # === Сравнение конкурентов ===
+    
+    def _comparison_charts(self, analysis, name: str, image_format: str) -> List[Tuple[str, dict]]:
+        """Графики конкурента для сводного отчёта"""
+        if isinstance(analysis, ImageAnalysis):
+            return [("generate_visual_score_chart", {"score": analysis.visual_style_score, "fmt": image_format})]
+        return [
+            ("generate_radar_chart", {
+                "strengths": analysis.strengths,
+                "weaknesses": analysis.weaknesses,
+                "unique_offers": analysis.unique_offers,
+                "recommendations": analysis.recommendations,
+                "title": name,
+                "fmt": image_format
+            }),
+            ("generate_comparison_bar_chart", {"analysis": analysis, "title": name, "fmt": image_format}),
+        ]
+    
+    def generate_comparison_html(
+        self,
+        competitors: List[Tuple[str, object]],
+        charts: List[List[str]],
+        image_format: str = "png"
+    ) -> str:
+        """
+        Генерировать HTML сводного отчёта
+        
+        Args:
+            competitors: Пары (название, объект анализа)
+            charts: Base64 графики каждого конкурента (в том же порядке)
+            image_format: Формат графиков (png, svg, webp)
+            
+        Returns:
+            HTML код отчёта
+        """
+        logger.info(f"📄 Генерация сводного отчёта: {len(competitors)} конкурентов")
+        
+        rows = []
+        for (name, analysis), images in zip(competitors, charts):
+            rows.append({
+                "name": name,
+                "analysis_type": type(analysis).__name__.replace("Analysis", ""),
+                "summary": getattr(analysis, "summary", "") or getattr(analysis, "description", "") or "",
+                "scores": {field: getattr(analysis, field, None) for field, _ in COMPARISON_SCORES},
+                "counts": {field: len(getattr(analysis, field, None) or []) for field, _ in COMPARISON_COUNTS},
+                "charts": [image for image in images if image],
+            })
+        best = {
+            field: max((row["scores"][field] for row in rows if row["scores"][field] is not None), default=None)
+            for field, _ in COMPARISON_SCORES
+        }
+        
+        html = self._template(COMPARISON_TEMPLATE).render(
+            date=datetime.now().strftime("%d.%m.%Y %H:%M"),
+            competitors=rows,
+            best=best,
+            score_columns=COMPARISON_SCORES,
+            count_columns=COMPARISON_COUNTS,
+            chart_mime=CHART_FORMATS[image_format]
+        )
+        logger.info(f"  ✓ HTML сгенерирован: {len(html)} символов")
+        return html
+    
+    async def _render_comparison_uncached(self, competitors: List[Tuple[str, object]], report_format: str) -> bytes:
+        # В PDF графики встраиваются вектором (SVG): меньше файл, чёткая печать
+        image_format = "svg" if report_format == "pdf" else "png"
+        jobs = [self._comparison_charts(analysis, name, image_format) for name, analysis in competitors]
+        flat = [job for competitor_jobs in jobs for job in competitor_jobs]
+        
+        # Все графики всех конкурентов — одновременно в пуле
+        images = await viz_service.render_many(flat)
+        charts, offset = [], 0
+        for competitor_jobs in jobs:
+            charts.append(images[offset:offset + len(competitor_jobs)])
+            offset += len(competitor_jobs)
+        
+        html = self.generate_comparison_html(competitors, charts, image_format)
+        if report_format == "pdf":
+            return await self.html_to_pdf_async(html)
+        return html.encode("utf-8")
+    
+    async def render_comparison(self, competitors: List[Tuple[str, object]], report_format: str) -> bytes:
+        """
+        Сводный отчёт по нескольким конкурентам (html или pdf) с графиками и таблицей сравнения
+        
+        Args:
+            competitors: Пары (название, объект анализа)
+            report_format: html или pdf
+            
+        Raises:
+            ValueError: Неподдерживаемый формат
+        """
+        if report_format not in ("html", "pdf"):
+            raise ValueError(f"Неподдерживаемый формат сводного отчёта: {report_format}")
+        
+        digest = hashlib.sha256()
+        for name, analysis in competitors:
+            digest.update(name.encode("utf-8"))
+            digest.update(analysis_hash(analysis).encode("ascii"))
+        key = f"cmp{digest.hexdigest()[:37]}-{report_format}-{self.template_version}"
+        return await self._cached(
+            key,
+            report_format,
+            lambda: self._render_comparison_uncached(competitors, report_format)
+        )
+    
+    def get_stats(self) -> dict:
+        """Метрики пула PDF и кэша отчётов"""
+        with self._pdf_lock:
+            stats = dict(self._pdf_stats, workers=self.pdf_workers if self._pdf_pool.running else 0,
+                         restarts=self._pdf_pool.restarts)
+        stats["cache"] = self.cache.get_stats()
+        return stats
 
 # Глобальный экземпляр
 report_service = ReportService()
\ No newline at end of file
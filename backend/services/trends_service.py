@@ -0,0 +1,247 @@
+"""
+Временные ряды оценок конкурентов
+
+Каждый анализ с известным конкурентом (домен сайта или поле competitor)
+добавляет точку: design_score, technology_potential, visual_style_score и
+длины списков. Агрегаты по дням и неделям обновляются в той же транзакции,
+поэтому запросы трендов не сканируют сырые точки.
+"""
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from backend.config import settings
+from backend.models.schemas import CompetitorTrendSummary, TrendPoint
+
+logger = logging.getLogger("competitor_monitor.trends")
+
+PERIODS = ("day", "week")
+
+# Поля точки: оценки (среднее/мин/макс) и длины списков (среднее)
+SCORE_FIELDS = ("design_score", "technology_potential", "visual_style_score")
+COUNT_FIELDS = ("strengths", "weaknesses", "unique_offers", "recommendations", "marketing_insights")
+
+
+def normalize_competitor(value: str) -> str:
+    """
+    Ключ конкурента: домен в нижнем регистре без схемы, www и порта
+
+    "https://WWW.Example.com:443/about" -> "example.com"; не-URL ("Acme CRM") — как есть в нижнем регистре
+    """
+    value = value.strip().lower()
+    host = urlsplit(value if "//" in value else f"//{value}").hostname or ""
+    if "." not in host or " " in value:
+        return value
+    host = host.rstrip(".")
+    try:
+        # Кириллические домены храним в IDNA, чтобы "сайт.рф" и "xn--80aswg.xn--p1ai" совпадали
+        host = host.encode("idna").decode("ascii")
+    except UnicodeError:
+        pass
+    return host[4:] if host.startswith("www.") else host
+
+
+def period_start(day: date, period: str) -> str:
+    """Начало периода агрегата: день или понедельник недели"""
+    if period == "week":
+        day -= timedelta(days=day.weekday())
+    return day.isoformat()
+
+
+class TrendsService:
+    """Хранение точек оценок и агрегатов по конкурентам (SQLite, WAL)"""
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Trends сервиса")
+
+        self.path = Path(settings.trends_db)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+        logger.info(f"  База: {self.path}")
+        logger.info(f"  Конкурентов: {len(self.list_competitors())}")
+        logger.info("Trends сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    @contextmanager
+    def _write(self):
+        """Транзакция записи (BEGIN IMMEDIATE — безопасно для нескольких воркеров)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _create_schema(self):
+        scores = ", ".join(f"{field} INTEGER" for field in SCORE_FIELDS)
+        counts = ", ".join(f"{field} INTEGER NOT NULL DEFAULT 0" for field in COUNT_FIELDS)
+        score_aggregates = ", ".join(
+            f"{field}_sum INTEGER NOT NULL DEFAULT 0, {field}_n INTEGER NOT NULL DEFAULT 0, "
+            f"{field}_min INTEGER, {field}_max INTEGER"
+            for field in SCORE_FIELDS
+        )
+        count_aggregates = ", ".join(f"{field}_sum INTEGER NOT NULL DEFAULT 0" for field in COUNT_FIELDS)
+        with self._lock:
+            self._conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS score_points (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    competitor TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    request_type TEXT NOT NULL,
+                    history_id TEXT,
+                    {scores},
+                    {counts}
+                );
+                CREATE INDEX IF NOT EXISTS idx_points_competitor_timestamp ON score_points(competitor, timestamp);
+                CREATE TABLE IF NOT EXISTS score_rollup (
+                    competitor TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    analyses INTEGER NOT NULL DEFAULT 0,
+                    last_timestamp TEXT,
+                    {score_aggregates},
+                    {count_aggregates},
+                    PRIMARY KEY (competitor, period, bucket)
+                ) WITHOUT ROWID;
+            """)
+
+    def record(
+        self,
+        competitor: str,
+        analysis,
+        request_type: str,
+        history_id: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Добавить точку и обновить дневной и недельный агрегаты
+
+        Args:
+            competitor: URL, домен или название конкурента
+            analysis: CompetitorAnalysis или ImageAnalysis
+            request_type: Тип запроса истории
+            history_id: Запись истории с полным результатом
+
+        Returns:
+            Нормализованный ключ конкурента
+        """
+        key = normalize_competitor(competitor)
+        if not key:
+            return None
+
+        now = datetime.now()
+        scores = {field: getattr(analysis, field, None) for field in SCORE_FIELDS}
+        counts = {field: len(getattr(analysis, field, None) or []) for field in COUNT_FIELDS}
+
+        point_columns = ["competitor", "timestamp", "request_type", "history_id", *SCORE_FIELDS, *COUNT_FIELDS]
+        point_values = [key, now.isoformat(), request_type, history_id, *scores.values(), *counts.values()]
+
+        # Агрегат: суммы и счётчики складываются, min/max — по непустым оценкам
+        rollup_columns = ["competitor", "period", "bucket", "analyses", "last_timestamp"]
+        updates = ["analyses = analyses + 1", "last_timestamp = MAX(last_timestamp, excluded.last_timestamp)"]
+        score_values = []
+        for field, value in scores.items():
+            score_values += [value or 0, int(value is not None), value, value]
+            rollup_columns += [f"{field}_sum", f"{field}_n", f"{field}_min", f"{field}_max"]
+            updates += [
+                f"{field}_sum = {field}_sum + excluded.{field}_sum",
+                f"{field}_n = {field}_n + excluded.{field}_n",
+                f"{field}_min = MIN(COALESCE({field}_min, excluded.{field}_min), "
+                f"COALESCE(excluded.{field}_min, {field}_min))",
+                f"{field}_max = MAX(COALESCE({field}_max, excluded.{field}_max), "
+                f"COALESCE(excluded.{field}_max, {field}_max))",
+            ]
+        for field in COUNT_FIELDS:
+            rollup_columns.append(f"{field}_sum")
+            updates.append(f"{field}_sum = {field}_sum + excluded.{field}_sum")
+
+        rollup_sql = (
+            f"INSERT INTO score_rollup ({', '.join(rollup_columns)}) "
+            f"VALUES ({', '.join('?' * len(rollup_columns))}) "
+            f"ON CONFLICT (competitor, period, bucket) DO UPDATE SET {', '.join(updates)}"
+        )
+
+        with self._write():
+            self._conn.execute(
+                f"INSERT INTO score_points ({', '.join(point_columns)}) VALUES ({', '.join('?' * len(point_columns))})",
+                point_values
+            )
+            for period in PERIODS:
+                self._conn.execute(
+                    rollup_sql,
+                    [key, period, period_start(now.date(), period), 1, now.isoformat(), *score_values, *counts.values()]
+                )
+
+        logger.info(f"  📈 Тренды: точка для {key} (дизайн {scores['design_score']}, "
+                    f"технологии {scores['technology_potential']})")
+        return key
+
+    def get_trend(self, competitor: str, period: str = "day", days: Optional[int] = None) -> List[TrendPoint]:
+        """
+        Ряд агрегатов конкурента
+
+        Args:
+            competitor: URL, домен или название (нормализуется как при записи)
+            period: day или week
+            days: Только последние N дней, включая сегодняшний
+
+        Raises:
+            ValueError: Неизвестный период
+        """
+        if period not in PERIODS:
+            raise ValueError(f"period должен быть одним из: {', '.join(PERIODS)}")
+
+        query = "SELECT * FROM score_rollup WHERE competitor = ? AND period = ?"
+        params: list = [normalize_competitor(competitor), period]
+        if days:
+            query += " AND bucket >= ?"
+            params.append(period_start(date.today() - timedelta(days=days - 1), period))
+        query += " ORDER BY bucket"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        points = []
+        for row in rows:
+            point = {"bucket": row["bucket"], "analyses": row["analyses"]}
+            for field in SCORE_FIELDS:
+                count = row[f"{field}_n"]
+                point[f"{field}_avg"] = round(row[f"{field}_sum"] / count, 2) if count else None
+                point[f"{field}_min"] = row[f"{field}_min"]
+                point[f"{field}_max"] = row[f"{field}_max"]
+            for field in COUNT_FIELDS:
+                point[f"{field}_avg"] = round(row[f"{field}_sum"] / row["analyses"], 2)
+            points.append(TrendPoint(**point))
+        return points
+
+    def list_competitors(self) -> List[CompetitorTrendSummary]:
+        """Конкуренты с числом анализов и последними оценками"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT r.competitor, SUM(r.analyses) AS analyses, MAX(r.last_timestamp) AS last_seen,
+                       p.design_score, p.technology_potential, p.visual_style_score
+                FROM score_rollup r
+                JOIN score_points p ON p.seq = (
+                    SELECT seq FROM score_points WHERE competitor = r.competitor ORDER BY timestamp DESC LIMIT 1
+                )
+                WHERE r.period = 'week'
+                GROUP BY r.competitor
+                ORDER BY last_seen DESC
+            """).fetchall()
+        return [CompetitorTrendSummary(**dict(row)) for row in rows]
+
+
+# Глобальный экземпляр
+trends_service = TrendsService()
@@ -0,0 +1,335 @@
+"""
+Сервис учёта токенов, задержек и стоимости вызовов OpenAI
+
+Агрегаты "день | эндпоинт | модель" хранятся в SQLite (usage_db, WAL), общей
+для воркеров uvicorn: каждый процесс прибавляет свои приращения upsert-ом,
+поэтому счётчики воркеров не перезаписывают друг друга.
+"""
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from backend.config import settings
+from backend.models.schemas import TokenUsage, UsageStatsItem
+
+logger = logging.getLogger("competitor_monitor.usage")
+
+# Эндпоинт и вызовы модели текущего HTTP запроса
+_current_endpoint: ContextVar[Optional[str]] = ContextVar("usage_endpoint", default=None)
+_current_calls: ContextVar[Optional[List[TokenUsage]]] = ContextVar("usage_calls", default=None)
+
+# Колонки ключа агрегата — допустимые группировки get_stats
+GROUP_FIELDS = ("day", "endpoint", "model")
+SUM_FIELDS = ("calls", "prompt_tokens", "completion_tokens", "image_tokens", "cost_usd", "latency_ms")
+
+
+def _empty_bucket() -> dict:
+    return {
+        "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "image_tokens": 0,
+        "cost_usd": 0.0, "latency_ms": 0.0, "max_latency_ms": 0.0
+    }
+
+
+class UsageService:
+    """Учёт использования модели по запросам, эндпоинтам, моделям и дням"""
+
+    def __init__(self):
+        logger.info("=" * 50)
+        logger.info("Инициализация Usage сервиса")
+
+        self.path = Path(settings.usage_db)
+        self.flush_interval = settings.usage_flush_interval
+        self._lock = threading.Lock()
+        # Соединение с базой — по одному запросу за раз
+        self._db_lock = threading.Lock()
+        # Перенос приращений в базу и чтение get_stats не пересекаются — без пропуска или двойного счёта
+        self._flush_lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        self._import_json(Path(settings.usage_file))
+
+        # Write-behind: record копит приращения в памяти, в базу их пишет фоновый поток
+        self._pending: Dict[Tuple[str, str, str], dict] = {}
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._writer_loop, name="usage-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+        logger.info(f"  База: {self.path}, запись раз в {self.flush_interval} сек")
+        logger.info("Usage сервис инициализирован ✓")
+        logger.info("=" * 50)
+
+    @contextmanager
+    def _write(self):
+        """Транзакция записи (BEGIN IMMEDIATE — безопасно для нескольких воркеров)"""
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _create_schema(self):
+        with self._db_lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS usage_buckets (
+                    day TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    calls INTEGER NOT NULL DEFAULT 0,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    image_tokens INTEGER NOT NULL DEFAULT 0,
+                    cost_usd REAL NOT NULL DEFAULT 0,
+                    latency_ms REAL NOT NULL DEFAULT 0,
+                    max_latency_ms REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, endpoint, model)
+                ) WITHOUT ROWID;
+            """)
+
+    def _import_json(self, usage_file: Path):
+        """Однократный импорт агрегатов из прежнего usage.json (файл переименовывается в .imported)"""
+        imported = usage_file.with_name(f"{usage_file.name}.imported")
+        try:
+            # Переименование до чтения: при старте нескольких воркеров файл импортирует один
+            usage_file.rename(imported)
+        except FileNotFoundError:
+            return
+        try:
+            buckets = json.loads(imported.read_text(encoding="utf-8"))
+        except json.JSONDecodeError as e:
+            logger.warning(f"Ошибка парсинга файла статистики {usage_file}: {e}")
+            return
+        pending = {tuple(key.split("|", 2)): bucket for key, bucket in buckets.items() if key.count("|") >= 2}
+        self._upsert(pending)
+        logger.info(f"  Импортировано агрегатов из {usage_file}: {len(pending)}")
+
+    def _upsert(self, pending: Dict[Tuple[str, str, str], dict]):
+        """Прибавить приращения к агрегатам в базе"""
+        if not pending:
+            return
+        columns = ", ".join(SUM_FIELDS)
+        updates = ", ".join(f"{field} = {field} + excluded.{field}" for field in SUM_FIELDS)
+        rows = [
+            (*key, *(bucket[field] for field in SUM_FIELDS), bucket["max_latency_ms"])
+            for key, bucket in pending.items()
+        ]
+        with self._write():
+            self._conn.executemany(
+                f"INSERT INTO usage_buckets (day, endpoint, model, {columns}, max_latency_ms) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(SUM_FIELDS))}, ?) "
+                f"ON CONFLICT (day, endpoint, model) DO UPDATE SET {updates}, "
+                f"max_latency_ms = MAX(max_latency_ms, excluded.max_latency_ms)",
+                rows
+            )
+
+    def _writer_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Записать накопленные приращения в базу"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            try:
+                self._upsert(pending)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка записи статистики: {e}")
+                # Вернуть приращения — запишутся следующим сбросом
+                with self._lock:
+                    for key, bucket in pending.items():
+                        self._add(key, bucket)
+
+    def close(self):
+        """Остановить фоновую запись и сбросить приращения в базу"""
+        self._stop.set()
+        self.flush()
+
+    def _add(self, key: Tuple[str, str, str], delta: dict):
+        """Прибавить приращение к _pending (под self._lock)"""
+        bucket = self._pending.setdefault(key, _empty_bucket())
+        for field in SUM_FIELDS:
+            bucket[field] += delta[field]
+        bucket["max_latency_ms"] = max(bucket["max_latency_ms"], delta["max_latency_ms"])
+
+    def _price(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """Оценить стоимость вызова в USD"""
+        prices = settings.model_pricing.get(model)
+        if not prices:
+            # Версионированные имена (gpt-4o-mini-2024-07-18) -> самый длинный префикс
+            matches = [name for name in settings.model_pricing if model.startswith(name)]
+            if not matches:
+                return 0.0
+            prices = settings.model_pricing[max(matches, key=len)]
+        return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+    def begin_request(self, endpoint: str):
+        """Начать учёт для HTTP запроса (вызывается из middleware)"""
+        _current_endpoint.set(endpoint)
+        _current_calls.set([])
+
+    def record(
+        self,
+        operation: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency: float,
+        image_tokens: int = 0
+    ) -> TokenUsage:
+        """
+        Записать один вызов модели
+
+        Args:
+            operation: Метод OpenAIService (analyze_text, analyze_image, ...)
+            model: Имя модели
+            prompt_tokens: Токены запроса
+            completion_tokens: Токены ответа
+            latency: Задержка вызова в секундах
+            image_tokens: Оценка токенов изображений
+
+        Returns:
+            Использование для этого вызова
+        """
+        usage = TokenUsage(
+            model=model,
+            calls=1,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            image_tokens=image_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            latency_ms=round(latency * 1000, 1),
+            cost_usd=self._price(model, prompt_tokens, completion_tokens)
+        )
+
+        endpoint = _current_endpoint.get() or operation
+        calls = _current_calls.get()
+        if calls is not None:
+            calls.append(usage)
+
+        key = (datetime.now().strftime("%Y-%m-%d"), endpoint, model)
+        with self._lock:
+            self._add(key, dict(
+                calls=1,
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                image_tokens=usage.image_tokens,
+                cost_usd=usage.cost_usd,
+                latency_ms=usage.latency_ms,
+                max_latency_ms=usage.latency_ms
+            ))
+
+        logger.info(
+            f"  💰 Токены: {usage.prompt_tokens} + {usage.completion_tokens} "
+            f"(изобр. ~{usage.image_tokens}), {usage.latency_ms:.0f} мс, ${usage.cost_usd:.5f}"
+        )
+        return usage
+
+    def request_usage(self) -> Optional[TokenUsage]:
+        """Суммарное использование в текущем HTTP запросе"""
+        calls = _current_calls.get()
+        if not calls:
+            return None
+        return TokenUsage(
+            model=calls[-1].model,
+            calls=len(calls),
+            prompt_tokens=sum(c.prompt_tokens for c in calls),
+            completion_tokens=sum(c.completion_tokens for c in calls),
+            image_tokens=sum(c.image_tokens for c in calls),
+            total_tokens=sum(c.total_tokens for c in calls),
+            latency_ms=round(sum(c.latency_ms for c in calls), 1),
+            cost_usd=sum(c.cost_usd for c in calls)
+        )
+
+    def get_stats(self, group_by: str = "endpoint", days: Optional[int] = None) -> List[UsageStatsItem]:
+        """
+        Агрегаты использования
+
+        Args:
+            group_by: endpoint, model или day
+            days: Учитывать только последние N дней
+
+        Returns:
+            Агрегаты, отсортированные по убыванию токенов (для day — по дате)
+        """
+        if group_by not in GROUP_FIELDS:
+            raise ValueError(f"Неподдерживаемая группировка: {group_by}")
+
+        since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d") if days else ""
+        sums = ", ".join(f"SUM({field}) AS {field}" for field in SUM_FIELDS)
+        with self._flush_lock:
+            with self._lock:
+                # Приращения этого процесса, ещё не записанные в базу
+                pending = [(key, dict(bucket)) for key, bucket in self._pending.items()]
+            with self._db_lock:
+                rows = self._conn.execute(
+                    f"SELECT {group_by} AS key, {sums}, MAX(max_latency_ms) AS max_latency_ms "
+                    f"FROM usage_buckets WHERE day >= ? GROUP BY {group_by}",
+                    (since,)
+                ).fetchall()
+
+        groups: Dict[str, dict] = {
+            row["key"]: {field: row[field] for field in (*SUM_FIELDS, "max_latency_ms")} for row in rows
+        }
+        index = GROUP_FIELDS.index(group_by)
+        for key, bucket in pending:
+            if key[0] < since:
+                continue
+            group = groups.setdefault(key[index], _empty_bucket())
+            for field in SUM_FIELDS:
+                group[field] += bucket[field]
+            group["max_latency_ms"] = max(group["max_latency_ms"], bucket["max_latency_ms"])
+
+        items = [self._to_item(key, group) for key, group in groups.items()]
+        if group_by == "day":
+            items.sort(key=lambda item: item.key, reverse=True)
+        else:
+            items.sort(key=lambda item: item.total_tokens, reverse=True)
+        return items
+
+    def total(self, items: List[UsageStatsItem]) -> UsageStatsItem:
+        """Итог по списку агрегатов"""
+        calls = sum(item.calls for item in items)
+        return UsageStatsItem(
+            key="total",
+            calls=calls,
+            prompt_tokens=sum(item.prompt_tokens for item in items),
+            completion_tokens=sum(item.completion_tokens for item in items),
+            image_tokens=sum(item.image_tokens for item in items),
+            total_tokens=sum(item.total_tokens for item in items),
+            cost_usd=round(sum(item.cost_usd for item in items), 6),
+            avg_latency_ms=round(sum(item.avg_latency_ms * item.calls for item in items) / calls, 1) if calls else 0.0,
+            max_latency_ms=max((item.max_latency_ms for item in items), default=0.0)
+        )
+
+    @staticmethod
+    def _to_item(key: str, group: dict) -> UsageStatsItem:
+        calls = group["calls"]
+        return UsageStatsItem(
+            key=key,
+            calls=calls,
+            prompt_tokens=group["prompt_tokens"],
+            completion_tokens=group["completion_tokens"],
+            image_tokens=group["image_tokens"],
+            total_tokens=group["prompt_tokens"] + group["completion_tokens"],
+            cost_usd=round(group["cost_usd"], 6),
+            avg_latency_ms=round(group["latency_ms"] / calls, 1) if calls else 0.0,
+            max_latency_ms=group["max_latency_ms"]
+        )
+
+
+# Глобальный экземпляр
+usage_service = UsageService()
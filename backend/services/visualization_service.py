@@ -1,20 +1,42 @@
 """
 Сервис для генерации визуализаций (графиков)
 """
+import asyncio
 import base64
+import functools
+import hashlib
+import importlib.metadata
 import logging
 import io
-from typing import Optional, List
-import matplotlib
-matplotlib.use('Agg')  # Без GUI
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from matplotlib.patches import Polygon
-import numpy as np
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Dict, Optional, List, Tuple
+from backend.config import settings
 from backend.models.schemas import CompetitorAnalysis, ImageAnalysis
+from backend.services.process_pool import RestartablePool
+
+if TYPE_CHECKING:
+    import numpy as np
+    from matplotlib.figure import Figure
 
 logger = logging.getLogger("competitor_monitor.visualization")
 
+# Форматы изображений -> MIME тип
+CHART_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'webp': 'image/webp',
+}
+DEFAULT_DPI = 150
+
+# Меняется при правке стиля или шаблонов фигур — инвалидирует ETag графиков у клиентов
+CHART_STYLE_VERSION = 1
+
+# Шаблонов фигур на процесс (тип графика x категории); сверх — сброс
+FIGURE_TEMPLATES_LIMIT = 32
+
 # Цветовая схема
 COLORS = {
     'strengths': '#10b981',      # Зелёный
@@ -25,6 +47,219 @@ COLORS = {
 }
 
 
+# matplotlib и numpy импортируются в функциях рендера, а не при импорте модуля:
+# сервер и воркеры других пулов не платят за них на старте
+_style_lock = threading.Lock()
+_style_applied = False
+
+
+def _ensure_style():
+    """Тёмная тема (и загрузка matplotlib) — один раз на процесс, перед первым рендером"""
+    global _style_applied
+    if _style_applied:
+        return
+    with _style_lock:
+        if _style_applied:
+            return
+        started = time.perf_counter()
+        apply_style()
+        _style_applied = True
+        logger.info(f"  📊 matplotlib загружен за {time.perf_counter() - started:.2f} сек")
+
+
+@functools.lru_cache(maxsize=None)
+def _matplotlib_version() -> str:
+    """Версия matplotlib без его импорта (для ETag)"""
+    return importlib.metadata.version("matplotlib")
+
+
+def apply_style():
+    """Тёмная тема графиков; matplotlib — бэкенд Agg, без GUI"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    
+    plt.style.use('dark_background')
+    plt.rcParams.update({
+        'font.size': 10,
+        'axes.titlesize': 14,
+        'axes.labelsize': 12,
+        'figure.facecolor': '#1a2234',
+        'axes.facecolor': '#1a2234',
+        'text.color': '#f1f5f9',
+        'axes.labelcolor': '#f1f5f9',
+        'xtick.color': '#94a3b8',
+        'ytick.color': '#94a3b8',
+        'axes.edgecolor': '#334155',
+        'axes.titlecolor': '#f1f5f9',
+        # Постоянная соль id элементов SVG — одинаковый график даёт одинаковые байты
+        'svg.hashsalt': 'competitor-monitor',
+    })
+
+
+# === Процесс-воркер графиков ===
+
+def _init_chart_worker():
+    """Инициализация воркера: matplotlib, стиль и пробный рендер (загрузка шрифтов)"""
+    _ensure_style()
+    import matplotlib.pyplot as plt
+    
+    fig, ax = plt.subplots(figsize=(1, 1))
+    ax.set_title('warm-up')
+    fig.savefig(io.BytesIO(), format='png')
+    plt.close(fig)
+
+
+def _render_in_worker(method: str, kwargs: dict) -> Tuple[Optional[str], float]:
+    """Вызвать метод генерации графика в процессе-воркере; возвращает (base64, сек рендера)"""
+    started = time.perf_counter()
+    image = getattr(viz_service, method)(**kwargs)
+    return image, time.perf_counter() - started
+
+
+class ChartQueueFull(Exception):
+    """В очереди графиков нет места — клиенту стоит повторить позже"""
+
+
+# Графики сравнения N конкурентов: аргументы names и matrix (competitor_matrix)
+COMPARISON_CHART_METHODS = (
+    "generate_overlay_radar_chart",
+    "generate_grouped_bar_chart",
+    "generate_scores_heatmap",
+)
+
+# Задача рендера: имя метода VisualizationService и его аргументы
+ChartJob = Tuple[str, dict]
+
+
+def radar_data(strengths, weaknesses, unique_offers, recommendations) -> Tuple[List[str], List[int]]:
+    """Категории и значения Radar Chart (пустые списки пропускаются)"""
+    categories = []
+    values = []
+    
+    if strengths:
+        categories.append('Сильные стороны')
+        values.append(min(len(strengths) * 2, 10))
+    if weaknesses:
+        categories.append('Слабые стороны')
+        values.append(10 - min(len(weaknesses) * 2, 9))
+    if unique_offers:
+        categories.append('Уникальные предложения')
+        values.append(min(len(unique_offers) * 2, 10))
+    if recommendations:
+        categories.append('Рекомендации')
+        values.append(min(len(recommendations) * 2, 10))
+    return categories, values
+
+
+def chart_key(method: str, kwargs: dict) -> Optional[tuple]:
+    """
+    Ключ кэша графика — только то, от чего зависит картинка
+    
+    Radar зависит от значений осей (длины списков с насыщением), bar — от четырёх
+    счётчиков, score — от целой оценки 0-10. None — график не кэшируется.
+    """
+    if method == "generate_radar_chart":
+        categories, values = radar_data(
+            kwargs.get("strengths"), kwargs.get("weaknesses"),
+            kwargs.get("unique_offers"), kwargs.get("recommendations")
+        )
+        return method, tuple(categories), tuple(values), kwargs.get("title"), _output_key(kwargs)
+    if method == "generate_comparison_bar_chart":
+        analysis = kwargs["analysis"]
+        counts = (
+            len(analysis.strengths), len(analysis.weaknesses),
+            len(analysis.unique_offers), len(analysis.recommendations)
+        )
+        return method, counts, kwargs.get("title"), _output_key(kwargs)
+    if method == "generate_visual_score_chart":
+        return method, int(kwargs["score"]), _output_key(kwargs)
+    if method in COMPARISON_CHART_METHODS:
+        return (
+            method, tuple(kwargs["names"]), tuple(map(tuple, kwargs["matrix"])),
+            kwargs.get("title"), _output_key(kwargs)
+        )
+    return None
+
+
+def chart_renderable(method: str, kwargs: dict) -> bool:
+    """
+    Хватит ли входов для графика (без рендера)
+    
+    Radar строится минимум по трём непустым осям; остальные графики — по любым входам.
+    """
+    if method == "generate_radar_chart":
+        categories, _ = radar_data(
+            kwargs.get("strengths"), kwargs.get("weaknesses"),
+            kwargs.get("unique_offers"), kwargs.get("recommendations")
+        )
+        return len(categories) >= 3
+    return True
+
+
+def chart_etag(method: str, kwargs: dict) -> Optional[str]:
+    """
+    Сильный ETag графика по его входам (без рендера)
+    
+    Рендер детерминирован: одинаковые входы, версия matplotlib и стиль дают
+    одинаковые байты. None — график не кэшируется.
+    """
+    key = chart_key(method, kwargs)
+    if key is None:
+        return None
+    digest = hashlib.sha256(repr((key, _matplotlib_version(), CHART_STYLE_VERSION)).encode("utf-8"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+# Колонки матрицы сравнения: оценки 0-10 и длины списков
+COMPARISON_METRICS = (
+    ("design_score", "Дизайн"),
+    ("technology_potential", "Технологии"),
+    ("visual_style_score", "Визуальный стиль"),
+    ("strengths", "Сильные"),
+    ("weaknesses", "Слабые"),
+    ("unique_offers", "УТП"),
+    ("recommendations", "Рекомендации"),
+)
+SCORE_COLUMNS = 3
+COUNT_CATEGORIES = ['Сильные стороны', 'Слабые стороны', 'УТП', 'Рекомендации']
+
+# Выше этих N подписи, легенда и заливки не рисуются — время рендера не растёт с N
+COMPARISON_LEGEND_LIMIT = 12
+COMPARISON_FILL_LIMIT = 20
+HEATMAP_VALUES_LIMIT = 40
+HEATMAP_NAMES_LIMIT = 80
+
+
+def competitor_matrix(analyses: list) -> List[List[Optional[int]]]:
+    """
+    Матрица N x 7 для графиков сравнения: оценки и длины списков
+    
+    Отсутствующая оценка (visual_style_score у текстового анализа) — None.
+    Список списков, а не ndarray: дёшево передаётся в воркер и годится для ключа кэша.
+    """
+    rows = []
+    for analysis in analyses:
+        row = [getattr(analysis, field, None) for field, _ in COMPARISON_METRICS[:SCORE_COLUMNS]]
+        row += [len(getattr(analysis, field, None) or []) for field, _ in COMPARISON_METRICS[SCORE_COLUMNS:]]
+        rows.append(row)
+    return rows
+
+
+def _comparison_colors(count: int) -> "np.ndarray":
+    """RGBA цвета конкурентов: различимые до 10, дальше — непрерывная палитра"""
+    import matplotlib
+    import numpy as np
+    
+    if count <= 10:
+        return matplotlib.colormaps['tab10'](np.arange(count))
+    return matplotlib.colormaps['turbo'](np.linspace(0.05, 0.95, count))
+
+
+def _output_key(kwargs: dict) -> tuple:
+    return kwargs.get("fmt", "png"), kwargs.get("dpi", DEFAULT_DPI), tuple(kwargs.get("size") or ())
+
+
 class VisualizationService:
     """Генерация графиков и визуализаций"""
     
@@ -32,25 +267,362 @@ class VisualizationService:
         logger.info("=" * 50)
         logger.info("Инициализация Visualization сервиса")
         
-        # Настройка matplotlib для красивых графиков
-        plt.style.use('dark_background')
-        plt.rcParams.update({
-            'font.size': 10,
-            'axes.titlesize': 14,
-            'axes.labelsize': 12,
-            'figure.facecolor': '#1a2234',
-            'axes.facecolor': '#1a2234',
-            'text.color': '#f1f5f9',
-            'axes.labelcolor': '#f1f5f9',
-            'xtick.color': '#94a3b8',
-            'ytick.color': '#94a3b8',
-            'axes.edgecolor': '#334155',
-            'axes.titlecolor': '#f1f5f9',
-        })
+        # Пул процессов запускается на старте сервера (start_pool)
+        self.workers = settings.chart_workers
+        self.queue_size = settings.chart_queue_size
+        self.timeout = settings.chart_timeout
+        self._pool = RestartablePool("графиков", self.workers, _init_chart_worker)
+        # Без пула (скрипты) рендер идёт в потоках по одному — pyplot не потокобезопасен
+        self._render_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "pending": 0, "max_pending": 0, "rendered": 0, "failed": 0, "timeouts": 0, "rejected": 0,
+            "cache_hits": 0, "cache_misses": 0, "wait_seconds": 0.0, "render_seconds": 0.0
+        }
+        
+        # Кэш готовых изображений: пространство входов крошечное, почти все запросы — попадания
+        # Лимит в байтах: SVG и крупные PNG (width/height/dpi из запроса) весят в сотни раз больше
+        self.cache_limit = settings.chart_cache_mb * 1024 * 1024
+        self._cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self._cache_bytes = 0
+        self._prerender_task: Optional[asyncio.Task] = None
+        
+        # Шаблоны фигур: у каждого процесса-воркера свои, в потоках — под блокировкой
+        self.figure_templates = settings.chart_figure_templates
+        self._templates: Dict[tuple, dict] = {}
+        self._figure_lock = threading.RLock()
         
         logger.info("Visualization сервис инициализирован ✓")
         logger.info("=" * 50)
     
+    # === Пул рендера ===
+    
+    def start_pool(self):
+        """Запустить пул процессов графиков (pyplot не потокобезопасен)"""
+        if self._pool.running:
+            return
+        self._pool.start()
+        logger.info(f"  📊 Пул графиков: {self.workers} процессов, очередь {self.queue_size}, "
+                    f"таймаут {self.timeout:.0f} сек")
+    
+    def close(self):
+        """Остановить предрендер и пул графиков"""
+        if self._prerender_task is not None:
+            self._prerender_task.cancel()
+            self._prerender_task = None
+        self._pool.close()
+    
+    def _render_locked(self, method: str, kwargs: dict) -> Tuple[Optional[str], float]:
+        with self._render_lock:
+            started = time.perf_counter()
+            return getattr(self, method)(**kwargs), time.perf_counter() - started
+    
+    def _slot_done(self, future=None):
+        with self._stats_lock:
+            self._stats["pending"] -= 1
+    
+    async def _run(self, method: str, kwargs: dict) -> Optional[str]:
+        """Рендер одного графика в пуле (слот очереди уже занят)"""
+        submitted = time.perf_counter()
+        try:
+            if not self._pool.running:
+                executor = future = None
+                waiter = asyncio.to_thread(self._render_locked, method, kwargs)
+            else:
+                executor, future = self._pool.submit(_render_in_worker, method, kwargs)
+                waiter = asyncio.wrap_future(future)
+        except BaseException:
+            self._slot_done()
+            raise
+        if future is None:
+            waiter = asyncio.ensure_future(waiter)
+            waiter.add_done_callback(self._slot_done)
+        else:
+            # Слот освобождается, когда воркер закончил или убит перезапуском пула
+            future.add_done_callback(self._slot_done)
+        
+        try:
+            image, render_seconds = await asyncio.wait_for(waiter, timeout=self.timeout)
+        except BrokenProcessPool as e:
+            # Воркер упал или пул убит перезапуском — пересоздаёт первый; предрендер не трогаем
+            self._count("failed")
+            logger.error(f"  ✗ Пул графиков сломан: {e}")
+            self._pool.restart(executor, "воркер завершился аварийно")
+            raise
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            logger.error(f"  ✗ График не сгенерирован за {self.timeout:.0f} сек")
+            if executor is not None:
+                # Зависший рендер держит процесс — пул пересоздаётся
+                self._pool.restart(executor, f"рендер дольше {self.timeout:.0f} сек")
+            raise TimeoutError(f"Генерация графика превысила {self.timeout:.0f} сек")
+        except Exception:
+            self._count("failed")
+            raise
+        
+        total = time.perf_counter() - submitted
+        with self._stats_lock:
+            self._stats["rendered"] += 1
+            self._stats["render_seconds"] += render_seconds
+            self._stats["wait_seconds"] += max(0.0, total - render_seconds)
+        return image
+    
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+    
+    def _acquire(self, slots: int, reject: bool):
+        with self._stats_lock:
+            if reject and self._stats["pending"] + slots > self.queue_size:
+                self._stats["rejected"] += 1
+                logger.warning(f"  ⚠ Очередь графиков заполнена ({self.queue_size})")
+                raise ChartQueueFull(f"Очередь генерации графиков заполнена ({self.queue_size}), повторите позже")
+            self._stats["pending"] += slots
+            self._stats["max_pending"] = max(self._stats["max_pending"], self._stats["pending"])
+    
+    async def render(self, method: str, kwargs: dict) -> Optional[str]:
+        """
+        Отрисовать график в пуле процессов, не блокируя event loop
+        
+        Args:
+            method: Метод генерации, например "generate_radar_chart"
+            kwargs: Его аргументы
+            
+        Returns:
+            Base64 изображение (None — график не сгенерирован)
+            
+        Raises:
+            ChartQueueFull: В работе и ожидании уже chart_queue_size графиков
+            TimeoutError: Рендер не уложился в chart_timeout
+        """
+        key = chart_key(method, kwargs)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        self._acquire(1, reject=True)
+        image = await self._run(method, kwargs)
+        self._cache_put(key, image)
+        return image
+    
+    def _cache_get(self, key: Optional[tuple]) -> Optional[str]:
+        if key is None or not self.cache_limit:
+            return None
+        with self._stats_lock:
+            image = self._cache.get(key)
+            if image is None:
+                self._stats["cache_misses"] += 1
+                return None
+            self._cache.move_to_end(key)
+            self._stats["cache_hits"] += 1
+            return image
+    
+    def _cache_put(self, key: Optional[tuple], image: Optional[str]):
+        if key is None or image is None or len(image) > self.cache_limit:
+            return
+        with self._stats_lock:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._cache_bytes -= len(old)
+            self._cache[key] = image
+            self._cache_bytes += len(image)
+            while self._cache_bytes > self.cache_limit:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+    
+    def start_prerender(self):
+        """Фоново отрисовать все Score Chart (0-10), чтобы первые запросы были попаданиями"""
+        if self._prerender_task is None:
+            self._prerender_task = asyncio.get_running_loop().create_task(self._prerender_scores())
+    
+    async def _prerender_scores(self):
+        started = time.perf_counter()
+        await self.render_many([("generate_visual_score_chart", {"score": score}) for score in range(11)])
+        logger.info(f"  📊 Score Chart 0-10 отрисованы заранее за {time.perf_counter() - started:.1f} сек")
+    
+    async def render_many(self, jobs: List[ChartJob]) -> List[Optional[str]]:
+        """
+        Отрисовать несколько графиков параллельно в пуле процессов
+        
+        Общее время — примерно время самого долгого графика, а не сумма.
+        
+        Args:
+            jobs: Пары (метод, аргументы), например ("generate_visual_score_chart", {"score": 7})
+            
+        Returns:
+            Base64 изображения в порядке задач (None — график не сгенерирован)
+        """
+        if not jobs:
+            return []
+        keys = [chart_key(method, kwargs) for method, kwargs in jobs]
+        images = [self._cache_get(key) for key in keys]
+        # Одинаковые графики внутри пакета рендерятся один раз
+        missing = {}
+        for index, (key, image) in enumerate(zip(keys, images)):
+            if image is None:
+                missing.setdefault(key if key is not None else ("job", index), []).append(index)
+        if not missing:
+            return images
+        
+        # Отчёт целиком не отклоняется по размеру очереди — его графики ждут воркеры
+        self._acquire(len(missing), reject=False)
+        rendered = await asyncio.gather(*(self._run(*jobs[indexes[0]]) for indexes in missing.values()))
+        for (key, indexes), image in zip(missing.items(), rendered):
+            self._cache_put(keys[indexes[0]], image)
+            for index in indexes:
+                images[index] = image
+        return images
+    
+    def get_stats(self) -> dict:
+        """Метрики очереди графиков: глубина, счётчики, среднее ожидание и рендер"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["cache_items"] = len(self._cache)
+            stats["cache_bytes"] = self._cache_bytes
+        rendered = stats.pop("rendered")
+        wait_seconds, render_seconds = stats.pop("wait_seconds"), stats.pop("render_seconds")
+        return dict(
+            stats,
+            rendered=rendered,
+            workers=self.workers if self._pool.running else 0,
+            restarts=self._pool.restarts,
+            avg_wait_ms=round(wait_seconds / rendered * 1000, 1) if rendered else 0.0,
+            avg_render_ms=round(render_seconds / rendered * 1000, 1) if rendered else 0.0
+        )
+    
+    def _figsize(self, default: Tuple[float, float], dpi: int, size: Optional[Tuple]) -> Tuple[float, float]:
+        """Размер фигуры в дюймах: по умолчанию или из (ширина, высота) в пикселях"""
+        width, height = size or (None, None)
+        if width and height:
+            return width / dpi, height / dpi
+        if width:
+            return width / dpi, width / dpi * default[1] / default[0]
+        if height:
+            return height / dpi * default[0] / default[1], height / dpi
+        return default
+    
+    def _encode(self, fig: "Figure", fmt: str, dpi: int) -> str:
+        """Сохранить фигуру в формате png, svg или webp и вернуть base64"""
+        if fmt not in CHART_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат изображения: {fmt}")
+        
+        options = {}
+        if fmt == 'svg':
+            # Без даты в метаданных (см. также svg.hashsalt в apply_style)
+            options['metadata'] = {'Date': None}
+        elif fmt == 'webp':
+            options['pil_kwargs'] = {'quality': 85}
+        
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt, dpi=dpi, facecolor='#1a2234', edgecolor='none', **options)
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    
+    # === Шаблоны фигур ===
+    #
+    # Фигура, оси, подписи и раскладка (tight_layout) строятся один раз на тип графика;
+    # рендер меняет только данные (полигон, высоты столбцов, тексты). Шаблоны есть только
+    # для размера и dpi по умолчанию: фигура держит буфер рендера последнего сохранения,
+    # и размеры из запроса (width, height, dpi) иначе копили бы такие буферы в памяти.
+    # Фигуры создаются через Figure, а не pyplot — без глобального реестра фигур.
+    
+    def _template(self, key: tuple, build, dpi: int, size: Optional[Tuple]) -> dict:
+        """Шаблон из кэша или новая фигура (не кэшируется для нестандартного размера)"""
+        if not self.figure_templates or size is not None or dpi != DEFAULT_DPI:
+            return build()
+        template = self._templates.get(key)
+        if template is None:
+            if len(self._templates) >= FIGURE_TEMPLATES_LIMIT:
+                self._templates.clear()
+            template = self._templates[key] = build()
+        return template
+    
+    def _build_radar(self, categories: Tuple[str, ...], figsize: Tuple[float, float]) -> dict:
+        import numpy as np
+        from matplotlib.figure import Figure
+        
+        fig = Figure(figsize=figsize)
+        ax = fig.subplots(subplot_kw=dict(polar=True))
+        
+        # Углы для категорий; полигон замыкаем первой точкой
+        angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False)
+        angles = np.append(angles, angles[0])
+        zeros = np.zeros_like(angles)
+        
+        polygon = ax.fill(angles, zeros, color='#06b6d4', alpha=0.25)[0]
+        line = ax.plot(angles, zeros, color='#06b6d4', linewidth=2)[0]
+        
+        # Сетка
+        ax.set_xticks(angles[:-1])
+        ax.set_xticklabels(categories, size=10)
+        ax.set_ylim(0, 10)
+        ax.set_yticks([2, 4, 6, 8, 10])
+        ax.set_yticklabels(['2', '4', '6', '8', '10'], color='#64748b', size=8)
+        
+        title = ax.set_title("Анализ конкурента", size=16, color='#f1f5f9', pad=20)
+        fig.tight_layout()
+        return {"fig": fig, "angles": angles, "polygon": polygon, "line": line, "title": title}
+    
+    def _build_bar(self, figsize: Tuple[float, float]) -> dict:
+        from matplotlib.figure import Figure
+        from matplotlib.ticker import MaxNLocator
+        
+        fig = Figure(figsize=figsize)
+        ax = fig.subplots()
+        
+        categories = ['Сильные стороны', 'Слабые стороны', 'УТП', 'Рекомендации']
+        colors = ['#10b981', '#ef4444', '#8b5cf6', '#f59e0b']
+        # Раскладка считается по типичным данным (двузначные подписи оси)
+        bars = ax.bar(categories, [10] * 4, color=colors, edgecolor='#334155', linewidth=1.5)
+        
+        # Подписи значений над столбцами
+        labels = [
+            ax.annotate(
+                '',
+                xy=(bar.get_x() + bar.get_width() / 2, 0),
+                xytext=(0, 5),
+                textcoords="offset points",
+                ha='center', va='bottom',
+                fontsize=14, fontweight='bold', color='#f1f5f9'
+            )
+            for bar in bars
+        ]
+        
+        ax.set_ylabel('Количество', color='#94a3b8')
+        title = ax.set_title("Сравнение характеристик", size=16, color='#f1f5f9', pad=15)
+        ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.spines['left'].set_color('#334155')
+        ax.spines['bottom'].set_color('#334155')
+        ax.tick_params(colors='#94a3b8')
+        fig.tight_layout()
+        return {"fig": fig, "ax": ax, "bars": bars, "labels": labels, "title": title}
+    
+    def _build_score(self, figsize: Tuple[float, float]) -> dict:
+        import numpy as np
+        from matplotlib.figure import Figure
+        
+        fig = Figure(figsize=figsize)
+        ax = fig.subplots(subplot_kw=dict(polar=True))
+        
+        # Фон
+        angles = np.linspace(0, 2 * np.pi, 100)
+        ax.fill(angles, np.ones_like(angles), color='#1e293b', alpha=0.5)
+        
+        # Заполненная часть (обновляется на каждый рендер)
+        filled = ax.fill(np.zeros(50), np.ones(50), color='#06b6d4', alpha=0.8)[0]
+        
+        # Центральный текст
+        value = ax.text(0, 0, '', ha='center', va='center',
+                        fontsize=36, fontweight='bold', color='#06b6d4')
+        ax.text(0, -0.15, 'Оценка', ha='center', va='center',
+                fontsize=14, color='#94a3b8')
+        
+        ax.set_ylim(0, 1.2)
+        ax.axis('off')
+        fig.tight_layout()
+        return {"fig": fig, "filled": filled, "value": value}
+    
     def _list_to_scores(self, items: List[str]) -> List[float]:
         """Конвертировать список в оценки (1-10)"""
         if not items:
@@ -64,7 +636,10 @@ class VisualizationService:
         weaknesses: List[str],
         unique_offers: List[str],
         recommendations: List[str],
-        title: str = "Анализ конкурента"
+        title: str = "Анализ конкурента",
+        fmt: str = "png",
+        dpi: int = DEFAULT_DPI,
+        size: Optional[Tuple] = None
     ) -> str:
         """
         Генерировать Radar Chart (паутина)
@@ -75,67 +650,40 @@ class VisualizationService:
             unique_offers: Уникальные предложения
             recommendations: Рекомендации
             title: Заголовок графика
+            fmt: Формат изображения (png, svg, webp)
+            dpi: Разрешение
+            size: (ширина, высота) в пикселях; одно из значений может быть None
             
         Returns:
             Base64 изображение графика
         """
         logger.info("📊 Генерация Radar Chart")
+        _ensure_style()
+        import numpy as np
         
         # Подготавливаем данные
-        categories = []
-        values = []
-        
-        if strengths:
-            categories.append('Сильные стороны')
-            values.append(min(len(strengths) * 2, 10))
-        if weaknesses:
-            categories.append('Слабые стороны')
-            values.append(10 - min(len(weaknesses) * 2, 9))
-        if unique_offers:
-            categories.append('Уникальные предложения')
-            values.append(min(len(unique_offers) * 2, 10))
-        if recommendations:
-            categories.append('Рекомендации')
-            values.append(min(len(recommendations) * 2, 10))
+        categories, values = radar_data(strengths, weaknesses, unique_offers, recommendations)
         
         if len(categories) < 3:
             logger.warning("  ⚠️ Недостаточно данных для Radar Chart")
             return None
         
-        # Закрываем полигон
-        categories.append(categories[0])
-        values.append(values[0])
-        
-        # Создаём график
-        fig, ax = plt.subplots(figsize=(8, 8), subplot_kw=dict(polar=True))
-        
-        # Углы для категорий
-        angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False).tolist()
-        angles += angles[:1]
-        values += values[:1]
-        
-        # Рисуем полигон
-        ax.fill(angles, values, color='#06b6d4', alpha=0.25)
-        ax.plot(angles, values, color='#06b6d4', linewidth=2)
-        
-        # Добавляем сетку
-        ax.set_xticks(angles[:-1])
-        ax.set_xticklabels(categories[:-1], size=10)
-        ax.set_ylim(0, 10)
-        ax.set_yticks([2, 4, 6, 8, 10])
-        ax.set_yticklabels(['2', '4', '6', '8', '10'], color='#64748b', size=8)
-        
-        # Заголовок
-        ax.set_title(title, size=16, color='#f1f5f9', pad=20)
-        
-        # Сохраняем в base64
-        buffer = io.BytesIO()
-        plt.tight_layout()
-        fig.savefig(buffer, format='png', dpi=150, facecolor='#1a2234', edgecolor='none')
-        buffer.seek(0)
-        
-        img_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        plt.close(fig)
+        figsize = self._figsize((8, 8), dpi, size)
+        with self._figure_lock:
+            template = self._template(
+                ("radar", tuple(categories)),
+                lambda: self._build_radar(tuple(categories), figsize),
+                dpi, size
+            )
+            
+            # Обновляем только данные
+            values = np.append(values, values[0])
+            template["polygon"].set_xy(np.column_stack([template["angles"], values]))
+            template["line"].set_ydata(values)
+            template["title"].set_text(title)
+            
+            # Сохраняем в base64
+            img_base64 = self._encode(template["fig"], fmt, dpi)
         
         logger.info(f"  ✓ Radar Chart сгенерирован: {len(img_base64)} символов base64")
         return img_base64
@@ -143,7 +691,10 @@ class VisualizationService:
     def generate_comparison_bar_chart(
         self,
         analysis: CompetitorAnalysis,
-        title: str = "Сравнение характеристик"
+        title: str = "Сравнение характеристик",
+        fmt: str = "png",
+        dpi: int = DEFAULT_DPI,
+        size: Optional[Tuple] = None
     ) -> str:
         """
         Генерировать Bar Chart сравнения
@@ -151,14 +702,15 @@ class VisualizationService:
         Args:
             analysis: Объект анализа
             title: Заголовок
+            fmt, dpi, size: Формат и размер изображения (как у generate_radar_chart)
             
         Returns:
             Base64 изображение графика
         """
         logger.info("📊 Генерация Bar Chart")
+        _ensure_style()
         
         # Данные для сравнения
-        categories = ['Сильные стороны', 'Слабые стороны', 'УТП', 'Рекомендации']
         values = [
             len(analysis.strengths),
             len(analysis.weaknesses),
@@ -166,87 +718,296 @@ class VisualizationService:
             len(analysis.recommendations)
         ]
         
-        # Создаём график
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        colors = ['#10b981', '#ef4444', '#8b5cf6', '#f59e0b']
-        bars = ax.bar(categories, values, color=colors, edgecolor='#334155', linewidth=1.5)
-        
-        # Добавляем значения на столбцы
-        for bar, val in zip(bars, values):
-            height = bar.get_height()
-            ax.annotate(
-                f'{val}',
-                xy=(bar.get_x() + bar.get_width() / 2, height),
-                xytext=(0, 5),
-                textcoords="offset points",
-                ha='center', va='bottom',
-                fontsize=14, fontweight='bold', color='#f1f5f9'
-            )
-        
-        ax.set_ylabel('Количество', color='#94a3b8')
-        ax.set_title(title, size=16, color='#f1f5f9', pad=15)
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_color('#334155')
-        ax.spines['bottom'].set_color('#334155')
-        ax.tick_params(colors='#94a3b8')
-        
-        # Сохраняем
-        buffer = io.BytesIO()
-        plt.tight_layout()
-        fig.savefig(buffer, format='png', dpi=150, facecolor='#1a2234', edgecolor='none')
-        buffer.seek(0)
-        
-        img_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        plt.close(fig)
+        figsize = self._figsize((10, 6), dpi, size)
+        with self._figure_lock:
+            template = self._template(("bar",), lambda: self._build_bar(figsize), dpi, size)
+            
+            # Высоты столбцов и подписи значений
+            for bar, label, val in zip(template["bars"], template["labels"], values):
+                bar.set_height(val)
+                label.xy = (bar.get_x() + bar.get_width() / 2, val)
+                label.set_text(f'{val}')
+            ax = template["ax"]
+            ax.relim()
+            ax.autoscale_view()
+            template["title"].set_text(title)
+            
+            # Сохраняем
+            img_base64 = self._encode(template["fig"], fmt, dpi)
         
         logger.info(f"  ✓ Bar Chart сгенерирован: {len(img_base64)} символов base64")
         return img_base64
     
-    def generate_visual_score_chart(self, score: int) -> str:
+    def generate_visual_score_chart(
+        self,
+        score: int,
+        fmt: str = "png",
+        dpi: int = DEFAULT_DPI,
+        size: Optional[Tuple] = None
+    ) -> str:
         """
         Генерировать круговую диаграмму оценки
         
         Args:
             score: Оценка от 0 до 10
+            fmt, dpi, size: Формат и размер изображения (как у generate_radar_chart)
             
         Returns:
             Base64 изображение
         """
         logger.info(f"📊 Генерация Score Chart: {score}/10")
+        _ensure_style()
+        import numpy as np
         
-        fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(polar=True))
-        
-        # Данные
-        angles = np.linspace(0, 2 * np.pi, 100)
-        score_angle = (score / 10) * 2 * np.pi
+        figsize = self._figsize((6, 6), dpi, size)
+        with self._figure_lock:
+            template = self._template(("score",), lambda: self._build_score(figsize), dpi, size)
+            
+            # Заполненная часть и текст
+            filled_angles = np.linspace(0, (score / 10) * 2 * np.pi, 50)
+            template["filled"].set_xy(np.column_stack([filled_angles, np.ones_like(filled_angles)]))
+            template["value"].set_text(f'{score}/10')
+            
+            img_base64 = self._encode(template["fig"], fmt, dpi)
         
-        # Фон
-        ax.fill(angles, [1] * len(angles), color='#1e293b', alpha=0.5)
+        logger.info(f"  ✓ Score Chart сгенерирован")
+        return img_base64
+    
+    # === Сравнение N конкурентов ===
+    #
+    # Данные готовятся векторно (NumPy), а все конкуренты рисуются одной коллекцией
+    # (LineCollection / PolyCollection / изображение), а не артистом на каждого.
+    
+    def _radar_matrix(self, matrix: List[List[Optional[int]]]) -> "np.ndarray":
+        """Значения осей radar для всех конкурентов (N x 4), как у одиночного графика"""
+        import numpy as np
+        
+        counts = np.asarray([row[SCORE_COLUMNS:] for row in matrix], dtype=float)
+        values = np.minimum(counts * 2, 10)
+        # Слабые стороны: меньше — лучше
+        values[:, 1] = 10 - np.minimum(counts[:, 1] * 2, 9)
+        return values
+    
+    def generate_overlay_radar_chart(
+        self,
+        names: List[str],
+        matrix: List[List[Optional[int]]],
+        title: str = "Сравнение конкурентов",
+        fmt: str = "png",
+        dpi: int = DEFAULT_DPI,
+        size: Optional[Tuple] = None
+    ) -> str:
+        """
+        Radar Chart нескольких конкурентов на одних осях и среднее по всем
         
-        # Заполненная часть
-        filled_angles = np.linspace(0, score_angle, 50)
-        ax.fill(filled_angles, [1] * len(filled_angles), color='#06b6d4', alpha=0.8)
+        Args:
+            names: Названия конкурентов
+            matrix: Матрица competitor_matrix (N x 7)
+            title: Заголовок
+            fmt, dpi, size: Формат и размер изображения (как у generate_radar_chart)
+            
+        Returns:
+            Base64 изображение графика
+        """
+        count = len(names)
+        logger.info(f"📊 Генерация Radar Chart сравнения: {count} конкурентов")
+        _ensure_style()
+        import matplotlib.lines
+        import numpy as np
+        from matplotlib.collections import LineCollection, PolyCollection
+        from matplotlib.figure import Figure
+        
+        values = self._radar_matrix(matrix)
+        angles = np.linspace(0, 2 * np.pi, len(COUNT_CATEGORIES), endpoint=False)
+        closed_angles = np.append(angles, angles[0])
+        closed_values = np.hstack([values, values[:, :1]])
+        # Полигоны всех конкурентов: N x 5 x (угол, значение)
+        segments = np.stack([np.broadcast_to(closed_angles, closed_values.shape), closed_values], axis=-1)
+        colors = _comparison_colors(count)
+        
+        fig = Figure(figsize=self._figsize((9, 9), dpi, size))
+        ax = fig.subplots(subplot_kw=dict(polar=True))
+        
+        if count <= COMPARISON_FILL_LIMIT:
+            fills = colors.copy()
+            fills[:, 3] = 0.08
+            ax.add_collection(PolyCollection(segments, facecolors=fills, edgecolors='none'))
+        # Чем больше конкурентов, тем тоньше и прозрачнее линии
+        alpha = float(np.clip(6 / np.sqrt(count), 0.15, 0.9))
+        ax.add_collection(LineCollection(
+            segments, colors=colors, linewidths=2 if count <= 10 else 1, alpha=alpha, label='_nolegend_'
+        ))
+        
+        mean_values = np.append(values.mean(axis=0), values[:, 0].mean())
+        ax.plot(closed_angles, mean_values, color='#f1f5f9', linewidth=2.5, linestyle='--', label='Среднее')
+        
+        ax.set_xticks(angles)
+        ax.set_xticklabels(COUNT_CATEGORIES, size=10)
+        ax.set_ylim(0, 10)
+        ax.set_yticks([2, 4, 6, 8, 10])
+        ax.set_yticklabels(['2', '4', '6', '8', '10'], color='#64748b', size=8)
+        ax.set_title(f"{title} ({count})", size=16, color='#f1f5f9', pad=20)
+        
+        if count <= COMPARISON_LEGEND_LIMIT:
+            handles = [
+                matplotlib.lines.Line2D([], [], color=color, linewidth=2, label=name)
+                for name, color in zip(names, colors)
+            ]
+            handles.append(matplotlib.lines.Line2D([], [], color='#f1f5f9', linewidth=2.5, linestyle='--', label='Среднее'))
+            ax.legend(handles=handles, loc='upper right', bbox_to_anchor=(1.3, 1.1), fontsize=9, frameon=False)
+        
+        fig.tight_layout()
+        img_base64 = self._encode(fig, fmt, dpi)
+        logger.info(f"  ✓ Radar Chart сравнения сгенерирован: {len(img_base64)} символов base64")
+        return img_base64
+    
+    def generate_grouped_bar_chart(
+        self,
+        names: List[str],
+        matrix: List[List[Optional[int]]],
+        title: str = "Сравнение характеристик",
+        fmt: str = "png",
+        dpi: int = DEFAULT_DPI,
+        size: Optional[Tuple] = None
+    ) -> str:
+        """
+        Сгруппированный Bar Chart: по категории — столбец каждого конкурента
         
-        # Центральный текст
-        ax.text(0, 0, f'{score}/10', ha='center', va='center', 
-                fontsize=36, fontweight='bold', color='#06b6d4')
-        ax.text(0, -0.15, 'Оценка', ha='center', va='center', 
-                fontsize=14, color='#94a3b8')
+        Args:
+            names: Названия конкурентов
+            matrix: Матрица competitor_matrix (N x 7)
+            title: Заголовок
+            fmt, dpi, size: Формат и размер изображения (как у generate_radar_chart)
+            
+        Returns:
+            Base64 изображение графика
+        """
+        count = len(names)
+        logger.info(f"📊 Генерация Bar Chart сравнения: {count} конкурентов")
+        _ensure_style()
+        import matplotlib.patches as mpatches
+        import numpy as np
+        from matplotlib.collections import PolyCollection
+        from matplotlib.figure import Figure
+        from matplotlib.ticker import MaxNLocator
+        
+        heights = np.asarray([row[SCORE_COLUMNS:] for row in matrix], dtype=float)  # N x 4
+        categories = len(COUNT_CATEGORIES)
+        width = 0.8 / count
+        # Левые края столбцов: группа категории + смещение конкурента
+        left = np.arange(categories)[None, :] - 0.4 + np.arange(count)[:, None] * width
+        right = left + width
+        bottom = np.zeros_like(heights)
+        # Прямоугольники всех столбцов: (N*4) x 4 вершины x (x, y)
+        verts = np.stack([
+            np.stack([left, bottom], axis=-1),
+            np.stack([left, heights], axis=-1),
+            np.stack([right, heights], axis=-1),
+            np.stack([right, bottom], axis=-1),
+        ], axis=2).reshape(-1, 4, 2)
+        colors = _comparison_colors(count)
+        
+        fig = Figure(figsize=self._figsize((12, 6), dpi, size))
+        ax = fig.subplots()
+        ax.add_collection(PolyCollection(
+            verts,
+            facecolors=np.repeat(colors, categories, axis=0),
+            edgecolors='#334155' if count <= COMPARISON_FILL_LIMIT else 'none',
+            linewidths=0.8
+        ))
+        
+        ax.set_xlim(-0.5, categories - 0.5)
+        ax.set_ylim(0, max(float(heights.max()), 1) * 1.1)
+        ax.set_xticks(np.arange(categories))
+        ax.set_xticklabels(COUNT_CATEGORIES)
+        ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+        ax.set_ylabel('Количество', color='#94a3b8')
+        ax.set_title(f"{title} ({count})", size=16, color='#f1f5f9', pad=15)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.spines['left'].set_color('#334155')
+        ax.spines['bottom'].set_color('#334155')
+        ax.tick_params(colors='#94a3b8')
         
-        ax.set_ylim(0, 1.2)
-        ax.axis('off')
+        if count <= COMPARISON_LEGEND_LIMIT:
+            handles = [mpatches.Patch(color=color, label=name) for name, color in zip(names, colors)]
+            ax.legend(handles=handles, fontsize=9, frameon=False, ncol=min(count, 4))
         
-        buffer = io.BytesIO()
-        plt.tight_layout()
-        fig.savefig(buffer, format='png', dpi=150, facecolor='#1a2234', edgecolor='none')
-        buffer.seek(0)
+        fig.tight_layout()
+        img_base64 = self._encode(fig, fmt, dpi)
+        logger.info(f"  ✓ Bar Chart сравнения сгенерирован: {len(img_base64)} символов base64")
+        return img_base64
+    
+    def generate_scores_heatmap(
+        self,
+        names: List[str],
+        matrix: List[List[Optional[int]]],
+        title: str = "Оценки конкурентов",
+        fmt: str = "png",
+        dpi: int = DEFAULT_DPI,
+        size: Optional[Tuple] = None
+    ) -> str:
+        """
+        Тепловая карта: конкуренты x оценки и длины списков
         
-        img_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        plt.close(fig)
+        Цвет нормирован по колонке (оценки — по шкале 0-10, списки — по максимуму),
+        пустые ячейки (нет оценки) — фоном.
         
-        logger.info(f"  ✓ Score Chart сгенерирован")
+        Args:
+            names: Названия конкурентов
+            matrix: Матрица competitor_matrix (N x 7)
+            title: Заголовок
+            fmt, dpi, size: Формат и размер изображения (как у generate_radar_chart)
+            
+        Returns:
+            Base64 изображение графика
+        """
+        count = len(names)
+        logger.info(f"📊 Генерация тепловой карты: {count} конкурентов")
+        _ensure_style()
+        import matplotlib
+        import numpy as np
+        from matplotlib.figure import Figure
+        from matplotlib.ticker import MaxNLocator
+        
+        data = np.array(matrix, dtype=float)  # None -> nan
+        scale = np.full(data.shape[1], 10.0)
+        scale[SCORE_COLUMNS:] = np.maximum(np.nanmax(data[:, SCORE_COLUMNS:], axis=0, initial=0), 1)
+        normalized = np.ma.masked_invalid(data / scale)
+        
+        # Высота растёт с числом строк, но ограничена
+        default_height = float(np.clip(1.5 + 0.3 * count, 4, 24))
+        fig = Figure(figsize=self._figsize((10, default_height), dpi, size))
+        ax = fig.subplots()
+        cmap = matplotlib.colormaps['viridis'].with_extremes(bad='#1e293b')
+        image = ax.imshow(normalized, cmap=cmap, vmin=0, vmax=1, aspect='auto', interpolation='nearest')
+        
+        ax.set_xticks(np.arange(len(COMPARISON_METRICS)))
+        ax.set_xticklabels([label for _, label in COMPARISON_METRICS], rotation=30, ha='right')
+        if count <= HEATMAP_NAMES_LIMIT:
+            ax.set_yticks(np.arange(count))
+            ax.set_yticklabels(names, size=9 if count <= 30 else 6)
+        else:
+            # Номера конкурентов с 1, как в items запроса
+            ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+            ax.yaxis.set_major_formatter(lambda value, _: f'{int(value) + 1}')
+            ax.set_ylabel(f'Конкуренты (1-{count})', color='#94a3b8')
+        
+        if count <= HEATMAP_VALUES_LIMIT:
+            rows, columns = np.nonzero(~np.isnan(data))
+            for row, column in zip(rows, columns):
+                shade = normalized[row, column]
+                ax.text(
+                    column, row, f'{int(data[row, column])}',
+                    ha='center', va='center', fontsize=8,
+                    color='#0f172a' if shade > 0.6 else '#f1f5f9'
+                )
+        
+        ax.set_title(f"{title} ({count})", size=16, color='#f1f5f9', pad=15)
+        fig.colorbar(image, ax=ax, fraction=0.04, pad=0.02).set_label('Доля от максимума колонки', color='#94a3b8', size=10)
+        fig.tight_layout()
+        img_base64 = self._encode(fig, fmt, dpi)
+        logger.info(f"  ✓ Тепловая карта сгенерирована: {len(img_base64)} символов base64")
         return img_base64
 
 # Глобальный экземпляр
@@ -0,0 +1,130 @@
+"""
+Время рендера графика: новая фигура на каждый вызов против шаблона фигуры
+
+    python benchmarks/bench_charts.py --renders 50
+    python benchmarks/bench_charts.py --renders 50 --format svg
+    python benchmarks/bench_charts.py --renders 10 --competitors 150
+
+Рендер идёт в текущем процессе (без пула и без кэша изображений), поэтому
+видна только стоимость matplotlib: построение фигуры и раскладка против
+обновления данных в готовом шаблоне. Печатает среднее и p50/p99 в мс.
+С --competitors N — время графиков сравнения compare_* для 10 и N конкурентов.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Импорт backend поднимает глобальные сервисы — их файлы во временный каталог
+_tmp = tempfile.mkdtemp(prefix="bench_charts_")
+os.environ.setdefault("PROXY_API_KEY", "bench")
+os.environ.setdefault("HISTORY_DB", os.path.join(_tmp, "history.db"))
+os.environ.setdefault("TRENDS_DB", os.path.join(_tmp, "trends.db"))
+os.environ.setdefault("JOURNAL_FILE", os.path.join(_tmp, "journal.jsonl"))
+os.environ.setdefault("REPORT_JOBS_DIR", os.path.join(_tmp, "report_jobs"))
+
+import logging  # noqa: E402
+
+logging.disable(logging.INFO)
+
+from backend.models.schemas import CompetitorAnalysis  # noqa: E402
+from backend.services.visualization_service import competitor_matrix, viz_service  # noqa: E402
+from benchmarks.load_test import SAMPLE_ANALYSIS, percentile  # noqa: E402
+
+
+def measure(render: Callable[[], str], renders: int) -> List[float]:
+    """Время каждого вызова, мс (первый — прогрев, не учитывается)"""
+    render()
+    timings = []
+    for _ in range(renders):
+        start = time.perf_counter()
+        render()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def random_competitors(count: int) -> tuple:
+    """Названия и матрица сравнения для count случайных анализов"""
+    rng = random.Random(count)
+    analyses = [
+        CompetitorAnalysis(
+            **{field: ["пункт"] * rng.randint(0, 6) for field in ("strengths", "weaknesses", "unique_offers", "recommendations")},
+            summary="",
+            design_score=rng.randint(0, 10),
+            technology_potential=rng.randint(0, 10)
+        )
+        for _ in range(count)
+    ]
+    return [f"Конкурент {number}" for number in range(1, count + 1)], competitor_matrix(analyses)
+
+
+def bench_comparison(competitors: int, renders: int, output: dict):
+    """Время графиков сравнения для 10 и competitors конкурентов"""
+    print(f"📊 Графики сравнения: {renders} вызовов, мс на график")
+    print(f"{'':<32}{'mean':>10}{'p50':>10}{'p99':>10}")
+    print("-" * 62)
+    for count in sorted({10, competitors}):
+        names, matrix = random_competitors(count)
+        for name, render in (
+            ("compare_radar", viz_service.generate_overlay_radar_chart),
+            ("compare_bar", viz_service.generate_grouped_bar_chart),
+            ("compare_heatmap", viz_service.generate_scores_heatmap),
+        ):
+            timings = measure(lambda: render(names, matrix, **output), renders)
+            label = f"{name} x{count}"
+            print(
+                f"{label:<32}{statistics.mean(timings):>10.1f}"
+                f"{percentile(timings, 50):>10.1f}{percentile(timings, 99):>10.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chart render benchmark: fresh figure vs figure template")
+    parser.add_argument("--renders", type=int, default=30)
+    parser.add_argument("--format", default="png", choices=["png", "svg", "webp"])
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--competitors", type=int, default=0, help="Замерить графики сравнения для N конкурентов")
+    args = parser.parse_args()
+
+    analysis = CompetitorAnalysis(**{
+        key: SAMPLE_ANALYSIS[key]
+        for key in ("strengths", "weaknesses", "unique_offers", "recommendations", "summary")
+    })
+    output = dict(fmt=args.format, dpi=args.dpi)
+    if args.competitors:
+        bench_comparison(args.competitors, args.renders, output)
+        return
+    charts = {
+        "radar": lambda: viz_service.generate_radar_chart(
+            analysis.strengths, analysis.weaknesses, analysis.unique_offers, analysis.recommendations, **output
+        ),
+        "bar": lambda: viz_service.generate_comparison_bar_chart(analysis, **output),
+        "score": lambda: viz_service.generate_visual_score_chart(7, **output),
+    }
+
+    print(f"📊 Рендер графиков: {args.renders} вызовов, {args.format}, {args.dpi} dpi, мс на график")
+    print(f"{'':<24}{'mean':>10}{'p50':>10}{'p99':>10}")
+    print("-" * 54)
+    for name, render in charts.items():
+        results = {}
+        for label, templates in (("новая фигура", False), ("шаблон", True)):
+            viz_service.figure_templates = templates
+            viz_service._templates.clear()
+            timings = measure(render, args.renders)
+            results[label] = statistics.mean(timings)
+            print(
+                f"{name + ': ' + label:<24}{results[label]:>10.1f}"
+                f"{percentile(timings, 50):>10.1f}{percentile(timings, 99):>10.1f}"
+            )
+        print(f"{name + ': ускорение':<24}{results['новая фигура'] / results['шаблон']:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
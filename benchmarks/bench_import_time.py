@@ -0,0 +1,111 @@
+"""
+Время импорта backend.main (старт воркера uvicorn и цикл --reload)
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --runs 10 --budget-ms 800 --top 15
+
+Каждый замер — новый интерпретатор с -X importtime. Печатает медиану и худший
+замер, самые дорогие модули верхнего уровня и проверяет, что тяжёлые
+зависимости (selenium, matplotlib, PyPDF2, jinja2, openai...) не загружаются
+при импорте, а откладываются до первого использования.
+
+Код выхода 1 — медиана больше --budget-ms или тяжёлый модуль загружен при импорте.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Импортируются при первом использовании сервиса, а не при импорте backend.main
+DEFERRED_MODULES = (
+    "selenium", "webdriver_manager", "matplotlib", "numpy", "PyPDF2", "jinja2", "openai", "bs4", "weasyprint",
+)
+
+PROBE = (
+    "import sys, backend.main; "
+    "print('DEFERRED:' + ','.join(m for m in {modules!r} if m in sys.modules))"
+)
+
+
+def measure(env: Dict[str, str]) -> Tuple[float, Dict[str, float], List[str]]:
+    """Один импорт в новом процессе: (мс backend.main, мс по модулям верхнего уровня, загруженные тяжёлые)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(modules=DEFERRED_MODULES)],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"❌ Импорт backend.main не удался:\n{result.stderr[-2000:]}")
+
+    total = 0.0
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        milliseconds = int(cumulative) / 1000
+        if name.strip() == "backend.main":
+            total = milliseconds
+        elif name.startswith("   ") and not name.startswith("    "):
+            # Прямые импорты backend.main (отступ на один уровень)
+            modules[name.strip()] = milliseconds
+    # Логи сервисов тоже пишутся в stdout — ищем строку пробы по префиксу
+    probe = next(line for line in result.stdout.splitlines() if line.startswith("DEFERRED:"))
+    loaded = [module for module in probe[len("DEFERRED:"):].split(",") if module]
+    return total, modules, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of backend.main with a budget")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    # Импорт поднимает глобальные сервисы — их файлы во временный каталог
+    tmp = tempfile.mkdtemp(prefix="bench_import_")
+    env = dict(os.environ)
+    env.setdefault("PROXY_API_KEY", "bench")
+    for name, filename in (
+        ("HISTORY_DB", "history.db"), ("TRENDS_DB", "trends.db"), ("JOURNAL_FILE", "journal.jsonl"),
+        ("REPORT_CACHE_DIR", "report_cache"), ("REPORT_JOBS_DIR", "report_jobs"),
+        ("USAGE_DB", "usage.db"), ("USAGE_FILE", "usage.json"),
+    ):
+        env.setdefault(name, os.path.join(tmp, filename))
+
+    # Первый запуск прогревает кэш байткода и файловой системы
+    measure(env)
+    runs = [measure(env) for _ in range(args.runs)]
+    totals = [total for total, _, _ in runs]
+    median = statistics.median(totals)
+
+    print(f"⏱ Импорт backend.main: {args.runs} запусков, бюджет {args.budget_ms:.0f} мс")
+    print(f"  медиана {median:.0f} мс, худший {max(totals):.0f} мс")
+    print(f"\n{'Модуль':<48}{'мс':>10}")
+    print("-" * 58)
+    modules = runs[totals.index(sorted(totals)[len(totals) // 2])][1]
+    for name, milliseconds in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<48}{milliseconds:>10.1f}")
+
+    failed = False
+    loaded = sorted({module for _, _, names in runs for module in names})
+    if loaded:
+        print(f"\n❌ Тяжёлые модули загружаются при импорте: {', '.join(loaded)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"\n❌ Медиана {median:.0f} мс больше бюджета {args.budget_ms:.0f} мс")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("\n✅ В бюджете")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Время рендера отчёта: Template(source) на каждый вызов против прекомпилированного шаблона
+
+    python benchmarks/bench_reports.py --renders 2000
+
+Печатает среднее и p50/p99 на один отчёт (HTML и Markdown) для обоих способов
+и время загрузки шаблона: компиляция с нуля против байткод-кэша.
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, select_autoescape  # noqa: E402
+
+from benchmarks.load_test import SAMPLE_ANALYSIS, percentile  # noqa: E402
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "backend" / "templates"
+
+DATA = {
+    "date": "19.10.2026 12:00",
+    "analysis_type": "Competitor",
+    "marketing_insights": [],
+    "visual_style_score": 0,
+    "visual_style_analysis": "",
+    **SAMPLE_ANALYSIS,
+}
+
+
+def measure(render: Callable[[], str], renders: int) -> List[float]:
+    """Время каждого вызова, мс"""
+    timings = []
+    for _ in range(renders):
+        start = time.perf_counter()
+        render()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: List[float]):
+    print(
+        f"{name:<36}{statistics.mean(timings):>10.3f}"
+        f"{percentile(timings, 50):>10.3f}{percentile(timings, 99):>10.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report template render benchmark")
+    parser.add_argument("--renders", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"📄 Рендер отчётов: {args.renders} вызовов, мс на отчёт")
+    print(f"{'':<36}{'mean':>10}{'p50':>10}{'p99':>10}")
+    print("-" * 66)
+
+    environment = Environment(
+        loader=FileSystemLoader(str(TEMPLATES_DIR)),
+        autoescape=select_autoescape(["html"]),
+        auto_reload=False
+    )
+    for name, autoescape in (("report.html", True), ("report.md", False)):
+        source = (TEMPLATES_DIR / name).read_text(encoding="utf-8")
+        compiled = environment.get_template(name)
+        report(
+            f"{name}: Template(source) на вызов",
+            measure(lambda: Template(source, autoescape=autoescape).render(**DATA), args.renders)
+        )
+        report(f"{name}: прекомпилированный", measure(lambda: compiled.render(**DATA), args.renders))
+
+    # Загрузка шаблона в новом процессе: компиляция против байткода с диска
+    with tempfile.TemporaryDirectory() as cache_dir:
+        def load(bytecode_cache):
+            env = Environment(loader=FileSystemLoader(str(TEMPLATES_DIR)), bytecode_cache=bytecode_cache)
+            return env.get_template("report.html")
+
+        load(FileSystemBytecodeCache(cache_dir))
+        print()
+        report("загрузка: компиляция", measure(lambda: load(None), 50))
+        report("загрузка: байткод-кэш", measure(lambda: load(FileSystemBytecodeCache(cache_dir)), 50))
+
+
+if __name__ == "__main__":
+    main()
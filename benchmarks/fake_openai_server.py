@@ -0,0 +1,270 @@
+"""
+Локальный OpenAI-совместимый сервер-заглушка для нагрузочных тестов
+
+Отвечает на /v1/chat/completions (в том числе stream=true и vision content parts)
+готовыми JSON-ответами в формате, который ждёт OpenAIService, с полями usage,
+настраиваемой задержкой и долей ошибок. Реальная квота ProxyAPI не тратится.
+
+Запуск:
+    python benchmarks/fake_openai_server.py --port 9000 --latency lognormal:-0.5,0.4 --error-rate 0.02
+
+Backend на заглушке:
+    PROXY_API_BASE_URL=http://127.0.0.1:9000/v1 PROXY_API_KEY=fake python run.py
+
+Распределения задержки (секунды):
+    fixed:0.5  uniform:0.2,1.5  normal:0.8,0.2  lognormal:mu,sigma  exp:0.7
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+
+# === Готовые ответы ===
+
+COMPETITOR_REPLY = {
+    "strengths": [
+        "Понятное ценностное предложение на первом экране",
+        "Сильный бренд и узнаваемый визуальный стиль",
+        "Подробные кейсы клиентов",
+    ],
+    "weaknesses": [
+        "Нет цен на сайте",
+        "Перегруженная навигация",
+        "Медленная загрузка страниц",
+    ],
+    "unique_offers": [
+        "Бесплатный пробный период 30 дней",
+        "Персональный менеджер для каждого клиента",
+    ],
+    "recommendations": [
+        "Показать цены или калькулятор стоимости",
+        "Упростить главное меню",
+        "Добавить социальное доказательство на первый экран",
+    ],
+    "summary": "Зрелый игрок с сильным брендом, но слабой прозрачностью цен.",
+    "design_score": 7,
+    "technology_potential": 6,
+}
+
+IMAGE_REPLY = {
+    "description": "Рекламный баннер с крупным заголовком и изображением продукта",
+    "marketing_insights": [
+        "Чёткая визуальная иерархия",
+        "Контрастный CTA",
+        "Фокус на выгоде, а не на функциях",
+    ],
+    "visual_style_score": 8,
+    "visual_style_analysis": "Современный минималистичный стиль с акцентным цветом",
+    "recommendations": [
+        "Увеличить контраст текста",
+        "Добавить логотип крупнее",
+        "Сократить количество шрифтов",
+    ],
+    "design_score": 8,
+    "technology_potential": 7,
+}
+
+DEMO_PAGE = """<!DOCTYPE html>
+<html><head><title>Конкурент — облачная CRM</title></head>
+<body><h1>CRM для малого бизнеса за 5 минут</h1>
+<p>Мы помогаем 10 000 компаний продавать больше: воронки, чаты и аналитика в одном окне.</p>
+</body></html>"""
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Разобрать спецификацию распределения задержки"""
+    kind, _, raw = spec.partition(":")
+    args = [float(value) for value in raw.split(",") if value]
+    samplers = {
+        "fixed": lambda: args[0],
+        "uniform": lambda: random.uniform(args[0], args[1]),
+        "normal": lambda: random.gauss(args[0], args[1]),
+        "lognormal": lambda: random.lognormvariate(args[0], args[1]),
+        "exp": lambda: random.expovariate(1 / args[0]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"Неизвестное распределение: {kind}")
+    sampler = samplers[kind]
+    return lambda: max(0.0, sampler())
+
+
+def count_tokens(text: str) -> int:
+    """Грубая оценка токенов: ~4 символа на токен"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def image_tokens(part: dict) -> int:
+    """Токены изображения: low — 85, иначе как для 1024x1024 в high"""
+    detail = part.get("image_url", {}).get("detail", "auto")
+    return 85 if detail == "low" else 765
+
+
+class FakeOpenAI:
+    """Состояние заглушки: настройки и счётчики"""
+
+    def __init__(self, latency: str, error_rate: float, error_statuses: List[int],
+                 token_delay: float, replies: Optional[Dict[str, dict]] = None):
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.token_delay = token_delay
+        self.replies = {"competitor": COMPETITOR_REPLY, "image": IMAGE_REPLY}
+        self.replies.update(replies or {})
+        self.stats = {"requests": 0, "errors": 0, "streams": 0, "images": 0}
+
+    def reply_for(self, messages: List[dict]) -> dict:
+        """Подобрать готовый ответ по системному промпту"""
+        system = " ".join(m["content"] for m in messages if m["role"] == "system" and isinstance(m["content"], str))
+        user = messages[-1]["content"] if messages else ""
+        if isinstance(user, list):
+            user = " ".join(part.get("text", "") for part in user if part.get("type") == "text")
+
+        if '"items"' in system:
+            # Пакетный промпт: по ответу на каждый разделитель
+            labels = re.findall(r"=== BEGIN (\S+) ===", user)
+            return {"items": [dict(self.replies["competitor"], id=label) for label in labels]}
+        if "visual_style_score" in system:
+            return self.replies["image"]
+        return self.replies["competitor"]
+
+    def usage(self, messages: List[dict], completion: str) -> dict:
+        prompt_tokens = 0
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                prompt_tokens += count_tokens(content)
+                continue
+            for part in content:
+                if part.get("type") == "image_url":
+                    self.stats["images"] += 1
+                    prompt_tokens += image_tokens(part)
+                else:
+                    prompt_tokens += count_tokens(part.get("text", ""))
+        completion_tokens = count_tokens(completion)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+
+def create_app(fake: FakeOpenAI) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        fake.stats["requests"] += 1
+        model = body.get("model", "gpt-4o-mini")
+        messages = body.get("messages", [])
+
+        await asyncio.sleep(fake.sample_latency())
+
+        if random.random() < fake.error_rate:
+            fake.stats["errors"] += 1
+            status = random.choice(fake.error_statuses)
+            return JSONResponse(
+                status_code=status,
+                content={"error": {"message": f"Fake error {status}", "type": "server_error", "code": status}}
+            )
+
+        completion = json.dumps(fake.reply_for(messages), ensure_ascii=False)
+        usage = fake.usage(messages, completion)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": completion},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        fake.stats["streams"] += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def stream():
+            def chunk(delta: dict, finish_reason=None, chunk_usage=None) -> str:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                }
+                if chunk_usage:
+                    payload["usage"] = chunk_usage
+                return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            for start in range(0, len(completion), 16):
+                if fake.token_delay:
+                    await asyncio.sleep(fake.token_delay)
+                yield chunk({"content": completion[start:start + 16]})
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield chunk(None, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/v1/models")
+    async def models():
+        names = ["gpt-4o-mini", "gpt-4o", "gpt-4.1-mini", "gpt-4.1"]
+        return {"object": "list", "data": [{"id": name, "object": "model", "owned_by": "fake"} for name in names]}
+
+    @app.get("/site", response_class=HTMLResponse)
+    async def site():
+        """Демо-страница для /parse_fast и /parse_demo"""
+        return DEMO_PAGE
+
+    @app.get("/stats")
+    async def stats():
+        return fake.stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default="lognormal:-0.7,0.5", help="Распределение задержки ответа, сек")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой (0..1)")
+    parser.add_argument("--error-statuses", default="429,500,503", help="HTTP статусы ошибок через запятую")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Пауза между чанками стрима, сек")
+    parser.add_argument("--replies", help="JSON файл с ответами {\"competitor\": {...}, \"image\": {...}}")
+    args = parser.parse_args()
+
+    replies = json.loads(Path(args.replies).read_text(encoding="utf-8")) if args.replies else None
+    fake = FakeOpenAI(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_statuses=[int(status) for status in args.error_statuses.split(",")],
+        token_delay=args.token_delay,
+        replies=replies,
+    )
+
+    print(f"🧪 Fake OpenAI: http://{args.host}:{args.port}/v1 (latency={args.latency}, errors={args.error_rate})")
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Стресс-тест истории из нескольких процессов: проверка, что записи не теряются
+
+Каждый процесс поднимает свой HistoryService (как отдельный воркер uvicorn)
+над общим хранилищем во временном каталоге и добавляет записи. В конце
+проверяется, что в хранилище ровно processes * entries уникальных записей,
+а каждый процесс видит записи других через GET /history (get_history).
+
+    python benchmarks/history_stress.py --backend sqlite --processes 8 --entries 200
+    python benchmarks/history_stress.py --backend json --processes 4 --entries 50
+
+Код возврата 0 — записи не потеряны и видны всем процессам, 1 — есть потери,
+дубликаты или процесс не видит записей других.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def worker(worker_id: int, entries: int, barrier) -> None:
+    """Добавить entries записей из отдельного процесса"""
+    import logging
+    logging.disable(logging.INFO)
+    from backend.services.history_service import history_service
+
+    barrier.wait()
+    for index in range(entries):
+        history_service.add_entry(
+            request_type="text",
+            request_summary=f"worker={worker_id} index={index}",
+            response_summary="stress"
+        )
+    history_service.close()
+
+    # Все воркеры дописали — каждый должен видеть записи всех процессов.
+    # Страница на все записи: последние entries записей могут оказаться от одного воркера
+    barrier.wait()
+    items, _, _ = history_service.get_history(limit=barrier.parties * entries)
+    seen = {item.request_summary.split()[0] for item in items}
+    if len(seen) < barrier.parties:
+        print(f"  ❌ Воркер {worker_id} видит записи {len(seen)} процессов из {barrier.parties}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process history stress test")
+    parser.add_argument("--backend", choices=["sqlite", "json"], default="sqlite")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--entries", type=int, default=200, help="Записей на процесс")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="history_stress_"))
+    os.environ.update({
+        "HISTORY_BACKEND": args.backend,
+        "HISTORY_DB": str(workdir / "history.db"),
+        "HISTORY_FILE": str(workdir / "history.json"),
+        "MAX_HISTORY_ITEMS": "0",
+        "HISTORY_BATCH_SIZE": "16",
+        "HISTORY_FLUSH_INTERVAL": "0.01",
+    })
+
+    expected = args.processes * args.entries
+    print(f"🔨 {args.backend}: {args.processes} процессов x {args.entries} записей -> {workdir}")
+
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.processes)
+    processes = [
+        context.Process(target=worker, args=(worker_id, args.entries, barrier))
+        for worker_id in range(args.processes)
+    ]
+
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    failed = [process.exitcode for process in processes if process.exitcode != 0]
+    if failed:
+        print(f"❌ Процессы завершились с ошибкой или не видят чужих записей: {failed}")
+        sys.exit(1)
+
+    import logging
+    logging.disable(logging.INFO)
+    from backend.services.history_service import history_service
+    items = history_service.store.list()
+    history_service.close()
+
+    summaries = [item["request_summary"] for item in items]
+    unique = set(summaries)
+    print(f"  Записей: {len(items)} из {expected}, уникальных: {len(unique)}, за {elapsed:.2f} сек")
+
+    if len(items) != expected or len(unique) != expected:
+        print("❌ Потеряны или задублированы записи")
+        sys.exit(1)
+    print("✅ Записи не потеряны")
+
+
+if __name__ == "__main__":
+    main()
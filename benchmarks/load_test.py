@@ -0,0 +1,168 @@
+"""
+Нагрузочный тест эндпоинтов backend: пропускная способность и хвостовые задержки
+
+Backend должен смотреть на заглушку (benchmarks/fake_openai_server.py):
+    python benchmarks/fake_openai_server.py --port 9000
+    PROXY_API_BASE_URL=http://127.0.0.1:9000/v1 PROXY_API_KEY=fake python run.py
+    python benchmarks/load_test.py --concurrency 16 --requests 200
+
+Выбор эндпоинтов:
+    python benchmarks/load_test.py --endpoints analyze_text,visualize
+"""
+import argparse
+import asyncio
+import io
+import statistics
+import time
+from typing import Callable, Dict, List
+
+import httpx
+
+SAMPLE_TEXT = (
+    "Мы — облачная CRM для малого бизнеса. Подключение за 5 минут, интеграция "
+    "с мессенджерами и телефонией, аналитика продаж в реальном времени. "
+    "Более 10 000 клиентов по всей России, бесплатный тариф до 3 пользователей."
+)
+
+SAMPLE_ANALYSIS = {
+    "strengths": ["Быстрое подключение", "Интеграции", "Большая база клиентов"],
+    "weaknesses": ["Нет цен", "Мало кейсов"],
+    "unique_offers": ["Бесплатный тариф"],
+    "recommendations": ["Показать цены", "Добавить кейсы", "Видео-демо"],
+    "summary": "Сильный игрок сегмента SMB",
+    "design_score": 7,
+    "technology_potential": 8,
+}
+
+
+def make_image() -> bytes:
+    """Тестовый PNG 1600x1200"""
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (1600, 1200), "#1a2234")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((200, 200, 1400, 1000), fill="#06b6d4")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_pdf() -> bytes:
+    """Минимальный PDF с текстовым слоем"""
+    text = "Competitor CRM: fast onboarding, messenger integrations, free tier for small teams."
+    stream = f"BT /F1 12 Tf 50 750 Td ({text}) Tj ET".encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def build_scenarios(fake_url: str) -> Dict[str, Callable[[httpx.AsyncClient], "asyncio.Future"]]:
+    """Эндпоинт -> функция одного запроса"""
+    image = make_image()
+    pdf = make_pdf()
+    return {
+        "analyze_text": lambda c: c.post("/analyze_text", json={"text": SAMPLE_TEXT}),
+        "analyze_image": lambda c: c.post("/analyze_image", files={"file": ("banner.png", image, "image/png")}),
+        "analyze_pdf": lambda c: c.post("/analyze_pdf", files={"file": ("doc.pdf", pdf, "application/pdf")}),
+        "parse_fast": lambda c: c.post("/parse_fast", json={"url": f"{fake_url}/site"}),
+        "generate_report": lambda c: c.post("/generate_report", json={"analysis_data": SAMPLE_ANALYSIS, "format": "html"}),
+        "visualize": lambda c: c.post("/visualize", json={"analysis_data": SAMPLE_ANALYSIS, "chart_type": "bar"}),
+        "history": lambda c: c.get("/history"),
+        "usage": lambda c: c.get("/usage"),
+        "health": lambda c: c.get("/health"),
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_endpoint(client: httpx.AsyncClient, name: str, request, total: int, concurrency: int) -> dict:
+    """Выполнить total запросов с заданной параллельностью"""
+    latencies: List[float] = []
+    failures = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal failures
+        for _ in counter:
+            start = time.perf_counter()
+            try:
+                response = await request(client)
+                ok = response.status_code < 400 and response.json().get("success", True) is not False
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "endpoint": name,
+        "requests": total,
+        "failures": failures,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50) * 1000,
+        "p90": percentile(latencies, 90) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "max": max(latencies) * 1000 if latencies else 0.0,
+        "mean": statistics.mean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test for Competitor Monitor API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--fake-url", default="http://127.0.0.1:9000", help="Адрес fake_openai_server (для /site)")
+    parser.add_argument("--endpoints", default="", help="Через запятую; по умолчанию все")
+    parser.add_argument("--requests", type=int, default=100, help="Запросов на эндпоинт")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    scenarios = build_scenarios(args.fake_url)
+    names = [name.strip() for name in args.endpoints.split(",") if name.strip()] or list(scenarios)
+    unknown = set(names) - set(scenarios)
+    if unknown:
+        parser.error(f"Неизвестные эндпоинты: {', '.join(sorted(unknown))}")
+
+    print(f"🚀 Нагрузка: {args.base_url}, {args.requests} запросов x {len(names)} эндпоинтов, параллельность {args.concurrency}")
+    print()
+    print(f"{'endpoint':<18}{'req':>6}{'fail':>6}{'rps':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    print("-" * 79)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        for name in names:
+            row = await run_endpoint(client, name, scenarios[name], args.requests, args.concurrency)
+            print(
+                f"{row['endpoint']:<18}{row['requests']:>6}{row['failures']:>6}{row['rps']:>9.1f}"
+                f"{row['p50']:>10.1f}{row['p90']:>10.1f}{row['p99']:>10.1f}{row['max']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Повтор трафика из журнала запросов и сравнение задержек с записанными
+
+Журнал пишет backend (logs/requests_journal.jsonl); для POST с JSON телом
+нужен JOURNAL_BODIES=true при записи, иначе повторяются только GET запросы.
+
+    python benchmarks/replay_journal.py logs/requests_journal*.jsonl* --concurrency 8
+    python benchmarks/replay_journal.py logs/requests_journal.jsonl --speed 1.0   # с исходными паузами
+
+Для каждого эндпоинта печатается p50/p90 из журнала и при повторе — видно регрессии.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.load_test import percentile  # noqa: E402
+
+
+def load_entries(paths: List[Path], paths_filter: str) -> List[dict]:
+    """Записи журнала, которые можно повторить"""
+    wanted = {path.strip() for path in paths_filter.split(",") if path.strip()}
+    entries = []
+    for path in paths:
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if wanted and entry["path"] not in wanted:
+                    continue
+                if entry["method"] == "GET" or "body" in entry:
+                    entries.append(entry)
+    entries.sort(key=lambda entry: entry["ts"])
+    return entries
+
+
+async def replay(entries: List[dict], base_url: str, concurrency: int, speed: float, timeout: float) -> Dict[str, List[float]]:
+    """Отправить записи журнала, вернуть задержки (мс) по эндпоинтам"""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    semaphore = asyncio.Semaphore(concurrency)
+    first_ts = datetime.fromisoformat(entries[0]["ts"])
+    started = time.perf_counter()
+
+    async def send(client: httpx.AsyncClient, entry: dict):
+        if speed:
+            # Сохраняем исходные интервалы между запросами (speed=2 — вдвое быстрее)
+            offset = (datetime.fromisoformat(entry["ts"]) - first_ts).total_seconds() / speed
+            await asyncio.sleep(max(0.0, offset - (time.perf_counter() - started)))
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await client.request(entry["method"], entry["path"], params=entry.get("query"), json=entry.get("body"))
+            except httpx.HTTPError:
+                return
+            latencies[f"{entry['method']} {entry['path']}"].append((time.perf_counter() - start) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(send(client, entry) for entry in entries))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the request journal against a running backend")
+    parser.add_argument("journal", nargs="+", type=Path, help="Сегменты журнала (.jsonl / .jsonl.gz)")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--paths", default="", help="Только эти пути, через запятую")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--speed", type=float, default=0.0, help="0 — без пауз, 1 — в исходном темпе")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    entries = load_entries(sorted(args.journal), args.paths)
+    if not entries:
+        print("Нет записей для повтора (POST без сохранённого тела пропускаются)")
+        sys.exit(1)
+
+    recorded: Dict[str, List[float]] = defaultdict(list)
+    for entry in entries:
+        recorded[f"{entry['method']} {entry['path']}"].append(entry["duration_ms"])
+
+    print(f"🔁 Повтор {len(entries)} запросов -> {args.base_url}, параллельность {args.concurrency}")
+    replayed = asyncio.run(replay(entries, args.base_url, args.concurrency, args.speed, args.timeout))
+
+    print()
+    print(f"{'endpoint':<34}{'req':>6}{'rec p50':>10}{'rec p90':>10}{'new p50':>10}{'new p90':>10}{'Δp90':>9}")
+    print("-" * 89)
+    for endpoint in sorted(recorded):
+        old, new = recorded[endpoint], replayed.get(endpoint, [])
+        old_p90, new_p90 = percentile(old, 90), percentile(new, 90)
+        delta = f"{(new_p90 / old_p90 - 1) * 100:+.0f}%" if old_p90 and new else "—"
+        print(
+            f"{endpoint:<34}{len(new):>6}{percentile(old, 50):>10.1f}{old_p90:>10.1f}"
+            f"{percentile(new, 50):>10.1f}{new_p90:>10.1f}{delta:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """
 API клиент для связи с backend
 """
+import time
 import requests
 from typing import Optional, Dict, Any
 
@@ -10,6 +11,7 @@ class APIClient:
     def __init__(self, base_url: str = "http://localhost:8000"):
         self.base_url = base_url
         self.timeout = 120  # 2 минуты для долгих операций
+        self.report_job_timeout = 600  # Ожидание фонового задания отчёта
     
     def _request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """Выполнить HTTP запрос"""
@@ -72,6 +74,58 @@ class APIClient:
         """Генерация отчёта"""
         return self._request("POST", "/generate_report", json={"analysis_data": analysis_data, "format": format})
     
+    def _fetch_file(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+        """HTTP запрос, отвечающий файлом: байты и имя из Content-Disposition"""
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            response = requests.request(method, f"{self.base_url}{endpoint}", **kwargs)
+            response.raise_for_status()
+        except requests.exceptions.ConnectionError:
+            return {"success": False, "error": "Не удалось подключиться к серверу"}
+        except requests.exceptions.Timeout:
+            return {"success": False, "error": "Превышено время ожидания"}
+        except requests.exceptions.HTTPError as e:
+            return {"success": False, "error": f"HTTP ошибка: {e}"}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        
+        filename = None
+        disposition = response.headers.get("Content-Disposition", "")
+        if 'filename="' in disposition:
+            filename = disposition.split('filename="', 1)[1].rstrip('"')
+        return {"success": True, "filename": filename, "content": response.content}
+    
+    def download_report(self, analysis_data: Dict, format: str = "html") -> Dict[str, Any]:
+        """
+        Генерация отчёта файлом: байты без base64 в JSON
+        
+        PDF строится фоновым заданием (POST /reports) — долгий рендер не упирается в таймаут запроса.
+        """
+        if format == "pdf":
+            job = self._request("POST", "/reports", json={"analysis_data": analysis_data, "format": format})
+            if "job_id" not in job:
+                return {"success": False, "error": job.get("error", "Не удалось создать задание отчёта")}
+            
+            deadline = time.monotonic() + self.report_job_timeout
+            while job.get("status") in ("queued", "running"):
+                if time.monotonic() > deadline:
+                    return {"success": False, "error": "Превышено время ожидания отчёта"}
+                time.sleep(1)
+                job = self._request("GET", f"/reports/{job['job_id']}")
+            if job.get("status") != "done":
+                return {"success": False, "error": job.get("error") or "Ошибка генерации отчёта"}
+            result = self._fetch_file("GET", job["download_url"])
+        else:
+            result = self._fetch_file(
+                "POST", "/generate_report",
+                json={"analysis_data": analysis_data, "format": format, "download": True}
+            )
+        
+        if result["success"]:
+            result["format"] = format
+            result["filename"] = result["filename"] or f"report.{format}"
+        return result
+    
     def parse_demo(self, url: str) -> Dict[str, Any]:
         """Парсинг и анализ сайта (Selenium)"""
         return self._request("POST", "/parse_demo", json={"url": url})
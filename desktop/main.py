@@ -795,7 +795,7 @@ class MainWindow(QMainWindow):
         fmt = format_map.get(self.report_format.currentText(), "html")
         
         self.show_loading("Генерирую отчёт...")
-        self.current_worker = WorkerThread(api_client.generate_report, self.current_analysis, fmt)
+        self.current_worker = WorkerThread(api_client.download_report, self.current_analysis, fmt)
         self.current_worker.finished.connect(self.on_report_generated)
         self.current_worker.error.connect(lambda e: self.on_error(e))
         self.current_worker.start()
@@ -804,16 +804,8 @@ class MainWindow(QMainWindow):
         self.hide_loading()
         if result.get("success"):
             filename = result.get("filename", f"report.{result.get('format', 'html')}")
-            
-            if result.get("format") == "pdf":
-                # PDF - base64
-                import base64
-                content = base64.b64decode(result["content"])
-                mime = "application/pdf"
-            else:
-                # HTML/Markdown - text
-                content = result["content"].encode('utf-8')
-                mime = "text/html" if result.get("format") == "html" else "text/markdown"
+            # Файл отчёта приходит байтами (download=true)
+            content = result["content"]
             
             # Сохраняем файл
             file_path, _ = QFileDialog.getSaveFileName(
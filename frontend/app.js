@@ -81,9 +81,19 @@ const api = {
         const response = await fetch(`${this.baseUrl}/generate_report`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ analysis_data: analysisData, format: format })
+            body: JSON.stringify({ analysis_data: analysisData, format: format, download: true })
         });
-        return response.json();
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({}));
+            return { success: false, error: error.detail || `HTTP ${response.status}` };
+        }
+        const disposition = response.headers.get('Content-Disposition') || '';
+        const match = disposition.match(/filename="([^"]+)"/);
+        return {
+            success: true,
+            blob: await response.blob(),
+            filename: match ? match[1] : `report.${format}`
+        };
     }
 };
 // === UI Functions ===
@@ -389,20 +399,11 @@ const handlers = {
         try {
             const result = await api.generateReport(state.currentAnalysis, format);
             if (result.success) {
-                if (format === 'pdf') {
-                    const link = document.createElement('a');
-                    link.href = `data:application/pdf;base64,${result.content}`;
-                    link.download = result.filename;
-                    link.click();
-                } else {
-                    const blob = new Blob([result.content], {
-                        type: format === 'html' ? 'text/html' : 'text/markdown'
-                    });
-                    const link = document.createElement('a');
-                    link.href = URL.createObjectURL(blob);
-                    link.download = result.filename;
-                    link.click();
-                }
+                const link = document.createElement('a');
+                link.href = URL.createObjectURL(result.blob);
+                link.download = result.filename;
+                link.click();
+                setTimeout(() => URL.revokeObjectURL(link.href), 1000);
             } else {
                 ui.showError(result.error || 'Ошибка генерации отчёта');
             }